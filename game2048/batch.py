@@ -0,0 +1,96 @@
+"""
+Векторизованный ход сразу для множества полей 2048.
+
+move_batch обрабатывает массив формы (B, N, N) целиком средствами NumPy:
+нет цикла Python ни по полям, ни по строкам - только по N-1 позициям внутри строки.
+"""
+import numpy as np
+
+
+def _to_left_view(boards, direction):
+    """Возвращает представление массива, в котором ход сводится к сдвигу влево."""
+    if direction == "left":
+        return boards
+    if direction == "right":
+        return boards[:, :, ::-1]
+    if direction == "up":
+        return boards.transpose(0, 2, 1)
+    if direction == "down":
+        return boards.transpose(0, 2, 1)[:, :, ::-1]
+    raise ValueError(f"Unknown direction: {direction}")
+
+
+def _from_left_view(boards, direction):
+    """Обратное преобразование к _to_left_view."""
+    if direction == "left":
+        return boards
+    if direction == "right":
+        return boards[:, :, ::-1]
+    if direction == "up":
+        return boards.transpose(0, 2, 1)
+    return boards[:, :, ::-1].transpose(0, 2, 1)
+
+
+def _compact_left(rows):
+    """Сдвигает ненулевые значения каждой строки влево, сохраняя их порядок."""
+    order = np.argsort(rows == 0, axis=1, kind="stable")
+    return np.take_along_axis(rows, order, axis=1)
+
+
+def move_batch(boards, direction):
+    """
+    Выполняет один и тот же ход на каждом поле пакета.
+
+ Аргументы:
+ boards (numpy.ndarray): Массив формы (B, N, N) со значениями плиток (0, 2, 4, ...).
+ direction (str): направление перемещения ("up", "down", "left" или "right").
+
+ Возвращается:
+ tuple: (новые поля формы (B, N, N), очки за ход формы (B,), маска изменившихся полей формы (B,)).
+    """
+    boards = np.asarray(boards)
+    if boards.ndim != 3 or boards.shape[1] != boards.shape[2]:
+        raise ValueError(f"Expected an array of shape (B, N, N), got {boards.shape}")
+    count, size = boards.shape[0], boards.shape[1]
+
+    rows = _to_left_view(boards, direction).reshape(count * size, size)
+    rows = _compact_left(rows)
+    scores = np.zeros(count * size, dtype=np.int64)
+    for j in range(size - 1):
+        # After a merge the right tile becomes 0, so it cannot merge again.
+        merge = (rows[:, j] == rows[:, j + 1]) & (rows[:, j] != 0)
+        rows[merge, j] *= 2
+        rows[merge, j + 1] = 0
+        scores += np.where(merge, rows[:, j], 0)
+    rows = _compact_left(rows)
+
+    new_boards = np.ascontiguousarray(_from_left_view(rows.reshape(count, size, size), direction))
+    scores = scores.reshape(count, size).sum(axis=1)
+    changed = np.any(new_boards != boards, axis=(1, 2))
+    return new_boards, scores, changed
+
+
+def legal_moves_batch(boards):
+    """
+    Маски допустимых ходов для пакета полей по сравнению соседних клеток.
+
+ Биты совпадают с bitboard.MOVE_BITS: up=1, down=2, left=4, right=8.
+
+ Аргументы:
+ boards (numpy.ndarray): Массив формы (B, N, N) со значениями плиток.
+
+ Возвращается:
+ numpy.ndarray: Маски формы (B,) типа uint8.
+    """
+    boards = np.asarray(boards)
+    # Pairs of neighbours along a row (first, second) and along a column (upper, lower).
+    first, second = boards[:, :, :-1], boards[:, :, 1:]
+    upper, lower = boards[:, :-1, :], boards[:, 1:, :]
+    row_merge = (first == second) & (first != 0)
+    col_merge = (upper == lower) & (upper != 0)
+    left = np.any(row_merge | ((first == 0) & (second != 0)), axis=(1, 2))
+    right = np.any(row_merge | ((first != 0) & (second == 0)), axis=(1, 2))
+    up = np.any(col_merge | ((upper == 0) & (lower != 0)), axis=(1, 2))
+    down = np.any(col_merge | ((upper != 0) & (lower == 0)), axis=(1, 2))
+    return (up.astype(np.uint8) | (down.astype(np.uint8) << 1)
+            | (left.astype(np.uint8) << 2) | (right.astype(np.uint8) << 3))
@@ -0,0 +1,228 @@
+"""
+Упакованное 64-битное представление поля 2048 и табличный движок ходов.
+
+Каждая клетка поля 4x4 хранится в 4 битах как показатель степени двойки
+(0 - пустая клетка, 1 - плитка 2, 2 - плитка 4, ..., 15 - плитка 32768).
+Строка r занимает биты 16*r..16*r+15, столбец c внутри строки - полубайт c.
+
+Для каждой из 65536 возможных строк заранее вычисляются результат сдвига
+влево, результат сдвига вправо и набранные очки, поэтому ход сводится
+к четырём обращениям к таблице (и двум транспонированиям для вертикальных ходов).
+"""
+import numpy as np
+
+SIZE = 4
+ROW_MASK = 0xFFFF
+MAX_EXPONENT = 15  # 2 ** 15 = 32768 - наибольшая плитка, помещающаяся в 4 бита
+
+DIRECTIONS = ("up", "down", "left", "right")
+# Бит направления в маске допустимых ходов: up=1, down=2, left=4, right=8
+MOVE_BITS = {direction: 1 << index for index, direction in enumerate(DIRECTIONS)}
+
+
+def _build_tables():
+    """
+    Строит таблицы сдвига строки влево/вправо и таблицу очков.
+
+ Все 65536 строк обрабатываются одним массивом NumPy, поэтому таблицы строятся
+ при импорте за миллисекунды.
+
+ Возвращается:
+ tuple: (row_left, row_right, row_score) - списки длиной 65536.
+    """
+    rows = np.arange(65536, dtype=np.int64)
+    shifts = 4 * np.arange(SIZE, dtype=np.int64)
+    line = (rows[:, None] >> shifts) & 0xF
+    # Stable sort on "is empty" moves tiles to the left keeping their order.
+    line = np.take_along_axis(line, np.argsort(line == 0, axis=1, kind="stable"), axis=1)
+    score = np.zeros(65536, dtype=np.int64)
+    for j in range(SIZE - 1):
+        # Две плитки 32768 не сливаются: результат не поместится в 4 бита.
+        merge = (line[:, j] == line[:, j + 1]) & (line[:, j] != 0) & (line[:, j] < MAX_EXPONENT)
+        line[merge, j] += 1
+        line[merge, j + 1] = 0
+        score += np.where(merge, 1 << line[:, j], 0)
+    line = np.take_along_axis(line, np.argsort(line == 0, axis=1, kind="stable"), axis=1)
+    row_left = (line << shifts).sum(axis=1)
+
+    # Сдвиг вправо - зеркальное отражение сдвига влево зеркальной строки.
+    # Очки не зависят от направления: серии равных плиток сливаются одинаково.
+    row_right = np.empty_like(row_left)
+    row_right[reverse_row(rows)] = reverse_row(row_left)
+    return row_left.tolist(), row_right.tolist(), score.tolist()
+
+
+def reverse_row(row):
+    """Переставляет полубайты 16-битной строки в обратном порядке."""
+    return ((row >> 12) & 0xF) | ((row >> 4) & 0xF0) | ((row << 4) & 0xF00) | ((row << 12) & 0xF000)
+
+
+ROW_LEFT_TABLE, ROW_RIGHT_TABLE, ROW_SCORE_TABLE = _build_tables()
+# Для каждой строки: биты left/right, если сдвиг в эту сторону меняет строку
+ROW_MOVES_TABLE = (np.where(np.array(ROW_LEFT_TABLE) != np.arange(65536), MOVE_BITS["left"], 0)
+                   | np.where(np.array(ROW_RIGHT_TABLE) != np.arange(65536), MOVE_BITS["right"], 0)).tolist()
+
+
+def transpose(board):
+    """Транспонирует упакованное поле (строки становятся столбцами)."""
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def _move_rows(board, table):
+    """Применяет табличный сдвиг ко всем четырём строкам поля."""
+    r0 = board & ROW_MASK
+    r1 = (board >> 16) & ROW_MASK
+    r2 = (board >> 32) & ROW_MASK
+    r3 = (board >> 48) & ROW_MASK
+    moved = table[r0] | (table[r1] << 16) | (table[r2] << 32) | (table[r3] << 48)
+    score = ROW_SCORE_TABLE[r0] + ROW_SCORE_TABLE[r1] + ROW_SCORE_TABLE[r2] + ROW_SCORE_TABLE[r3]
+    return moved, score
+
+
+def move(board, direction):
+    """
+    Выполняет ход на упакованном поле.
+
+ Аргументы:
+ board (int): Упакованное поле.
+ direction (str): направление перемещения ("up", "down", "left" или "right").
+
+ Возвращается:
+ tuple: (новое упакованное поле, набранные очки).
+    """
+    if direction == "left":
+        return _move_rows(board, ROW_LEFT_TABLE)
+    if direction == "right":
+        return _move_rows(board, ROW_RIGHT_TABLE)
+    if direction == "up":
+        moved, score = _move_rows(transpose(board), ROW_LEFT_TABLE)
+        return transpose(moved), score
+    if direction == "down":
+        moved, score = _move_rows(transpose(board), ROW_RIGHT_TABLE)
+        return transpose(moved), score
+    raise ValueError(f"Unknown direction: {direction}")
+
+
+def legal_moves(board):
+    """
+    Вычисляет маску допустимых ходов по таблице строк: восемь обращений и одно транспонирование.
+
+ Возвращается:
+ int: Маска из битов MOVE_BITS; 0 означает, что ходов нет.
+    """
+    table = ROW_MOVES_TABLE
+    rows = (table[board & ROW_MASK] | table[(board >> 16) & ROW_MASK]
+            | table[(board >> 32) & ROW_MASK] | table[(board >> 48) & ROW_MASK])
+    transposed = transpose(board)
+    cols = (table[transposed & ROW_MASK] | table[(transposed >> 16) & ROW_MASK]
+            | table[(transposed >> 32) & ROW_MASK] | table[(transposed >> 48) & ROW_MASK])
+    # Сдвиг строк транспонированного поля влево/вправо - это ход вверх/вниз.
+    return rows | (cols >> 2)
+
+
+def directions_from_mask(mask):
+    """Список направлений, биты которых установлены в маске."""
+    return [direction for direction in DIRECTIONS if mask & MOVE_BITS[direction]]
+
+
+def packable(grid):
+    """
+    True, если ходы по сетке можно считать табличным движком: сетка 4x4 и все плитки
+ меньше 32768, так что и результат любого слияния помещается в 4 бита.
+    """
+    grid = np.asarray(grid)
+    return grid.shape == (SIZE, SIZE) and int(grid.max()) < 1 << MAX_EXPONENT
+
+
+def has_max_tile(board):
+    """True, если на упакованном поле есть плитка 32768, которую табличный ход не сольет."""
+    return bool(board & (board >> 1) & (board >> 2) & (board >> 3) & 0x1111111111111111)
+
+
+def to_bitboard(grid):
+    """
+    Упаковывает сетку 4x4 со значениями плиток в 64-битное целое.
+
+ Аргументы:
+ grid (numpy.ndarray | list): Сетка значений плиток (0, 2, 4, ...).
+
+ Возвращается:
+ int: Упакованное поле.
+    """
+    board = 0
+    shift = 0
+    for row in grid:
+        for value in row:
+            value = int(value)
+            if value:
+                exponent = value.bit_length() - 1
+                if value != 1 << exponent or not 0 < exponent <= MAX_EXPONENT:
+                    raise ValueError(f"Tile value {value} cannot be packed")
+                board |= exponent << shift
+            shift += 4
+    return board
+
+
+def to_grid(board):
+    """
+    Распаковывает 64-битное поле в сетку 4x4 со значениями плиток.
+
+ Возвращается:
+ numpy.ndarray: Сетка значений плиток.
+    """
+    grid = np.zeros((SIZE, SIZE), dtype=int)
+    for index in range(SIZE * SIZE):
+        exponent = (board >> (4 * index)) & 0xF
+        if exponent:
+            grid[index // SIZE, index % SIZE] = 1 << exponent
+    return grid
+
+
+def empty_shifts(board):
+    """Возвращает битовые сдвиги всех пустых клеток поля."""
+    return [shift for shift in range(0, 64, 4) if not (board >> shift) & 0xF]
+
+
+def empty_mask(board):
+    """Маска пустых клеток: бит 4*i установлен, если клетка i пуста."""
+    occupied = board | (board >> 1)
+    occupied |= occupied >> 2
+    return ~occupied & 0x1111111111111111
+
+
+def add_random_tile(board, rng):
+    """
+    Добавляет плитку 2 (с вероятностью 0.9) или 4 в случайную пустую клетку.
+
+ Клетка выбирается как k-й установленный бит маски пустых клеток, без построения
+ списка. Порядок обращений к rng (randrange по числу пустых клеток, затем random)
+ совпадает с GameEngine.add_random_tile, поэтому одно зерно дает одну и ту же партию.
+
+ Аргументы:
+ board (int): Упакованное поле.
+ rng (random.Random): Генератор случайных чисел.
+
+ Возвращается:
+ int: Новое упакованное поле (без изменений, если пустых клеток нет).
+    """
+    empty = empty_mask(board)
+    count = empty.bit_count()
+    if not count:
+        return board
+    for _ in range(rng.randrange(count)):
+        empty &= empty - 1  # Drop the lowest empty cell
+    shift = (empty & -empty).bit_length() - 1
+    return board | ((1 if rng.random() < 0.9 else 2) << shift)
+
+
+def max_tile(board):
+    """Возвращает значение наибольшей плитки на поле."""
+    exponent = max((board >> shift) & 0xF for shift in range(0, 64, 4))
+    return 1 << exponent if exponent else 0
@@ -0,0 +1,354 @@
+"""
+Правила игры 2048 без графического интерфейса.
+
+Модуль не импортирует PyQt6, поэтому движок можно использовать в симуляциях,
+решателях и бенчмарках (в том числе в дочерних процессах) без QApplication.
+"""
+import random
+from collections import Counter
+
+import numpy as np
+
+import bitboard
+from batch import legal_moves_batch, move_batch
+from history import MoveHistory
+
+MIN_SIZE = 3
+MAX_SIZE = 8
+
+
+class GameEngine:
+    """
+    Состояние и правила одной партии 2048: сетка, счёт, условие победы и появление плиток.
+
+ Поле 4x4 обрабатывается табличным движком bitboard, поля других размеров -
+ векторизованным ядром batch; в обоих случаях ход, появление плитки и проверка
+ конца игры выполняются за время, линейное по числу клеток.
+    """
+    def __init__(self, win_condition=2048, size=bitboard.SIZE, seed=None):
+        """
+        Инициализирует пустое поле.
+
+ Аргументы:
+ win_condition (int): Значение плитки, при достижении которого партия выиграна.
+ size (int): Сторона поля, от MIN_SIZE до MAX_SIZE.
+ seed (int | None): Зерно генератора плиток (по умолчанию случайное).
+        """
+        if not MIN_SIZE <= size <= MAX_SIZE:
+            raise ValueError(f"Board size must be between {MIN_SIZE} and {MAX_SIZE}, got {size}")
+        self.size = size
+        self._grid = np.zeros((self.size, self.size), dtype=int)
+        self.move_mask = 0  # Legal-move bitmask (bitboard.MOVE_BITS); None means "recompute"
+        self.score = 0
+        self.moves = 0
+        self.win_condition = win_condition
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.move_log = bytearray()  # Indices into bitboard.DIRECTIONS of every move that changed the board
+        self.history = MoveHistory()
+        self.replayable = False  # True while the game can be reproduced from seed and move_log
+        self.merge_counts = Counter()  # Tile value -> merges that produced it in this game
+        self.merge_log = []  # Merges (Counter or None) of every move in move_log, to follow undo and redo
+
+    @property
+    def grid(self):
+        """
+        Игровая сетка. После изменения сетки в обход методов движка (например,
+ grid[i, j] = ...) нужно вызвать invalidate_moves().
+        """
+        return self._grid
+
+    @grid.setter
+    def grid(self, value):
+        self._grid = np.asarray(value, dtype=int)
+        self.move_mask = None
+        self.history.clear()
+        self.replayable = False
+
+    def invalidate_moves(self):
+        """Сбрасывает кэш маски допустимых ходов."""
+        self.move_mask = None
+
+    def legal_moves(self):
+        """
+        Маска допустимых ходов текущего поля (биты bitboard.MOVE_BITS).
+
+ Маска вычисляется при каждом ходе вместе с новым полем, поэтому проверка
+ конца игры, подсказки и поиск не сканируют сетку повторно.
+        """
+        if self.move_mask is None:
+            board = self._packed()
+            if board is None:
+                self.move_mask = int(legal_moves_batch(self._grid[np.newaxis])[0])
+            else:
+                self.move_mask = bitboard.legal_moves(board)
+        return self.move_mask
+
+    def packable(self):
+        """True, если ходы текущего поля считает табличный движок bitboard (см. bitboard.packable)."""
+        return bitboard.packable(self._grid)
+
+    def _packed(self):
+        """Упакованное поле для табличного движка или None, если ходы считаются по сетке."""
+        if not self.packable():
+            return None  # Other sizes, or a 32768 tile whose merge would overflow 4 bits
+        return bitboard.to_bitboard(self._grid)
+
+    def new_game(self, seed=None):
+        """
+        Очищает поле, сбрасывает счёт и добавляет две начальные плитки.
+
+ Аргументы:
+ seed (int | None): Зерно генератора плиток для этой партии (по умолчанию случайное).
+ Партия однозначно воспроизводится по зерну, размеру поля и списку ходов.
+        """
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(64)
+        self.rng = random.Random(self.seed)
+        self.move_log = bytearray()
+        self.grid.fill(0)
+        self.score = 0
+        self.moves = 0
+        self.merge_counts.clear()
+        self.merge_log = []
+        self.add_random_tile()
+        self.add_random_tile()
+        self.history.clear()
+        self.history.push(*self.snapshot())
+        self.replayable = True
+
+    def add_random_tile(self):
+        """
+        Добавляет плитку 2 (с вероятностью 0.9) или 4 в случайную пустую клетку.
+
+ Возвращается:
+ tuple | None: (строка, столбец) новой плитки или None, если пустых клеток нет.
+        """
+        empty_cells = np.flatnonzero(self._grid == 0)
+        if not empty_cells.size:
+            return None
+        row, col = divmod(int(empty_cells[self.rng.randrange(empty_cells.size)]), self.size)
+        self._grid[row, col] = 2 if self.rng.random() < 0.9 else 4
+        self.move_mask = None
+        return row, col
+
+    def move_grid(self, grid, direction):
+        """
+        Вычисляет результат хода для произвольной сетки, не меняя состояние движка.
+
+ Аргументы:
+ grid (numpy.ndarray): Игровая сетка.
+ direction (str): направление перемещения ("up", "down", "left" или "right").
+
+ Возвращается:
+ tuple: (новая сетка, набранные очки).
+        """
+        grid = np.asarray(grid)
+        if bitboard.packable(grid):
+            board, score_increase = bitboard.move(bitboard.to_bitboard(grid), direction)
+            return bitboard.to_grid(board), score_increase
+        new_grids, scores, _ = move_batch(grid[np.newaxis], direction)
+        return new_grids[0], int(scores[0])
+
+    def move(self, direction):
+        """
+        Выполняет ход и, если поле изменилось, добавляет новую плитку.
+
+ Аргументы:
+ direction (str): направление перемещения ("up", "down", "left" или "right").
+
+ Возвращается:
+ bool: True, если ход изменил поле.
+        """
+        if self.move_mask is not None and not self.move_mask & bitboard.MOVE_BITS[direction]:
+            return False
+        if self.history.current() is None:
+            self.history.push(*self.snapshot())  # Make the starting position undoable
+        board = self._packed()
+        if board is None:
+            new_grids, scores, changed = move_batch(self._grid[np.newaxis], direction)
+            if not changed[0]:
+                return False
+            merges = None
+            if scores[0]:
+                merges = self._count_merges(_grid_histogram(self._grid), _grid_histogram(new_grids[0]))
+            self._grid[:] = new_grids[0]
+            self.score += int(scores[0])
+            self.moves += 1
+            self.add_random_tile()
+            self.move_mask = int(legal_moves_batch(self._grid[np.newaxis])[0])
+            self._record_move(direction, self._grid_state(), merges)
+            return True
+
+        new_board, score_increase = bitboard.move(board, direction)
+        if new_board == board:
+            return False
+        merges = None
+        if score_increase:
+            merges = self._count_merges(_board_histogram(board), _board_histogram(new_board))
+        new_board = bitboard.add_random_tile(new_board, self.rng)
+        self._grid[:] = bitboard.to_grid(new_board)
+        self.score += score_increase
+        self.moves += 1
+        if bitboard.has_max_tile(new_board):
+            # The table cannot merge 32768 tiles: the grid path takes over from this position.
+            self.move_mask = None
+            self._record_move(direction, self._grid_state(), merges)
+        else:
+            self.move_mask = bitboard.legal_moves(new_board)
+            self._record_move(direction, new_board, merges)
+        return True
+
+    def _count_merges(self, before, after):
+        """
+        Слияния хода по гистограммам показателей степени до и после сдвига (без новой плитки);
+ добавляются в merge_counts.
+
+ Возвращается:
+ Counter: Значение плитки -> число слияний, которые ее создали.
+        """
+        merges = Counter()
+        merged = 0  # Merges that produced tiles of the current exponent
+        for exponent in range(1, len(before)):
+            # Tiles of this exponent that are gone, beyond those the merges created, merged in pairs.
+            merged = (before[exponent] + merged - (after[exponent] if exponent < len(after) else 0)) // 2
+            if merged:
+                merges[1 << (exponent + 1)] += merged
+        self.merge_counts += merges
+        return merges
+
+    def _record_move(self, direction, state, merges=None):
+        """Дописывает сделанный ход (и его слияния) в журнал партии и в историю отмены."""
+        if self.history.can_redo():
+            # The RNG has already produced the tiles of the undone moves, so the
+            # seed and move log no longer describe this line of play.
+            self.replayable = False
+        del self.move_log[self.moves - 1:]
+        self.move_log.append(bitboard.DIRECTIONS.index(direction))
+        del self.merge_log[self.moves - 1:]
+        self.merge_log.extend([None] * (self.moves - 1 - len(self.merge_log)))
+        self.merge_log.append(merges)
+        self.history.push(state, self.score, self.moves)
+
+    def _grid_state(self):
+        """Показатели степени плиток в виде bytes (снимок для полей, не помещающихся в 64 бита)."""
+        exponents = np.zeros(self._grid.shape, dtype=np.uint8)
+        occupied = self._grid > 0
+        exponents[occupied] = np.log2(self._grid[occupied]).astype(np.uint8)
+        return exponents.tobytes()
+
+    def snapshot(self):
+        """
+        Компактный снимок позиции для отмены ходов, поиска и инструментов воспроизведения.
+
+ Возвращается:
+ tuple: (поле, счёт, число ходов); поле - упакованный int для 4x4 или bytes показателей.
+        """
+        state = self._packed()
+        if state is None:
+            state = self._grid_state()
+        return state, self.score, self.moves
+
+    def restore(self, snapshot):
+        """Восстанавливает позицию из снимка, полученного от snapshot()."""
+        state, score, moves = snapshot
+        if isinstance(state, int):
+            self._grid[:] = bitboard.to_grid(state)
+            self.move_mask = bitboard.legal_moves(state)
+        else:
+            exponents = np.frombuffer(state, dtype=np.uint8).reshape(self.size, self.size).astype(int)
+            self._grid[:] = np.where(exponents > 0, 1 << exponents, 0)
+            self.move_mask = None
+        self.score = score
+        self.moves = moves
+
+    def undo(self):
+        """Отменяет последний ход. Возвращает False, если отменять нечего."""
+        snapshot = self.history.undo()
+        if snapshot is None:
+            return False
+        self._rewind_merges(snapshot[2])
+        self.restore(snapshot)
+        return True
+
+    def redo(self):
+        """Повторяет отмененный ход. Возвращает False, если повторять нечего."""
+        snapshot = self.history.redo()
+        if snapshot is None:
+            return False
+        self._rewind_merges(snapshot[2])
+        self.restore(snapshot)
+        return True
+
+    def _rewind_merges(self, moves):
+        """Приводит merge_counts к позиции после moves ходов (при отмене и повторе)."""
+        if moves < self.moves:
+            for merges in self.merge_log[moves:self.moves]:
+                if merges:
+                    self.merge_counts -= merges
+        else:
+            for merges in self.merge_log[self.moves:moves]:
+                if merges:
+                    self.merge_counts += merges
+
+    def check_win(self):
+        """Проверяет, достигнута ли плитка, равная условию победы."""
+        return bool(np.any(self.grid == self.win_condition))
+
+    def check_lose(self):
+        """Проверяет, что ходов больше нет (маска допустимых ходов пуста)."""
+        return self.legal_moves() == 0
+
+
+def slide_paths(grid, direction):
+    """
+    Пути плиток при ходе - для анимации; состояние игры не меняется.
+
+ Аргументы:
+ grid (numpy.ndarray): Сетка до хода.
+ direction (str): направление перемещения ("up", "down", "left" или "right").
+
+ Возвращается:
+ list: Кортежи (строка, столбец, новая строка, новый столбец, значение) для каждой плитки;
+ две плитки, которые сливаются, приходят в одну клетку.
+    """
+    size = len(grid)
+    paths = []
+    for line in range(size):
+        # Cells of the line, starting from the wall the tiles move towards.
+        if direction == "left":
+            cells = [(line, k) for k in range(size)]
+        elif direction == "right":
+            cells = [(line, size - 1 - k) for k in range(size)]
+        elif direction == "up":
+            cells = [(k, line) for k in range(size)]
+        elif direction == "down":
+            cells = [(size - 1 - k, line) for k in range(size)]
+        else:
+            raise ValueError(f"Unknown direction: {direction}")
+        target = -1
+        mergeable = 0  # Value at the target cell that can still absorb an equal tile
+        for row, col in cells:
+            value = int(grid[row][col])
+            if not value:
+                continue
+            if value == mergeable:
+                mergeable = 0
+            else:
+                target += 1
+                mergeable = value
+            paths.append((row, col) + cells[target] + (value,))
+    return paths
+
+
+def _board_histogram(board):
+    """Количество плиток каждого показателя степени на упакованном поле."""
+    histogram = [0] * (bitboard.MAX_EXPONENT + 1)
+    for shift in range(0, 64, 4):
+        histogram[(board >> shift) & 0xF] += 1
+    return histogram
+
+
+def _grid_histogram(grid):
+    """Количество плиток каждого показателя степени на сетке."""
+    tiles = grid[grid > 0]
+    return np.bincount(np.frexp(tiles)[1] - 1, minlength=2).tolist()
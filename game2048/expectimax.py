@@ -0,0 +1,194 @@
+"""
+Решатель 2048 на основе expectimax-поиска по упакованному полю.
+
+Узлы игрока перебирают четыре хода, узлы случая - появление плитки 2 (0.9)
+или 4 (0.1) в каждой пустой клетке, как в GameEngine.add_random_tile.
+Оценки узлов случая кэшируются в таблице транспозиций по упакованному полю.
+"""
+import time
+
+import bitboard
+
+# Веса эвристики (подобраны для поля 4x4)
+SCORE_LOST_PENALTY = 200000.0
+SCORE_MONOTONICITY_POWER = 4.0
+SCORE_MONOTONICITY_WEIGHT = 47.0
+SCORE_SUM_POWER = 3.5
+SCORE_SUM_WEIGHT = 11.0
+SCORE_MERGES_WEIGHT = 700.0
+SCORE_EMPTY_WEIGHT = 270.0
+
+# Ветви с вероятностью ниже порога оцениваются эвристикой без углубления
+PROBABILITY_CUTOFF = 0.0001
+
+_heuristic_table = None
+
+
+def _build_heuristic_table():
+    """Вычисляет эвристическую оценку каждой из 65536 строк."""
+    table = [0.0] * 65536
+    for row in range(65536):
+        line = [(row >> (4 * i)) & 0xF for i in range(bitboard.SIZE)]
+        total = 0.0
+        empty = 0
+        merges = 0
+        prev = 0
+        counter = 0
+        for rank in line:
+            total += rank ** SCORE_SUM_POWER
+            if rank == 0:
+                empty += 1
+            else:
+                if prev == rank:
+                    counter += 1
+                elif counter > 0:
+                    merges += 1 + counter
+                    counter = 0
+                prev = rank
+        if counter > 0:
+            merges += 1 + counter
+
+        monotonicity_left = 0.0
+        monotonicity_right = 0.0
+        for i in range(1, bitboard.SIZE):
+            left = line[i - 1] ** SCORE_MONOTONICITY_POWER
+            right = line[i] ** SCORE_MONOTONICITY_POWER
+            if line[i - 1] > line[i]:
+                monotonicity_left += left - right
+            else:
+                monotonicity_right += right - left
+
+        table[row] = (SCORE_LOST_PENALTY
+                      + SCORE_EMPTY_WEIGHT * empty
+                      + SCORE_MERGES_WEIGHT * merges
+                      - SCORE_MONOTONICITY_WEIGHT * min(monotonicity_left, monotonicity_right)
+                      - SCORE_SUM_WEIGHT * total)
+    return table
+
+
+def _get_heuristic_table():
+    """Строит таблицу эвристики при первом обращении."""
+    global _heuristic_table
+    if _heuristic_table is None:
+        _heuristic_table = _build_heuristic_table()
+    return _heuristic_table
+
+
+class _SearchTimeout(Exception):
+    """Бюджет времени на поиск исчерпан или поиск отменен."""
+
+
+class ExpectimaxSolver:
+    """
+    Выбирает ход с наибольшим ожидаемым значением эвристики на заданной глубине.
+    """
+    def __init__(self, depth=3, time_limit=None):
+        """
+        Аргументы:
+ depth (int): Глубина поиска в ходах игрока.
+ time_limit (float | None): Бюджет времени на один ход в секундах. Если задан,
+ поиск выполняется с итеративным углублением до depth и возвращает лучший
+ ход последней полностью завершённой итерации.
+        """
+        self.depth = depth
+        self.time_limit = time_limit
+        self.heuristic_table = _get_heuristic_table()
+        self.transposition_table = {}
+        self.nodes = 0
+        self.cache_hits = 0
+        self._deadline = None
+        self._cancel = None
+
+    def evaluate(self, board):
+        """Статическая оценка упакованного поля (строки и столбцы)."""
+        table = self.heuristic_table
+        mask = bitboard.ROW_MASK
+        transposed = bitboard.transpose(board)
+        return (table[board & mask] + table[(board >> 16) & mask]
+                + table[(board >> 32) & mask] + table[(board >> 48) & mask]
+                + table[transposed & mask] + table[(transposed >> 16) & mask]
+                + table[(transposed >> 32) & mask] + table[(transposed >> 48) & mask])
+
+    def best_move(self, board, cancel=None):
+        """
+        Ищет лучший ход для упакованного поля.
+
+ Аргументы:
+ board (int): Упакованное поле.
+ cancel (threading.Event | None): Событие отмены поиска из другого потока. После отмены
+ возвращается лучший ход последней завершённой итерации углубления.
+
+ Возвращается:
+ str | None: Направление хода или None, если допустимых ходов нет.
+        """
+        self.nodes = 0
+        self.cache_hits = 0
+        self._cancel = cancel
+        if self.time_limit is None and cancel is None:
+            self._deadline = None
+            return self._search_root(board, self.depth)
+
+        self._deadline = None if self.time_limit is None else time.perf_counter() + self.time_limit
+        best = None
+        for depth in range(1, self.depth + 1):
+            try:
+                best = self._search_root(board, depth)
+            except _SearchTimeout:
+                break
+        if best is None:
+            # Not even depth 1 finished in time: fall back to any legal move.
+            directions = bitboard.directions_from_mask(bitboard.legal_moves(board))
+            return directions[0] if directions else None
+        return best
+
+    def _search_root(self, board, depth):
+        """Оценивает каждый допустимый ход из корня на заданной глубине."""
+        self.transposition_table = {}
+        best_direction = None
+        best_value = -1.0
+        for direction in bitboard.DIRECTIONS:
+            new_board, _ = bitboard.move(board, direction)
+            if new_board == board:
+                continue
+            value = self._chance_node(new_board, depth - 1, 1.0)
+            if value > best_value:
+                best_value = value
+                best_direction = direction
+        return best_direction
+
+    def _chance_node(self, board, depth, probability):
+        """Усредняет оценку по всем вариантам появления новой плитки."""
+        if depth == 0 or probability < PROBABILITY_CUTOFF:
+            return self.evaluate(board)
+        entry = self.transposition_table.get(board)
+        if entry is not None and entry[0] >= depth:
+            self.cache_hits += 1
+            return entry[1]
+
+        empty_shifts = bitboard.empty_shifts(board)
+        if not empty_shifts:
+            return self.evaluate(board)
+        probability /= len(empty_shifts)
+        total = 0.0
+        for shift in empty_shifts:
+            total += 0.9 * self._max_node(board | (1 << shift), depth, probability * 0.9)
+            total += 0.1 * self._max_node(board | (2 << shift), depth, probability * 0.1)
+        value = total / len(empty_shifts)
+        self.transposition_table[board] = (depth, value)
+        return value
+
+    def _max_node(self, board, depth, probability):
+        """Выбирает ход с наибольшей ожидаемой оценкой."""
+        self.nodes += 1
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise _SearchTimeout()
+        if self._cancel is not None and self._cancel.is_set():
+            raise _SearchTimeout()
+        best = 0.0
+        mask = bitboard.legal_moves(board)
+        for direction in bitboard.DIRECTIONS:
+            if mask & bitboard.MOVE_BITS[direction]:
+                value = self._chance_node(bitboard.move(board, direction)[0], depth - 1, probability)
+                if value > best:
+                    best = value
+        return best
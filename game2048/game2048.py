@@ -1,80 +1,218 @@
 import sys
-import random
+import time
+
+if "--profile-startup" in sys.argv:
+    # Installed before any other import so that every import below is timed.
+    from startup_profile import ImportProfiler
+    startup_profiler = ImportProfiler()
+    startup_profiler.install()
+else:
+    startup_profiler = None
+
 import numpy as np
-from PyQt6.QtWidgets import QApplication, QWidget, QLabel, QGridLayout, QPushButton, QMessageBox, QVBoxLayout
-from PyQt6.QtCore import Qt, QSize
-from PyQt6.QtGui import QIcon, QKeyEvent, QFont
+from PyQt6.QtWidgets import QApplication, QWidget, QLabel, QGridLayout, QPushButton, QMessageBox, QVBoxLayout, QSizePolicy, QComboBox
+from PyQt6.QtCore import Qt, QSize, QRect, pyqtSignal, QTimer, QVariantAnimation
+from PyQt6.QtGui import QIcon, QKeyEvent, QFont, QPainter, QPixmap, QColor
 import functools
-
-import os
-import sqlite3
-import appdirs
+import threading
+from collections import deque
 import logging
 
+# The score store (sqlite3, appdirs), replays, hints and the n-tuple network are
+# imported where they are used, so that they stay off the startup path.
+# numpy and the engine (with the bitboard row tables) stay at module level on purpose:
+# the game window is created before the selection window and builds its GameEngine in
+# __init__, so deferring them would only move their import before the first window.
+from engine import GameEngine, MIN_SIZE, MAX_SIZE, slide_paths
+import bitboard
 
-class GameCell(QLabel):
-    """
-    Представляет собой отдельную ячейку в сетке игры 2048. Наследуется от QLabel для отображения значения ячейки.
-    """
-    def __init__(self, value=0, parent=None):
-        """
-        Инициализирует игровую ячейку необязательным начальным значением.
 
- Args:
- value (int): Начальное значение ячейки (по умолчанию равно 0).
- parent (QWidget): Родительский виджет (необязательно).
-        """
-        super().__init__(parent)  # Call the QLabel constructor
-        self.value = value
-        self.setFixedSize(QSize(100, 100)) #Sets the fixed size of the cell.
-        self.setAlignment(Qt.AlignmentFlag.AlignCenter) # Aligns text to the center of the cell.
-        self.setStyleSheet(self.get_style()) # Applies initial styling based on the value.
-        self.setFont(QFont("Arial", 28)) # Sets the font of the text within the cell.
+TILE_COLORS = {2: "#eee4da", 4: "#ede0c8", 8: "#f2b179", 16: "#f59563", 32: "#f67c5f", 64: "#f65e3b", 128: "#edcf72", 256: "#edcc61", 512: "#edc850", 1024: "#edc53f", 2048: "#edc22e"}
+DEFAULT_TILE_COLOR = "#3c3a32"  # Tiles above 2048
+EMPTY_CELL_COLOR = "#ccc"
+BORDER_COLOR = "#999"
+BOARD_BACKGROUND = "#f0f0f0"
+TILE_SIZE = 100  # Preferred tile size in pixels
+TILE_GAP = 4
+ANIMATION_MS = 100  # Duration of the slide animation
+HINT_ARROWS = {"up": "↑", "down": "↓", "left": "←", "right": "→"}
 
 
-    def set_value(self, value):
-        """
-        Обновляет значение ячейки и перерисовывает его.
+def tile_color(value):
+    """
+    Возвращает цвет фона плитки на основе ее значения.
 
  Аргументы:
- значение (int): новое значение для ячейки.
-        """
-        self.value = value
-        self.setText(str(value) if value else "") # Sets text to the value if it's not 0, otherwise sets it to an empty string.
-        self.setStyleSheet(self.get_style()) #Updates the styling based on the new value.
+ значение (int): значение плитки (0 - пустая клетка).
 
+ Возвращается:
+ str: Цветовая строка.
+    """
+    if value == 0:
+        return EMPTY_CELL_COLOR
+    return TILE_COLORS.get(value, DEFAULT_TILE_COLOR)
 
-    def get_style(self):
-        """
-        Возвращает строку стиля CSS для ячейки на основе ее значения.
 
- Возвращается:
- str: Строка в стиле CSS.
+class BoardWidget(QWidget):
+    """
+    Игровое поле, которое рисует все плитки в одном paintEvent.
+ Изображения плиток кэшируются по значению и размеру, поэтому поле любого размера
+ перерисовывается копированием готовых QPixmap.
+
+ Анимация сдвига только отображает уже сделанный ход: если новый ход приходит
+ до ее окончания, текущая анимация обрывается и начинается анимация нового хода.
+    """
+    def __init__(self, board_size=4, parent=None):
         """
-        if self.value == 0:
-            return "background-color: #ccc; border: 1px solid #999;" #Style for empty cells.
-        color = self.get_color(self.value) #Gets the background color based on the value.
-        return f"background-color: {color}; border: 1px solid #999; color: white;" #Style for cells with values.
+        Аргументы:
+ board_size (int): Количество клеток по стороне поля.
+ parent (QWidget): Родительский виджет (необязательно).
+        """
+        super().__init__(parent)
+        self.board_size = board_size
+        self.grid = np.zeros((board_size, board_size), dtype=int)  # What is currently painted
+        self.pixmap_cache = {}
+        self.paths = None  # Tile paths of the move being animated
+        self.progress = 1.0
+        self.animation = QVariantAnimation(self)
+        self.animation.setStartValue(0.0)
+        self.animation.setEndValue(1.0)
+        self.animation.setDuration(ANIMATION_MS)
+        self.animation.valueChanged.connect(self._animation_step)
+        self.animation.finished.connect(self._animation_finished)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.setMinimumSize(board_size * 24, board_size * 24)
+
+    def sizeHint(self):
+        side = self.board_size * TILE_SIZE + (self.board_size + 1) * TILE_GAP
+        return QSize(side, side)
+
+    def tile_size(self):
+        """Текущий размер плитки в пикселях с учетом размера виджета."""
+        side = min(self.width(), self.height())
+        return (side - (self.board_size + 1) * TILE_GAP) // self.board_size
+
+    def tile_rect(self, row, col):
+        """Прямоугольник плитки в координатах виджета."""
+        tile_size = self.tile_size()
+        return QRect(TILE_GAP + col * (tile_size + TILE_GAP), TILE_GAP + row * (tile_size + TILE_GAP), tile_size, tile_size)
+
+    def set_grid(self, grid):
+        """
+        Показывает новую сетку, запрашивая перерисовку только изменившихся плиток.
 
+ Аргументы:
+ grid (numpy.ndarray): Игровая сетка.
+        """
+        grid = np.asarray(grid)
+        if self.paths is not None:
+            self.animation.stop()
+            self.paths = None
+            self.update()  # The last animation frame covers the whole board
+        if grid.shape != self.grid.shape:
+            self.board_size = grid.shape[0]
+            self.grid = grid.copy()
+            self.setMinimumSize(self.board_size * 24, self.board_size * 24)
+            self.updateGeometry()
+            self.update()
+            return
+        rows, cols = np.nonzero(grid != self.grid)
+        for i, j in zip(rows.tolist(), cols.tolist()):
+            self.update(self.tile_rect(i, j))
+        self.grid = grid.copy()
 
-    def get_color(self, value):
+    def animate(self, grid, paths):
         """
-        Возвращает цвет фона для ячейки на основе ее значения.
+        Показывает новую сетку после анимации сдвига плиток.
 
  Аргументы:
- значение (int): значение ячейки.
-
- Возвращается:
- str: Цветовая строка CSS.
+ grid (numpy.ndarray): Сетка после хода (с новой плиткой).
+ paths (list): Пути плиток из engine.slide_paths.
         """
-        colors = {2: "#eee4da", 4: "#ede0c8", 8: "#f2b179", 16: "#f59563", 32: "#f67c5f", 64: "#f65e3b", 128: "#edcf72", 256: "#edcc61", 512: "#edc850", 1024: "#edc53f", 2048: "#edc22e"}
-        return colors.get(value, "#3c3a32")
+        self.animation.stop()  # Skip the rest of an animation that input has outpaced
+        self.grid = np.asarray(grid).copy()
+        self.paths = paths
+        self.progress = 0.0
+        self.animation.start()
+        self.update()
+
+    def _animation_step(self, value):
+        self.progress = value
+        self.update()
+
+    def _animation_finished(self):
+        self.paths = None
+        self.progress = 1.0
+        self.update()
+
+    def tile_pixmap(self, value, tile_size):
+        """Возвращает (и при необходимости рисует) изображение плитки."""
+        key = (value, tile_size)
+        pixmap = self.pixmap_cache.get(key)
+        if pixmap is not None:
+            return pixmap
+        if any(size != tile_size for _, size in self.pixmap_cache):
+            self.pixmap_cache.clear()  # The widget was resized; old tiles will not be used again
+
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(max(1, round(tile_size * ratio)), max(1, round(tile_size * ratio)))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(QColor(tile_color(value)))
+        painter = QPainter(pixmap)
+        painter.setPen(QColor(BORDER_COLOR))
+        painter.drawRect(0, 0, tile_size - 1, tile_size - 1)
+        if value:
+            text = str(value)
+            font = QFont("Arial")
+            font.setPixelSize(max(8, int(tile_size * (0.37 if len(text) <= 2 else 0.3 if len(text) == 3 else 0.24))))
+            painter.setFont(font)
+            painter.setPen(QColor("white"))
+            painter.drawText(QRect(0, 0, tile_size, tile_size), Qt.AlignmentFlag.AlignCenter, text)
+        painter.end()
+        self.pixmap_cache[key] = pixmap
+        return pixmap
+
+    def paintEvent(self, event):
+        """Рисует фон и все плитки, попадающие в перерисовываемую область."""
+        painter = QPainter(self)
+        painter.fillRect(event.rect(), QColor(BOARD_BACKGROUND))
+        tile_size = self.tile_size()
+        if tile_size > 0 and self.paths is not None:
+            empty = self.tile_pixmap(0, tile_size)
+            for i in range(self.board_size):
+                for j in range(self.board_size):
+                    painter.drawPixmap(self.tile_rect(i, j).topLeft(), empty)
+            step = tile_size + TILE_GAP
+            for row, col, new_row, new_col, value in self.paths:
+                x = TILE_GAP + round((col + (new_col - col) * self.progress) * step)
+                y = TILE_GAP + round((row + (new_row - row) * self.progress) * step)
+                painter.drawPixmap(x, y, self.tile_pixmap(value, tile_size))
+        elif tile_size > 0:
+            for i in range(self.board_size):
+                for j in range(self.board_size):
+                    rect = self.tile_rect(i, j)
+                    if rect.intersects(event.rect()):
+                        painter.drawPixmap(rect.topLeft(), self.tile_pixmap(int(self.grid[i, j]), tile_size))
+        painter.end()
+
+
+# Win conditions offered in the selection window, in display order
+DIFFICULTY_BUTTON_STYLES = {
+    2048: "background-color: #4CAF50; color: white; padding: 10px; font-size: 16px;",
+    256: "background-color: #FF9800; color: white; padding: 10px; font-size: 16px;",
+    512: "background-color: #2196F3; color: white; padding: 10px; font-size: 16px;",
+    1024: "background-color: #9C27B0; color: white; padding: 10px; font-size: 16px;",
+}
+BOARD_SIZES = list(range(MIN_SIZE, MAX_SIZE + 1))
+
 
 class DifficultySelectionWindow(QWidget):
     """
     Окно, позволяющее пользователю выбрать сложность (условие победы) игры 2048.
  Отображает последний результат и рекордное количество очков.
     """
+    stats_loaded = pyqtSignal(int, object)  # (high score, summary rows) from the loader thread
+
     def __init__(self, game_window):
         """
         Инициализирует окно выбора сложности.
@@ -91,7 +229,7 @@ class DifficultySelectionWindow(QWidget):
         self.setLayout(layout)
         self.setMinimumSize(400, 300)  # Adjust size if needed
         self.setStyleSheet("background-color: #f0f0f0;")  # Set background color
-        self.high_score = self.load_high_score() #Loads high score from database on initialization.
+        self.high_score = 0  # Loaded in the background so that the window appears first
 
         # Close button
         close_button = QPushButton("X")
@@ -103,37 +241,69 @@ class DifficultySelectionWindow(QWidget):
         #Labels for last score and high score.
         self.last_score_label = QLabel(f"Last Score: {self.game_window.score}")
         self.last_score_label.setStyleSheet("font-size: 16px;")
-        self.high_score_label = QLabel(f"High Score: {self.high_score}")
+        self.high_score_label = QLabel("High Score: …")
         self.high_score_label.setStyleSheet("font-size: 16px;")
         layout.addWidget(self.last_score_label)
         layout.addWidget(self.high_score_label)
+        self.stats_label = QLabel("")
+        self.stats_label.setStyleSheet("font-size: 13px;")
+        layout.addWidget(self.stats_label)
+
+        #Board size selector
+        self.size_combo = QComboBox()
+        self.size_combo.setStyleSheet("font-size: 16px;")
+        for size in BOARD_SIZES:
+            self.size_combo.addItem(f"{size}x{size}", size)
+        self.size_combo.setCurrentIndex(BOARD_SIZES.index(self.game_window.size))
+        layout.addWidget(self.size_combo)
 
         #Difficulty buttons
-        button_styles = {
-            2048: "background-color: #4CAF50; color: white; padding: 10px; font-size: 16px;",
-            256: "background-color: #FF9800; color: white; padding: 10px; font-size: 16px;",
-            512: "background-color: #2196F3; color: white; padding: 10px; font-size: 16px;",
-            1024: "background-color: #9C27B0; color: white; padding: 10px; font-size: 16px;",
-        }
-        for difficulty, style in button_styles.items():
+        for difficulty, style in DIFFICULTY_BUTTON_STYLES.items():
             button = QPushButton(str(difficulty))
             button.setStyleSheet(style)
             button.clicked.connect(functools.partial(self.select_difficulty, difficulty))
             layout.addWidget(button)
         self.show()
+        self.stats_loaded.connect(self.set_stats)
+        self.reload_stats()
+
+    def reload_stats(self):
+        """Перечитывает рекорд и сводную статистику в фоновом потоке."""
+        threading.Thread(target=self._load_stats_in_background, name="StatsLoader", daemon=True).start()
+
+    def _load_stats_in_background(self):
+        """Открывает хранилище результатов и читает рекорд и сводку вне потока интерфейса."""
+        high_score = self.load_high_score()
+        summary = load_stats_summary()
+        try:
+            self.stats_loaded.emit(high_score, summary)
+        except RuntimeError:
+            pass  # The window was destroyed while the store was opening
+
+    def set_high_score(self, high_score):
+        """Показывает загруженный рекорд (если за это время не был поставлен новый)."""
+        self.high_score = max(self.high_score, high_score)
+        self.high_score_label.setText(f"High Score: {self.high_score}")
+
+    def set_stats(self, high_score, summary):
+        """Показывает рекорд и статистику по сложностям."""
+        self.set_high_score(high_score)
+        self.stats_label.setText("\n".join(
+            f"{row['difficulty']}: {row['games']} games, best {row['best_score']}, max tile {row['max_tile']},"
+            f" avg {row['mean_score']:.0f}, {row['ms_per_move'] or 0:.0f} ms/move"
+            for row in summary))
 
     def select_difficulty(self, difficulty):
         """
-        Управляет выбором уровня сложности. Сбрасывает счет в игре, устанавливает условие выигрыша,
-закрывает окно выбора сложности и отображает главное окно игры.
+        Управляет выбором уровня сложности. Устанавливает размер поля и условие выигрыша,
+закрывает окно выбора сложности и начинает новую игру в главном окне.
 
  Аргументы:
  сложность (int): выбранный уровень сложности (условие выигрыша).
         """
-        self.game_window.score = 0
-        self.game_window.win_condition = difficulty
+        self.game_window.set_board_size(self.size_combo.currentData())
         self.close()
-        self.game_window.show()
+        self.game_window.set_difficulty(difficulty)  # Starts a new game and shows the window
 
     def load_high_score(self):
         """Загружает высокий балл из базы данных."""
@@ -147,76 +317,84 @@ class DifficultySelectionWindow(QWidget):
         """Обновляет отображаемый последний балл и высокий балл."""
         self.last_score_label.setText(f"Last Score: {score}")
         if score > self.high_score:
-            self.high_score = score
-            self.save_high_score(score)
+            self.high_score = score  # The finished game itself is recorded by Game2048.record_game
         self.high_score_label.setText(f"High Score: {self.high_score}")
+        self.reload_stats()
+
+
+def load_stats_summary():
+    """Сводка по сложностям (ScoreStore.difficulty_summary); пустой список при ошибке."""
+    import sqlite3
+    from score_store import get_score_store
+    try:
+        return get_score_store().difficulty_summary()
+    except (sqlite3.Error, OSError) as e:
+        logging.exception(f"Error loading statistics: {e}")
+        return []
 
 
 def initialize_database():
     """Инициализирует базу данных с высокими баллами."""
-    user_data_dir = appdirs.user_data_dir("game2048", "YourCompanyName")
-    db_path = os.path.join(user_data_dir, "high_scores.db")
+    import sqlite3
+    from score_store import get_score_store
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS high_scores (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                score INTEGER
-            )
-        ''')
-        conn.commit()
-        conn.close()
-        logging.info(f"Database initialized at: {db_path}")
-    except sqlite3.Error as e:
+        get_score_store()
+    except (sqlite3.Error, OSError) as e:
         logging.exception(f"Error initializing database: {e}")
+
+
 def save_high_score(score):
     """Сохраняет высокий балл в базе данных."""
+    import sqlite3
+    from score_store import get_score_store
     try:
-        user_data_dir = appdirs.user_data_dir("game2048", "YourCompanyName")
-        db_path = os.path.join(user_data_dir, "high_scores.db")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("INSERT OR REPLACE INTO high_scores (score) VALUES (?)", (int(score),))
-        conn.commit()
-        conn.close()
+        get_score_store().save_high_score(score)
         logging.info(f"High score saved: {score}")
-    except (sqlite3.Error, ValueError) as e:
+    except (sqlite3.Error, OSError, ValueError) as e:
         logging.exception(f"Error saving high score: {e}")
 
 
 def load_high_score():
     """Загружает высокий балл из базы данных."""
+    import sqlite3
+    from score_store import get_score_store
     try:
-        user_data_dir = appdirs.user_data_dir("game2048", "YourCompanyName")
-        db_path = os.path.join(user_data_dir, "high_scores.db")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT score FROM high_scores LIMIT 1")
-        result = cursor.fetchone()
-        conn.close()
-        return result[0] if result else 0  # Return 0 if no entry
-    except (sqlite3.Error, ValueError) as e:
+        return get_score_store().best_score()
+    except (sqlite3.Error, OSError) as e:
         logging.exception(f"Error loading high score: {e}")
         return 0
+
+
 class Game2048(QWidget):
     """
     Главное окно игры 2048. Управляет игровой сеткой, обновляет ее и обрабатывает вводимые пользователем данные.
     """
+    hint_ready = pyqtSignal(int, object)  # (request id, direction), delivered on the UI thread
+
     def __init__(self):
         super().__init__()
-        self.size = 4
-        self.grid = np.zeros((self.size, self.size), dtype=int)
-        self.cells = [[GameCell() for _ in range(self.size)] for _ in range(self.size)]
+        self.engine = GameEngine()  # Game rules and state live in the headless engine
+        self.size = self.engine.size
+        self.board_widget = BoardWidget(self.size)
         self.layout = QGridLayout()
         self.setLayout(self.layout)
         self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
-        self.win_condition = 2048  # Default win condition
         self.hide()  # Initially hidden
-        self.score = 0
+        self.started_at = time.monotonic()
+        self.last_move_at = self.started_at
+        self.move_events = []  # (direction index, score gain, ms since the previous move) of this game
         self.score_label = QLabel(f"Score: {self.score}")
         self.score_label.setFont(QFont("Arial", 16))
-        self.layout.addWidget(self.score_label, 0, self.size)
+        self.layout.addWidget(self.score_label, 0, 1, Qt.AlignmentFlag.AlignTop)
+        self.hint_label = QLabel("")
+        self.hint_label.setFont(QFont("Arial", 16))
+        self.layout.addWidget(self.hint_label, 0, 1, Qt.AlignmentFlag.AlignBottom)
+        self.suggestions = False  # Move-suggestion mode, toggled with n
+        self.network = None  # Loaded on first use from the memory-mapped weights file
+        self.hint_engine = None  # Background search, started on the first hint request
+        self.hint_request = None  # Id of the hint the label is waiting for
+        self.hint_ready.connect(self.show_hint)
+        self.input_queue = deque()  # Moves typed but not yet applied to the engine
         self.game_over = False
         self.init_grid()
         self.update_board()  # Initialize the board
@@ -226,8 +404,34 @@ class Game2048(QWidget):
         self.close_button.setFixedSize(70, 30)
         self.close_button.setStyleSheet("background-color: pink; color: black;")
         self.close_button.clicked.connect(self.return_to_selection)
-        self.layout.addWidget(self.close_button, self.size, 0, 1, 1)
+        self.layout.addWidget(self.close_button, 1, 0, 1, 1)
+
+    @property
+    def grid(self):
+        """Текущая игровая сетка (хранится в движке)."""
+        return self.engine.grid
 
+    @grid.setter
+    def grid(self, value):
+        self.engine.grid = np.asarray(value, dtype=int)
+
+    @property
+    def score(self):
+        """Текущий счёт (хранится в движке)."""
+        return self.engine.score
+
+    @score.setter
+    def score(self, value):
+        self.engine.score = value
+
+    @property
+    def win_condition(self):
+        """Условие победы (хранится в движке)."""
+        return self.engine.win_condition
+
+    @win_condition.setter
+    def win_condition(self, value):
+        self.engine.win_condition = value
 
     def return_to_selection(self):
         """Возвращается к окну выбора сложности и перезапускает игру."""
@@ -238,17 +442,21 @@ class Game2048(QWidget):
 
 
     def init_grid(self):
-        """Инициализирует расположение сетки."""
-        for i in range(self.size):
-            for j in range(self.size):
-                self.layout.addWidget(self.cells[i][j], i, j)
+        """Инициализирует расположение игрового поля."""
+        self.layout.addWidget(self.board_widget, 0, 0)
 
 
     def update_board(self):
-        """Обновляет отображение игрового поля в соответствии с текущей сеткой."""
-        for i in range(self.size):
-            for j in range(self.size):
-                self.cells[i][j].set_value(self.grid[i][j])
+        """Обновляет отображение игрового поля: перерисовываются только изменившиеся клетки."""
+        self.board_widget.set_grid(self.grid)
+
+    def set_board_size(self, size):
+        """Меняет размер поля; новая партия начинается при следующем new_game."""
+        if size != self.size:
+            self.engine = GameEngine(self.win_condition, size)
+            self.size = size
+            self.update_board()
+            self.adjustSize()
 
     def set_difficulty(self, difficulty):
         """Устанавливает условие выигрыша в игре и запускает новую игру."""
@@ -258,20 +466,20 @@ class Game2048(QWidget):
 
     def new_game(self):
         """Начните новую игру, очистив сетку, сбросив счет и добавив начальные плитки."""
-        self.grid.fill(0)
-        self.score = 0
+        self.cancel_hint()
+        self.input_queue.clear()
+        self.engine.new_game()
+        self.started_at = time.monotonic()
+        self.last_move_at = self.started_at
+        self.move_events = []
         self.score_label.setText(f"Score: {self.score}")
         self.update_board()
-        self.add_random_tile()
-        self.add_random_tile()
+        self.update_suggestion()
         self.game_over = False #Reset game over status
 
     def add_random_tile(self):
         """Добавляет случайные 2 или 4 плитки в пустую ячейку сетки."""
-        empty_cells = np.where(self.grid == 0)
-        if empty_cells[0].size:
-            row, col = random.choice(list(zip(empty_cells[0], empty_cells[1])))
-            self.grid[row, col] = 2 if random.random() < 0.9 else 4
+        if self.engine.add_random_tile() is not None:
             self.update_board()
 
     def move_tiles(self, direction):
@@ -280,19 +488,129 @@ class Game2048(QWidget):
 
  Аргументы:
  направление (str): направление перемещения ("вверх", "вниз", "влево" или "вправо").
+        """
+        self.input_queue.append(direction)
+        self.process_input()
+
+    def queue_move(self, direction):
+        """Ставит ход в очередь ввода; очередь разбирается в ближайшей итерации цикла событий."""
+        if self.game_over:
+            return
+        self.input_queue.append(direction)
+        if len(self.input_queue) == 1:
+            QTimer.singleShot(0, self.process_input)
+
+    def process_input(self):
+        """
+        Применяет к движку все накопившиеся ходы и анимирует только последний из них,
+ поэтому задержка ввода не зависит от длительности анимации.
         """
         try:
-            self.grid = self.move_tiles_helper(self.grid, direction)
-            self.update_board()
-            if self.check_win():
-                self.win_dialog()
-            elif self.check_lose():
-                self.lose_dialog()
-            else:
-                self.add_random_tile()
+            paths = None
+            moved = False
+            dialog = None
+            while self.input_queue:
+                direction = self.input_queue.popleft()
+                # Only the last queued move is animated; earlier frames are skipped.
+                last_paths = None if self.input_queue else slide_paths(self.grid, direction)
+                score_before = self.score
+                if self.engine.move(direction):  # Moves, merges and spawns a tile if the board changed
+                    moved = True
+                    paths = last_paths
+                    now = time.monotonic()
+                    del self.move_events[self.engine.moves - 1:]  # Drops the events of undone moves
+                    self.move_events.append((bitboard.DIRECTIONS.index(direction), self.score - score_before,
+                                             (now - self.last_move_at) * 1000.0))
+                    self.last_move_at = now
+                if self.check_win():
+                    dialog = self.win_dialog
+                elif self.check_lose():
+                    dialog = self.lose_dialog
+                if dialog is not None:
+                    self.input_queue.clear()
+            if moved:
+                self.score_label.setText(f"Score: {self.score}")
+                if paths:
+                    self.board_widget.animate(self.grid, paths)
+                else:
+                    self.update_board()
+                self.update_suggestion()
+            if dialog is not None:
+                dialog()
         except Exception as e:
             print(f"Error during move: {e}")
 
+    def undo_move(self):
+        """Отменяет последний ход."""
+        self.process_input()  # Queued moves were typed before this key
+        if self.engine.undo():
+            self.score_label.setText(f"Score: {self.score}")
+            self.update_board()
+            self.update_suggestion()
+
+    def redo_move(self):
+        """Повторяет отмененный ход."""
+        self.process_input()  # Queued moves were typed before this key
+        if self.engine.redo():
+            self.score_label.setText(f"Score: {self.score}")
+            self.update_board()
+            self.update_suggestion()
+
+    def request_hint(self):
+        """Запускает поиск подсказки в фоновом потоке; поток интерфейса не ждет результата."""
+        if not self.engine.packable():
+            self.hint_label.setText(self.hint_unavailable_text())
+            return
+        if self.hint_engine is None:
+            from hint import HintEngine
+            # The worker runs outside Qt; the signal queues its result onto the UI thread.
+            self.hint_engine = HintEngine(lambda request_id, board, direction: self.hint_ready.emit(request_id, direction))
+        self.hint_label.setText("Hint: …")
+        self.hint_request = self.hint_engine.request(bitboard.to_bitboard(self.grid))
+
+    def hint_unavailable_text(self):
+        """Текст подсказки для поля, которое поиск не умеет упаковать (не 4x4 или плитка 32768)."""
+        return "Hint: 4x4 only" if self.size != bitboard.SIZE else "Hint: unavailable"
+
+    def cancel_hint(self):
+        """Отменяет идущий поиск подсказки."""
+        if self.hint_request is not None:
+            self.hint_engine.cancel()
+            self.hint_request = None
+            self.update_suggestion()
+
+    def show_hint(self, request_id, direction):
+        """Показывает найденный ход, если подсказка еще относится к текущей позиции."""
+        if request_id != self.hint_request:
+            return
+        self.hint_request = None
+        self.hint_label.setText(f"Hint: {HINT_ARROWS[direction]}" if direction else "Hint: no moves")
+
+    def toggle_suggestions(self):
+        """Включает или выключает режим подсказок хода по обученной n-tuple сети."""
+        self.suggestions = not self.suggestions
+        self.update_suggestion()
+
+    def update_suggestion(self):
+        """Показывает ход, который предлагает n-tuple сеть (только для поля 4x4)."""
+        if not self.suggestions:
+            self.hint_label.setText("")
+            return
+        if not self.engine.packable():
+            self.hint_label.setText(self.hint_unavailable_text())
+            return
+        if self.network is None:
+            from ntuple import NTupleNetwork, default_weights_path
+            try:
+                self.network = NTupleNetwork.load(default_weights_path())
+            except (OSError, ValueError) as e:
+                logging.warning(f"Cannot load n-tuple weights: {e}")
+                self.hint_label.setText("Hint: no trained weights")
+                self.suggestions = False
+                return
+        direction = self.network.best_move(bitboard.to_bitboard(self.grid))
+        self.hint_label.setText(f"Hint: {HINT_ARROWS[direction]}" if direction else "")
+
     def move_tiles_helper(self, grid, direction):
         """
         Вспомогательная функция для перемещения и объединения плиток в заданном направлении.
@@ -304,73 +622,14 @@ class Game2048(QWidget):
  Возвращается:
  numpy.ndarray: Обновленная игровая сетка.
         """
-        new_grid = np.zeros_like(grid, dtype=int)  # Ensure int dtype
-        score_increase = 0
-
-        if direction == "up":
-            for col in range(self.size):
-                values = [val for val in grid[:, col] if val != 0]
-                merged = [False] * len(values)
-                row = 0
-                for i, val in enumerate(values):
-                    if i > 0 and values[i - 1] == val and not merged[i - 1]:
-                        new_grid[row - 1, col] = val * 2
-                        score_increase += val * 2
-                        merged[i] = True  # Correct index for merged
-                    else:
-                        new_grid[row, col] = val
-                    row += 1
-
-        elif direction == "down":
-            for col in range(self.size):
-                values = [val for val in grid[:, col][::-1] if val != 0]
-                merged = [False] * len(values)
-                row = self.size - 1
-                for i, val in enumerate(values):
-                    if i > 0 and values[i - 1] == val and not merged[i - 1]:
-                        new_grid[row +1, col] = val * 2 # Corrected index
-                        score_increase += val * 2
-                        merged[i] = True # Correct index for merged
-                    else:
-                        new_grid[row, col] = val
-                    row -= 1
-
-        elif direction == "left":
-            for row in range(self.size):
-                values = [val for val in grid[row, :] if val != 0]
-                merged = [False] * len(values)
-                col = 0
-                for i, val in enumerate(values):
-                    if i > 0 and values[i - 1] == val and not merged[i - 1]:
-                        new_grid[row, col - 1] = val * 2 # Corrected index
-                        score_increase += val * 2
-                        merged[i] = True # Correct index for merged
-
-                    else:
-                        new_grid[row, col] = val
-                    col += 1
-
-        elif direction == "right":
-            for row in range(self.size):
-                values = [val for val in grid[row, :][::-1] if val != 0]
-                merged = [False] * len(values)
-                col = self.size - 1
-                for i, val in enumerate(values):
-                    if i > 0 and values[i - 1] == val and not merged[i - 1]:
-                        new_grid[row, col + 1] = val * 2 # Corrected index
-                        score_increase += val * 2
-                        merged[i] = True # Correct index for merged
-
-                    else:
-                        new_grid[row, col] = val
-                    col -= 1
+        new_grid, score_increase = self.engine.move_grid(grid, direction)
         self.score += score_increase
         self.score_label.setText(f"Score: {self.score}")
         return new_grid
 
     def create_grid(self):
         """Создает новую пустую игровую сетку."""
-        return np.array([[0] * self.size for _ in range(self.size)])
+        return np.zeros((self.size, self.size), dtype=int)
 
     def keyPressEvent(self, event: QKeyEvent):
         """Управляет нажатиями клавиш для управления ходом игры."""
@@ -380,24 +639,34 @@ class Game2048(QWidget):
         if modifiers:
             return
 
+        self.cancel_hint()  # Any new key makes a running hint search obsolete
         key = event.text().lower()
         if key in ('w', 'ц'):
-            self.move_tiles("up")
+            self.queue_move("up")
         elif key in ('s', 'ы'):
-            self.move_tiles("down")
+            self.queue_move("down")
         elif key in ('a', 'ф'):
-            self.move_tiles("left")
+            self.queue_move("left")
         elif key in ('d', 'в'):
-            self.move_tiles("right")
+            self.queue_move("right")
+        elif key in ('z', 'я'):
+            self.undo_move()
+        elif key in ('y', 'н'):
+            self.redo_move()
+        elif key in ('h', 'р'):
+            self.request_hint()
+        elif key in ('n', 'т'):
+            self.toggle_suggestions()
 
     def check_win(self):
         """Проверяет, выиграл ли игрок игру."""
-        return np.any(self.grid == self.win_condition)  # Efficient NumPy check
+        return self.engine.check_win()
 
     def win_dialog(self):
         """Отображает диалоговое окно выигрыша, обновляет рекорды и перезапускает игру."""
         self.game_over = True
         QMessageBox.information(self, "Поздравляю!", f"Победа!")
+        self.record_game()
         global selection_window
         selection_window.update_scores(self.score)
         selection_window.show()
@@ -406,28 +675,37 @@ class Game2048(QWidget):
 
     def check_lose(self):
         """Проверяет, не проиграл ли игрок партию (больше ходов быть не может)."""
+        return self.engine.check_lose()
 
-        # Check for empty cells
-        if np.any(self.grid == 0):
-            return False
-
-        # Check for adjacent cells with the same value in all directions
-        for i in range(self.size):
-            for j in range(self.size):
-                if i > 0 and self.grid[i][j] == self.grid[i - 1][j]:
-                    return False
-                if i < self.size - 1 and self.grid[i][j] == self.grid[i + 1][j]:
-                    return False
-                if j > 0 and self.grid[i][j] == self.grid[i][j - 1]:
-                    return False
-                if j < self.size - 1 and self.grid[i][j] == self.grid[i][j + 1]:
-                    return False
-        return True
+    def record_game(self):
+        """Ставит результат завершенной партии в очередь на запись в лидерборд и дописывает ее запись в архив."""
+        import sqlite3
+        from score_store import get_score_store, user_data_path
+        from replay import Replay, append_to_archive
+        try:
+            get_score_store().record_game(
+                self.score,
+                max_tile=int(self.grid.max()),
+                moves=self.engine.moves,
+                duration=time.monotonic() - self.started_at,
+                difficulty=self.win_condition,
+                merges=self.engine.merge_counts,
+                move_events=self.move_events[:self.engine.moves],  # Moves past an undo are not part of the game
+            )
+        except (sqlite3.Error, OSError) as e:
+            logging.exception(f"Error recording game: {e}")
+        if not self.engine.replayable:
+            return
+        try:
+            append_to_archive(user_data_path("replays.bin"), Replay.from_engine(self.engine))
+        except OSError as e:
+            logging.exception(f"Error saving replay: {e}")
 
     def lose_dialog(self):
         """Отображает диалоговое окно проигрыша, обновляет рекорды и перезапускает игру."""
         self.game_over = True
         QMessageBox.information(self, "Игра окончена!", "Вы проиграли!")
+        self.record_game()
         global selection_window
         selection_window.update_scores(self.score)
         selection_window.show()
@@ -435,11 +713,21 @@ class Game2048(QWidget):
         self.hide()
 
 
+def print_startup_profile():
+    """Печатает профиль запуска после первой итерации цикла событий (окно уже показано)."""
+    startup_profiler.mark("first event loop turn")
+    startup_profiler.uninstall()
+    print(startup_profiler.report())
+
+
 if __name__ == "__main__":
-    initialize_database()
+    # The database is opened by the selection window in the background, after it is shown.
     app = QApplication(sys.argv)
     icon = QIcon('2048')  # This line is changed to include setting the icon
     app.setWindowIcon(icon)
     game_window = Game2048() # Create game window FIRST
     selection_window = DifficultySelectionWindow(game_window)
+    if startup_profiler is not None:
+        startup_profiler.mark("windows created")
+        QTimer.singleShot(0, print_startup_profile)
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""
+Фоновый поиск подсказки хода для интерфейса 2048.
+
+HintEngine держит один рабочий поток: запрос подсказки не блокирует вызывающий поток,
+новый запрос или cancel() прерывают уже идущий поиск, а результат передается
+в callback (из рабочего потока - интерфейс должен сам переложить его в свой поток).
+"""
+import threading
+
+from expectimax import ExpectimaxSolver
+
+HINT_TIME_LIMIT = 0.05  # Seconds of search per hint
+HINT_MAX_DEPTH = 8
+
+
+class HintEngine:
+    """
+    Expectimax с итеративным углублением в рабочем потоке.
+    """
+    def __init__(self, callback, time_limit=HINT_TIME_LIMIT, depth=HINT_MAX_DEPTH):
+        """
+        Аргументы:
+ callback (callable): Вызывается как callback(request_id, board, direction) после поиска,
+ который не был отменен.
+ time_limit (float): Бюджет времени на подсказку в секундах.
+ depth (int): Наибольшая глубина итеративного углубления.
+        """
+        self.callback = callback
+        self.time_limit = time_limit
+        self.depth = depth
+        self.condition = threading.Condition()
+        self.pending = None  # (request_id, board) waiting for the worker
+        self.cancel_event = threading.Event()  # Cancels the search that is running now
+        self.request_id = 0
+        self.running = True
+        self.worker = threading.Thread(target=self._work_loop, name="HintEngine", daemon=True)
+        self.worker.start()
+
+    def request(self, board):
+        """
+        Запускает поиск подсказки для упакованного поля, отменяя предыдущий.
+
+ Возвращается:
+ int: Номер запроса, который получит callback.
+        """
+        with self.condition:
+            self.cancel_event.set()
+            self.request_id += 1
+            self.pending = (self.request_id, board)
+            self.condition.notify()
+            return self.request_id
+
+    def cancel(self):
+        """Отменяет идущий и ожидающий поиск; callback для них не вызывается."""
+        with self.condition:
+            self.cancel_event.set()
+            self.pending = None
+
+    def close(self):
+        """Останавливает рабочий поток."""
+        with self.condition:
+            self.running = False
+            self.cancel_event.set()
+            self.pending = None
+            self.condition.notify()
+        self.worker.join()
+
+    def _work_loop(self):
+        """Рабочий поток: берет последний запрос и ищет ход в пределах бюджета."""
+        # Built here: the heuristic table takes a while to compute on first use.
+        solver = ExpectimaxSolver(depth=self.depth, time_limit=self.time_limit)
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                request_id, board = self.pending
+                self.pending = None
+                cancel_event = self.cancel_event = threading.Event()
+            direction = solver.best_move(board, cancel=cancel_event)
+            if not cancel_event.is_set():
+                self.callback(request_id, board, direction)
@@ -0,0 +1,89 @@
+"""
+Кольцевой буфер снимков партии для отмены и повтора ходов.
+
+Снимок - упакованное поле (int для поля 4x4, bytes показателей степени для
+остальных размеров), счёт и число ходов, поэтому память на ход постоянна,
+а отмена и повтор выполняются за O(1) при любой длине партии.
+"""
+from array import array
+
+
+class MoveHistory:
+    """
+    Линейная история снимков с курсором: undo/redo двигают курсор, новый снимок
+ после отмены отбрасывает ветку повтора.
+    """
+    def __init__(self, capacity=None):
+        """
+        Аргументы:
+ capacity (int | None): Наибольшее число хранимых снимков. None - без ограничения
+ (буфер удваивается при заполнении); иначе самые старые снимки перезаписываются.
+        """
+        self.capacity = capacity
+        slots = capacity or 64
+        self.states = [None] * slots
+        self.scores = array("q", bytes(8 * slots))
+        self.moves = array("q", bytes(8 * slots))
+        self.start = 0  # Physical index of the oldest snapshot
+        self.count = 0  # Number of stored snapshots
+        self.cursor = -1  # Logical index of the current snapshot
+
+    def clear(self):
+        """Удаляет все снимки."""
+        self.start = 0
+        self.count = 0
+        self.cursor = -1
+
+    def _slot(self, index):
+        return (self.start + index) % len(self.states)
+
+    def _grow(self):
+        """Удваивает буфер, раскладывая снимки по порядку с начала."""
+        order = [self._slot(index) for index in range(self.count)]
+        self.states = [self.states[slot] for slot in order] + [None] * len(self.states)
+        self.scores = array("q", [self.scores[slot] for slot in order]) + array("q", bytes(8 * len(order)))
+        self.moves = array("q", [self.moves[slot] for slot in order]) + array("q", bytes(8 * len(order)))
+        self.start = 0
+
+    def push(self, state, score, moves):
+        """Добавляет снимок после текущего, отбрасывая ветку повтора."""
+        self.count = self.cursor + 1
+        if self.count == len(self.states):
+            if self.capacity is None:
+                self._grow()
+            else:
+                self.start = self._slot(1)  # Overwrite the oldest snapshot
+                self.count -= 1
+        slot = self._slot(self.count)
+        self.states[slot] = state
+        self.scores[slot] = score
+        self.moves[slot] = moves
+        self.count += 1
+        self.cursor = self.count - 1
+
+    def current(self):
+        """Текущий снимок (state, score, moves) или None, если история пуста."""
+        if self.cursor < 0:
+            return None
+        slot = self._slot(self.cursor)
+        return self.states[slot], self.scores[slot], self.moves[slot]
+
+    def can_undo(self):
+        return self.cursor > 0
+
+    def can_redo(self):
+        return self.cursor < self.count - 1
+
+    def undo(self):
+        """Сдвигает курсор на снимок назад и возвращает его (или None)."""
+        if not self.can_undo():
+            return None
+        self.cursor -= 1
+        return self.current()
+
+    def redo(self):
+        """Сдвигает курсор на снимок вперед и возвращает его (или None)."""
+        if not self.can_redo():
+            return None
+        self.cursor += 1
+        return self.current()
@@ -0,0 +1,271 @@
+"""
+N-tuple сеть для оценки позиций 2048 и её обучение методом TD(0) по послеходовым состояниям.
+
+Оценка поля - сумма весов по всем кортежам клеток во всех 8 симметриях поля;
+вес выбирается по показателям степени плиток в клетках кортежа. Ходы считаются
+на упакованном поле (bitboard), без виджета Game2048.
+
+Веса хранятся в файле, который отображается в память (numpy.memmap): обучение
+пишет прямо в него, а режим подсказок в игре открывает его мгновенно, без разбора.
+
+Формат файла: заголовок (сигнатура, версия, число кортежей, длина кортежа),
+номера клеток кортежей, затем с выровненного смещения - таблица весов float32
+формы (число кортежей, 16 ** длина кортежа).
+
+Пример:
+    python ntuple.py train --episodes 20000
+"""
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+
+import numpy as np
+
+import bitboard
+
+MAGIC = b"NT048"
+VERSION = 1
+HEADER = struct.Struct("<5sBBB")  # magic, version, tuple count, tuple length
+ALIGNMENT = 64
+WEIGHT_DTYPE = np.dtype("<f4")
+
+# Cells are numbered row by row: cell 4*r + c is nibble 4*r + c of the packed board.
+DEFAULT_TUPLES = (
+    (0, 1, 2, 3, 4, 5),
+    (4, 5, 6, 7, 8, 9),
+    (0, 1, 2, 4, 5, 6),
+    (4, 5, 6, 8, 9, 10),
+)
+
+
+def _symmetries():
+    """8 отображений номеров клеток: повороты поля и их зеркальные отражения."""
+    size = bitboard.SIZE
+    maps = []
+    cells = [(row, col) for row in range(size) for col in range(size)]
+    for transpose in (False, True):
+        for flip_rows in (False, True):
+            for flip_cols in (False, True):
+                mapping = []
+                for row, col in cells:
+                    if transpose:
+                        row, col = col, row
+                    if flip_rows:
+                        row = size - 1 - row
+                    if flip_cols:
+                        col = size - 1 - col
+                    mapping.append(row * size + col)
+                maps.append(mapping)
+    return maps
+
+
+SYMMETRIES = _symmetries()
+
+
+def _weights_offset(tuple_count, tuple_length):
+    """Смещение таблицы весов в файле (выровнено на ALIGNMENT байт)."""
+    end = HEADER.size + tuple_count * tuple_length
+    return (end + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def default_weights_path():
+    """Путь к файлу весов в каталоге данных пользователя."""
+    from score_store import user_data_path
+    return user_data_path("ntuple.weights")
+
+
+class NTupleNetwork:
+    """
+    Функция ценности поля 4x4 в виде n-tuple сети.
+    """
+    def __init__(self, tuples=DEFAULT_TUPLES, weights=None):
+        """
+        Аргументы:
+ tuples (tuple): Кортежи номеров клеток одинаковой длины.
+ weights (numpy.ndarray | None): Таблица весов формы (len(tuples), 16 ** длина кортежа);
+ None - нулевая таблица в памяти.
+        """
+        self.tuples = tuple(tuple(cells) for cells in tuples)
+        length = len(self.tuples[0])
+        if any(len(cells) != length for cells in self.tuples):
+            raise ValueError("All tuples must have the same length")
+        shape = (len(self.tuples), 16 ** length)
+        if weights is None:
+            weights = np.zeros(shape, dtype=WEIGHT_DTYPE)
+        elif weights.shape != shape:
+            raise ValueError(f"Expected weights of shape {shape}, got {weights.shape}")
+        self.weights = weights
+        # Plain ndarray rows avoid the memmap indexing overhead on every lookup.
+        rows = weights.view(np.ndarray)
+        self.features = [(rows[index], tuple(4 * mapping[cell] for cell in cells))
+                         for index, cells in enumerate(self.tuples) for mapping in SYMMETRIES]
+
+    @classmethod
+    def create(cls, path, tuples=DEFAULT_TUPLES):
+        """Создает файл весов с нулевыми весами и открывает его на запись."""
+        tuple_count, tuple_length = len(tuples), len(tuples[0])
+        offset = _weights_offset(tuple_count, tuple_length)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, tuple_count, tuple_length))
+            file.write(bytes(cell for cells in tuples for cell in cells))
+            file.truncate(offset + tuple_count * 16 ** tuple_length * WEIGHT_DTYPE.itemsize)
+        return cls.load(path, writable=True)
+
+    @classmethod
+    def load(cls, path, writable=False):
+        """
+        Открывает файл весов, отображая таблицу в память.
+
+ Аргументы:
+ path (str): Путь к файлу весов.
+ writable (bool): Открыть на запись (для продолжения обучения).
+
+ Исключения:
+ ValueError: если файл не является файлом весов n-tuple сети.
+        """
+        with open(path, "rb") as file:
+            header = file.read(HEADER.size)
+            if len(header) != HEADER.size:
+                raise ValueError(f"{path} is not an n-tuple weights file")
+            magic, version, tuple_count, tuple_length = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not an n-tuple weights file")
+            cells = file.read(tuple_count * tuple_length)
+        tuples = [tuple(cells[index:index + tuple_length]) for index in range(0, len(cells), tuple_length)]
+        weights = np.memmap(path, dtype=WEIGHT_DTYPE, mode="r+" if writable else "r",
+                            offset=_weights_offset(tuple_count, tuple_length),
+                            shape=(tuple_count, 16 ** tuple_length))
+        return cls(tuples, weights)
+
+    def flush(self):
+        """Сбрасывает изменения весов в файл (контрольная точка)."""
+        if isinstance(self.weights, np.memmap):
+            self.weights.flush()
+
+    def value(self, board):
+        """Оценка упакованного поля."""
+        total = 0.0
+        for row, shifts in self.features:
+            index = 0
+            for shift in shifts:
+                index = (index << 4) | ((board >> shift) & 0xF)
+            total += row[index]
+        return float(total)
+
+    def update(self, board, delta):
+        """Прибавляет delta к каждому весу, участвующему в оценке поля."""
+        for row, shifts in self.features:
+            index = 0
+            for shift in shifts:
+                index = (index << 4) | ((board >> shift) & 0xF)
+            row[index] += delta
+
+    def evaluate_moves(self, board):
+        """
+        Лучший ход по сумме очков за ход и оценки послеходового состояния.
+
+ Возвращается:
+ tuple: (направление, послеходовое поле, очки за ход, оценка) или (None, board, 0, 0.0),
+ если допустимых ходов нет.
+        """
+        best = (None, board, 0, 0.0)
+        best_total = None
+        for direction in bitboard.directions_from_mask(bitboard.legal_moves(board)):
+            afterstate, reward = bitboard.move(board, direction)
+            value = self.value(afterstate)
+            if best_total is None or reward + value > best_total:
+                best_total = reward + value
+                best = (direction, afterstate, reward, value)
+        return best
+
+    def best_move(self, board):
+        """Направление лучшего хода или None, если ходов нет."""
+        return self.evaluate_moves(board)[0]
+
+
+def train_episode(network, rng, learning_rate):
+    """
+    Играет одну партию жадно по сети и обновляет веса методом TD(0) по послеходовым состояниям.
+
+ Аргументы:
+ network (NTupleNetwork): Обучаемая сеть.
+ rng (random.Random): Генератор случайных чисел для появления плиток.
+ learning_rate (float): Шаг обучения одного веса.
+
+ Возвращается:
+ dict: {"score", "max_tile", "moves"}.
+    """
+    board = bitboard.add_random_tile(bitboard.add_random_tile(0, rng), rng)
+    direction, afterstate, reward, value = network.evaluate_moves(board)
+    score = moves = 0
+    while direction is not None:
+        score += reward
+        moves += 1
+        board = bitboard.add_random_tile(afterstate, rng)
+        direction, next_afterstate, next_reward, next_value = network.evaluate_moves(board)
+        # A terminal afterstate is worth nothing: no further rewards can follow it.
+        target = next_reward + next_value if direction is not None else 0.0
+        network.update(afterstate, learning_rate * (target - network.value(afterstate)))
+        afterstate, reward = next_afterstate, next_reward
+    return {"score": score, "max_tile": bitboard.max_tile(board), "moves": moves}
+
+
+def train(network, episodes, learning_rate=0.1, seed=0, checkpoint_every=1000, report_every=1000):
+    """
+    Обучает сеть на episodes партиях, периодически сбрасывая веса в файл.
+
+ Аргументы:
+ learning_rate (float): Шаг обучения; делится на число признаков сети.
+ report_every (int): Как часто печатать средний счёт (0 - не печатать).
+
+ Возвращается:
+ list: Результаты партий в формате train_episode.
+    """
+    rng = random.Random(seed)
+    step = learning_rate / len(network.features)
+    results = []
+    started = time.perf_counter()
+    for episode in range(1, episodes + 1):
+        results.append(train_episode(network, rng, step))
+        if checkpoint_every and episode % checkpoint_every == 0:
+            network.flush()
+        if report_every and episode % report_every == 0:
+            recent = results[-report_every:]
+            mean_score = sum(result["score"] for result in recent) / len(recent)
+            reached = sum(result["max_tile"] >= 2048 for result in recent) / len(recent)
+            print(f"episode {episode}: mean score {mean_score:.0f}, 2048 rate {reached:.1%}, "
+                  f"{time.perf_counter() - started:.0f} s")
+    network.flush()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train an n-tuple network for 2048 with TD(0)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="train (or continue training) the weights file")
+    train_parser.add_argument("--weights", default=None, help="weights file (default: user data directory)")
+    train_parser.add_argument("--episodes", type=int, default=10000)
+    train_parser.add_argument("--learning-rate", type=float, default=0.1)
+    train_parser.add_argument("--seed", type=int, default=0)
+    train_parser.add_argument("--checkpoint-every", type=int, default=1000)
+    train_parser.add_argument("--report-every", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    path = args.weights or default_weights_path()
+    if os.path.exists(path):
+        network = NTupleNetwork.load(path, writable=True)
+    else:
+        network = NTupleNetwork.create(path)
+    train(network, args.episodes, args.learning_rate, args.seed, args.checkpoint_every, args.report_every)
+    print(f"Weights saved to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
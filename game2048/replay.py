@@ -0,0 +1,181 @@
+"""
+Компактный двоичный формат записи партий 2048 и их headless-воспроизведение.
+
+Запись состоит из заголовка (сигнатура, версия, размер поля, зерно генератора,
+число ходов, итоговый счёт) и ходов по 2 бита (индекс в bitboard.DIRECTIONS).
+Так как появление плиток полностью определяется зерном, партия из сотен ходов
+занимает несколько десятков байт, а её счёт можно перепроверить воспроизведением.
+
+Пример:
+    python replay.py verify replays.bin
+"""
+import argparse
+import random
+import struct
+import sys
+import time
+
+import bitboard
+from engine import GameEngine
+
+MAGIC = b"R2048"
+VERSION = 1
+HEADER = struct.Struct("<5sBBQII")  # magic, version, size, seed, move count, score
+
+
+def encode_moves(moves):
+    """Упаковывает индексы направлений по четыре в байт."""
+    data = bytearray((len(moves) + 3) // 4)
+    for index, move in enumerate(moves):
+        data[index >> 2] |= move << ((index & 3) * 2)
+    return bytes(data)
+
+
+def decode_moves(data, count):
+    """Распаковывает count индексов направлений."""
+    return bytes((data[index >> 2] >> ((index & 3) * 2)) & 3 for index in range(count))
+
+
+class Replay:
+    """
+    Запись одной партии: размер поля, зерно, ходы (индексы bitboard.DIRECTIONS) и итоговый счёт.
+    """
+    def __init__(self, size, seed, moves, score):
+        self.size = size
+        self.seed = seed
+        self.moves = bytes(moves)
+        self.score = score
+
+    @classmethod
+    def from_engine(cls, engine):
+        """
+        Создает запись текущей партии движка.
+
+ Исключения:
+ ValueError: если партию нельзя воспроизвести по зерну (например, после отмены хода
+ была сыграна другая ветка).
+        """
+        if not engine.replayable:
+            raise ValueError("This game cannot be reproduced from its seed")
+        return cls(engine.size, engine.seed, engine.move_log[:engine.moves], engine.score)
+
+    def to_bytes(self):
+        """Сериализует запись в двоичный формат."""
+        header = HEADER.pack(MAGIC, VERSION, self.size, self.seed, len(self.moves), self.score)
+        return header + encode_moves(self.moves)
+
+    @classmethod
+    def read_from(cls, data, offset=0):
+        """
+        Читает запись из буфера.
+
+ Возвращается:
+ tuple: (запись, смещение сразу после нее).
+        """
+        magic, version, size, seed, count, score = HEADER.unpack_from(data, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a replay record at offset {offset}")
+        start = offset + HEADER.size
+        end = start + (count + 3) // 4
+        if end > len(data):
+            raise ValueError(f"Truncated replay record at offset {offset}")
+        return cls(size, seed, decode_moves(data[start:end], count), score), end
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Десериализует одну запись."""
+        return cls.read_from(data)[0]
+
+
+def play_replay(replay):
+    """
+    Воспроизводит партию без интерфейса.
+
+ Поле 4x4 воспроизводится прямо на упакованном поле, остальные размеры - через GameEngine;
+ оба пути расходуют генератор в одном порядке и дают одинаковые партии. Как и GameEngine,
+ поле 4x4 с плиткой 32768 доигрывается через движок: таблицы ходов не сливают две такие плитки.
+
+ Возвращается:
+ tuple: (итоговый счёт, итоговая сетка numpy.ndarray).
+
+ Исключения:
+ ValueError: если какой-либо ход записи не меняет поле.
+    """
+    moves = replay.moves
+    if replay.size == bitboard.SIZE:
+        rng = random.Random(replay.seed)
+        board = bitboard.add_random_tile(bitboard.add_random_tile(0, rng), rng)
+        score = 0
+        directions = bitboard.DIRECTIONS
+        for played, index in enumerate(moves):
+            if bitboard.has_max_tile(board):
+                break
+            new_board, score_increase = bitboard.move(board, directions[index])
+            if new_board == board:
+                raise ValueError("Replay contains a move that does not change the board")
+            board = bitboard.add_random_tile(new_board, rng)
+            score += score_increase
+        else:
+            return score, bitboard.to_grid(board)
+        # The rest of the game goes through the engine, which continues the same generator
+        engine = GameEngine(size=replay.size)
+        engine.grid = bitboard.to_grid(board)
+        engine.rng = rng
+        engine.score = score
+        moves = moves[played:]
+    else:
+        engine = GameEngine(size=replay.size)
+        engine.new_game(replay.seed)
+    for index in moves:
+        if not engine.move(bitboard.DIRECTIONS[index]):
+            raise ValueError("Replay contains a move that does not change the board")
+    return engine.score, engine.grid.copy()
+
+
+def verify_replay(replay):
+    """Проверяет, что воспроизведение дает записанный счёт."""
+    try:
+        return play_replay(replay)[0] == replay.score
+    except ValueError:
+        return False
+
+
+def append_to_archive(path, replay):
+    """Дописывает запись в конец архива."""
+    with open(path, "ab") as archive:
+        archive.write(replay.to_bytes())
+
+
+def read_archive(path):
+    """Последовательно читает все записи архива."""
+    with open(path, "rb") as archive:
+        data = archive.read()
+    offset = 0
+    while offset < len(data):
+        replay, offset = Replay.read_from(data, offset)
+        yield replay
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify 2048 replay archives")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    verify_parser = subparsers.add_parser("verify", help="replay every game and compare scores")
+    verify_parser.add_argument("archives", nargs="+")
+    args = parser.parse_args(argv)
+
+    games = failed = moves = 0
+    started = time.perf_counter()
+    for path in args.archives:
+        for replay in read_archive(path):
+            games += 1
+            moves += len(replay.moves)
+            if not verify_replay(replay):
+                failed += 1
+                print(f"{path}: game {games} (seed {replay.seed}) does not reproduce score {replay.score}")
+    elapsed = time.perf_counter() - started
+    print(f"Verified {games} games ({moves} moves) in {elapsed:.2f} s, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""
+Хранилище результатов партий 2048 в SQLite.
+
+Одно долгоживущее соединение в режиме WAL, таблица-лидерборд с индексами по
+сложности и счёту и фоновая очередь записи, поэтому сохранение результата
+не блокирует поток интерфейса.
+
+Вместе с партией пишется телеметрия: события ходов (направление, очки, время хода)
+и число слияний по значениям плиток. Сводные таблицы по сложностям обновляются
+триггерами при вставке, поэтому статистика читается без агрегирующих запросов.
+"""
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import appdirs
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS games (
+        id INTEGER PRIMARY KEY,
+        score INTEGER NOT NULL,
+        max_tile INTEGER NOT NULL DEFAULT 0,
+        moves INTEGER NOT NULL DEFAULT 0,
+        duration REAL NOT NULL DEFAULT 0,
+        difficulty INTEGER NOT NULL DEFAULT 2048,
+        played_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_games_difficulty_score ON games (difficulty, score DESC);
+    CREATE INDEX IF NOT EXISTS idx_games_score ON games (score DESC);
+
+    CREATE TABLE IF NOT EXISTS move_events (
+        game_id INTEGER NOT NULL REFERENCES games (id),
+        move_index INTEGER NOT NULL,
+        direction INTEGER NOT NULL,
+        score_gain INTEGER NOT NULL,
+        duration_ms REAL NOT NULL,
+        PRIMARY KEY (game_id, move_index)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS game_merges (
+        game_id INTEGER NOT NULL REFERENCES games (id),
+        tile INTEGER NOT NULL,
+        merges INTEGER NOT NULL,
+        PRIMARY KEY (game_id, tile)
+    ) WITHOUT ROWID;
+
+    -- A high score saved explicitly (save_high_score), kept apart from the games it was not scored in
+    CREATE TABLE IF NOT EXISTS saved_high_score (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        score INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS difficulty_stats (
+        difficulty INTEGER PRIMARY KEY,
+        games INTEGER NOT NULL,
+        total_score INTEGER NOT NULL,
+        best_score INTEGER NOT NULL,
+        max_tile INTEGER NOT NULL,
+        total_moves INTEGER NOT NULL,
+        total_duration REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS merge_stats (
+        difficulty INTEGER NOT NULL,
+        tile INTEGER NOT NULL,
+        merges INTEGER NOT NULL,
+        PRIMARY KEY (difficulty, tile)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS games_update_stats AFTER INSERT ON games BEGIN
+        INSERT INTO difficulty_stats (difficulty, games, total_score, best_score, max_tile, total_moves, total_duration)
+        VALUES (NEW.difficulty, 1, NEW.score, NEW.score, NEW.max_tile, NEW.moves, NEW.duration)
+        ON CONFLICT (difficulty) DO UPDATE SET
+            games = games + 1,
+            total_score = total_score + excluded.total_score,
+            best_score = MAX(best_score, excluded.best_score),
+            max_tile = MAX(max_tile, excluded.max_tile),
+            total_moves = total_moves + excluded.total_moves,
+            total_duration = total_duration + excluded.total_duration;
+    END;
+    CREATE TRIGGER IF NOT EXISTS game_merges_update_stats AFTER INSERT ON game_merges BEGIN
+        INSERT INTO merge_stats (difficulty, tile, merges)
+        VALUES ((SELECT difficulty FROM games WHERE id = NEW.game_id), NEW.tile, NEW.merges)
+        ON CONFLICT (difficulty, tile) DO UPDATE SET merges = merges + excluded.merges;
+    END;
+
+    CREATE VIEW IF NOT EXISTS difficulty_summary AS
+        SELECT difficulty, games, best_score, max_tile,
+               CAST(total_score AS REAL) / games AS mean_score,
+               CAST(total_moves AS REAL) / games AS mean_moves,
+               1000.0 * total_duration / NULLIF(total_moves, 0) AS ms_per_move
+        FROM difficulty_stats;
+"""
+
+SUMMARY_COLUMNS = ("difficulty", "games", "best_score", "max_tile", "mean_score", "mean_moves", "ms_per_move")
+
+_STOP = object()
+
+
+def user_data_path(filename):
+    """Путь к файлу в каталоге данных пользователя."""
+    user_data_dir = appdirs.user_data_dir("game2048", "YourCompanyName")
+    return os.path.join(user_data_dir, filename)
+
+
+def default_db_path():
+    """Путь к базе данных в каталоге данных пользователя."""
+    return user_data_path("high_scores.db")
+
+
+class ScoreStore:
+    """
+    Лидерборд партий. Запись выполняется фоновым потоком, лучшие результаты
+ кэшируются в памяти и читаются без обращения к базе.
+    """
+    def __init__(self, db_path):
+        """
+        Открывает (и при необходимости создает) базу данных.
+
+ Аргументы:
+ db_path (str): Путь к файлу базы данных.
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self._backfill_stats()
+        self._migrate_legacy_scores()
+        self.best_scores = dict(self.connection.execute(
+            "SELECT difficulty, MAX(score) FROM games GROUP BY difficulty").fetchall())
+        row = self.connection.execute("SELECT score FROM saved_high_score").fetchone()
+        self.saved_high_score = row[0] if row else 0
+
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, name="ScoreStoreWriter", daemon=True)
+        self.writer.start()
+        logging.info(f"Score store opened at: {db_path}")
+
+    def _migrate_legacy_scores(self):
+        """Переносит записи из старой таблицы high_scores в пустой лидерборд."""
+        legacy = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'high_scores'").fetchone()
+        if legacy and not self.connection.execute("SELECT 1 FROM games LIMIT 1").fetchone():
+            self.connection.execute(
+                "INSERT INTO games (score, played_at) SELECT score, ? FROM high_scores WHERE score > 0",
+                (time.time(),))
+
+    def _backfill_stats(self):
+        """Заполняет сводную таблицу по партиям, записанным до появления триггеров."""
+        if (self.connection.execute("SELECT 1 FROM games LIMIT 1").fetchone()
+                and not self.connection.execute("SELECT 1 FROM difficulty_stats LIMIT 1").fetchone()):
+            self.connection.execute(
+                "INSERT INTO difficulty_stats"
+                " SELECT difficulty, COUNT(*), SUM(score), MAX(score), MAX(max_tile), SUM(moves), SUM(duration)"
+                " FROM games GROUP BY difficulty")
+
+    def record_game(self, score, max_tile=0, moves=0, duration=0.0, difficulty=2048, merges=None, move_events=None):
+        """
+        Ставит результат партии в очередь на запись и сразу обновляет кэш рекордов.
+
+ Аргументы:
+ score (int): Итоговый счёт.
+ max_tile (int): Наибольшая плитка.
+ moves (int): Количество ходов.
+ duration (float): Длительность партии в секундах.
+ difficulty (int): Условие победы.
+ merges (dict | None): Значение плитки -> число слияний, которые ее создали.
+ move_events (list | None): Кортежи (индекс направления, очки за ход, время хода в мс).
+        """
+        row = (int(score), int(max_tile), int(moves), float(duration), int(difficulty), time.time())
+        if row[0] > self.best_scores.get(row[4], -1):
+            self.best_scores[row[4]] = row[0]
+        self.queue.put((row, dict(merges or {}), list(move_events or ())))
+
+    def save_high_score(self, score):
+        """
+        Сохраняет рекорд без записи партии: лидерборд и статистика его не видят,
+ а best_score() по всем сложностям возвращает не меньше этого значения.
+ Сохранение 0 сбрасывает рекорд.
+        """
+        score = int(score)
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO saved_high_score (id, score) VALUES (1, ?)"
+                " ON CONFLICT (id) DO UPDATE SET score = excluded.score", (score,))
+        self.saved_high_score = score
+
+    def best_score(self, difficulty=None):
+        """Лучший счёт для сложности (или по всем сложностям и сохраненному рекорду), 0 если партий не было."""
+        if difficulty is None:
+            return max(self.saved_high_score, max(self.best_scores.values(), default=0))
+        return self.best_scores.get(difficulty, 0)
+
+    def leaderboard(self, difficulty=None, limit=10):
+        """
+        Лучшие партии, отсортированные по убыванию счёта.
+
+ Возвращается:
+ list: Кортежи (score, max_tile, moves, duration, difficulty, played_at).
+        """
+        self.flush()
+        columns = "score, max_tile, moves, duration, difficulty, played_at"
+        with self.lock:
+            if difficulty is None:
+                cursor = self.connection.execute(
+                    f"SELECT {columns} FROM games ORDER BY score DESC LIMIT ?", (limit,))
+            else:
+                cursor = self.connection.execute(
+                    f"SELECT {columns} FROM games WHERE difficulty = ? ORDER BY score DESC LIMIT ?",
+                    (difficulty, limit))
+            return cursor.fetchall()
+
+    def difficulty_summary(self):
+        """
+        Сводка по сложностям из таблиц, которые поддерживают триггеры.
+
+ Возвращается:
+ list: Словари с ключами SUMMARY_COLUMNS, по возрастанию сложности.
+        """
+        self.flush()
+        with self.lock:
+            cursor = self.connection.execute(
+                f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM difficulty_summary ORDER BY difficulty")
+            return [dict(zip(SUMMARY_COLUMNS, row)) for row in cursor.fetchall()]
+
+    def merge_summary(self, difficulty):
+        """Значение плитки -> общее число слияний, которые ее создали, для сложности."""
+        self.flush()
+        with self.lock:
+            return dict(self.connection.execute(
+                "SELECT tile, merges FROM merge_stats WHERE difficulty = ? ORDER BY tile", (difficulty,)).fetchall())
+
+    def flush(self):
+        """Ждет, пока все поставленные в очередь записи попадут в базу."""
+        self.queue.join()
+
+    def close(self):
+        """Дописывает очередь, останавливает фоновый поток и закрывает соединение."""
+        if self.connection is None:
+            return
+        self.queue.put(_STOP)
+        self.writer.join()
+        with self.lock:
+            self.connection.close()
+            self.connection = None
+
+    def _write_loop(self):
+        """Фоновый поток: записывает накопившиеся партии и их телеметрию одной транзакцией."""
+        while True:
+            items = [self.queue.get()]
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            games = [item for item in items if item is not _STOP]
+            if games:
+                try:
+                    with self.lock:
+                        self.connection.execute("BEGIN")
+                        merge_rows = []
+                        event_rows = []
+                        for row, merges, move_events in games:
+                            game_id = self.connection.execute(
+                                "INSERT INTO games (score, max_tile, moves, duration, difficulty, played_at)"
+                                " VALUES (?, ?, ?, ?, ?, ?)", row).lastrowid
+                            merge_rows.extend((game_id, tile, count) for tile, count in merges.items())
+                            event_rows.extend((game_id, index) + tuple(event) for index, event in enumerate(move_events))
+                        self.connection.executemany(
+                            "INSERT INTO game_merges (game_id, tile, merges) VALUES (?, ?, ?)", merge_rows)
+                        self.connection.executemany(
+                            "INSERT INTO move_events (game_id, move_index, direction, score_gain, duration_ms)"
+                            " VALUES (?, ?, ?, ?, ?)", event_rows)
+                        self.connection.execute("COMMIT")
+                except sqlite3.Error as e:
+                    logging.exception(f"Error saving game results: {e}")
+                    with self.lock:
+                        if self.connection.in_transaction:
+                            self.connection.execute("ROLLBACK")
+            for _ in items:
+                self.queue.task_done()
+            if len(games) != len(items):
+                return
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_score_store():
+    """Возвращает общее хранилище результатов, открывая его при первом обращении (из любого потока)."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ScoreStore(default_db_path())
+            atexit.register(_default_store.close)
+        return _default_store
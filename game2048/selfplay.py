@@ -0,0 +1,152 @@
+"""
+Многопроцессный прогон партий 2048 без графического интерфейса.
+
+Пример:
+    python selfplay.py --games 200 --strategy greedy --workers 4 --seed 1
+
+Каждая партия получает собственное зерно, вычисляемое из --seed и номера партии,
+поэтому результаты воспроизводимы и не зависят от числа процессов. Стратегия берет
+случайность из отдельного генератора, так что плитки партии от стратегии не зависят.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import bitboard
+from strategies import STRATEGIES, make_strategy
+
+
+def game_seed(seed, game_index):
+    """Зерно генератора для партии с заданным номером."""
+    return seed * 1_000_003 + game_index
+
+
+def strategy_seed(seed, game_index):
+    """Зерно отдельного генератора стратегии для партии с заданным номером."""
+    return f"{game_seed(seed, game_index)}:strategy"
+
+
+def play_game(strategy, rng, strategy_rng=None):
+    """
+    Играет одну партию до конца.
+
+ Аргументы:
+ strategy (callable): Стратегия strategy(board, rng) -> направление или None.
+ rng (random.Random): Генератор только для появления плиток.
+ strategy_rng (random.Random | None): Генератор стратегии. None - создается из одного
+ числа rng до первой плитки, поэтому последовательность плиток от стратегии не зависит.
+
+ Возвращается:
+ dict: score, max_tile и moves.
+    """
+    if strategy_rng is None:
+        strategy_rng = random.Random(rng.getrandbits(64))
+    board = bitboard.add_random_tile(bitboard.add_random_tile(0, rng), rng)
+    score = 0
+    moves = 0
+    while True:
+        direction = strategy(board, strategy_rng)
+        if direction is None:
+            break
+        new_board, score_increase = bitboard.move(board, direction)
+        if new_board == board:
+            break  # A strategy that keeps choosing a no-op move would never finish
+        board = bitboard.add_random_tile(new_board, rng)
+        score += score_increase
+        moves += 1
+    return {"score": score, "max_tile": bitboard.max_tile(board), "moves": moves}
+
+
+def _play_chunk(strategy_name, depth, seed, game_indices):
+    """Играет партии с заданными номерами в дочернем процессе."""
+    strategy = make_strategy(strategy_name, depth=depth)
+    results = []
+    for game_index in game_indices:
+        rng = random.Random(game_seed(seed, game_index))
+        results.append(play_game(strategy, rng, random.Random(strategy_seed(seed, game_index))))
+    return results
+
+
+def run_selfplay(games, strategy_name="random", workers=1, seed=0, depth=2):
+    """
+    Играет заданное число партий в пуле процессов.
+
+ Возвращается:
+ tuple: (список результатов в порядке номеров партий, затраченное время в секундах).
+    """
+    chunks = [list(range(start, games, workers)) for start in range(workers)]
+    chunks = [chunk for chunk in chunks if chunk]
+    started = time.perf_counter()
+    results = [None] * games
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_play_chunk, strategy_name, depth, seed, chunk) for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            for game_index, result in zip(chunk, future.result()):
+                results[game_index] = result
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    """Собирает скорость, распределение очков и гистограмму наибольших плиток."""
+    scores = sorted(result["score"] for result in results)
+    total_moves = sum(result["moves"] for result in results)
+    deciles = statistics.quantiles(scores, n=10) if len(scores) > 1 else list(scores)
+    return {
+        "games": len(results),
+        "elapsed_sec": elapsed,
+        "games_per_sec": len(results) / elapsed if elapsed else 0.0,
+        "moves_per_sec": total_moves / elapsed if elapsed else 0.0,
+        "score": {
+            "min": scores[0],
+            "p10": deciles[0],
+            "median": statistics.median(scores),
+            "p90": deciles[-1],
+            "max": scores[-1],
+            "mean": statistics.fmean(scores),
+        },
+        "max_tile_histogram": dict(sorted(Counter(result["max_tile"] for result in results).items())),
+    }
+
+
+def format_report(summary):
+    """Текстовый отчёт для консоли."""
+    score = summary["score"]
+    lines = [
+        f"Games:      {summary['games']} in {summary['elapsed_sec']:.2f} s",
+        f"Games/sec:  {summary['games_per_sec']:.1f}",
+        f"Moves/sec:  {summary['moves_per_sec']:.0f}",
+        f"Score:      min {score['min']}  p10 {score['p10']:.0f}  median {score['median']:.0f}"
+        f"  p90 {score['p90']:.0f}  max {score['max']}  mean {score['mean']:.1f}",
+        "Max tile:",
+    ]
+    games = summary["games"]
+    for tile, count in summary["max_tile_histogram"].items():
+        lines.append(f"  {tile:>6}: {count:>6} ({100.0 * count / games:5.1f}%)")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Self-play benchmark for the 2048 engine")
+    parser.add_argument("--games", type=int, default=100, help="number of games to play")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="random")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="base seed; game i uses a seed derived from it")
+    parser.add_argument("--depth", type=int, default=2, help="search depth for expectimax")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    if args.games < 1 or args.workers < 1:
+        parser.error("--games and --workers must be positive")
+
+    results, elapsed = run_selfplay(args.games, args.strategy, args.workers, args.seed, args.depth)
+    summary = summarize(results, elapsed)
+    print(json.dumps(summary, indent=2) if args.json else format_report(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
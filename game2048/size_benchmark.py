@@ -0,0 +1,61 @@
+"""
+Задержка одного хода GameEngine для разных размеров поля.
+
+Пример:
+    python size_benchmark.py --moves 20000
+
+Для каждого размера от MIN_SIZE до MAX_SIZE играются случайные партии и измеряется
+среднее время хода вместе с появлением плитки и проверкой конца игры.
+"""
+import argparse
+import random
+import sys
+import time
+
+import bitboard
+from engine import GameEngine, MIN_SIZE, MAX_SIZE
+
+
+def measure_move_latency(size, moves, seed=0):
+    """
+    Играет случайные партии на поле заданного размера, пока не будет сделано moves ходов.
+
+ Возвращается:
+ float: Среднее время хода в микросекундах.
+    """
+    rng = random.Random(seed)
+    engine = GameEngine(size=size)
+    games = 0
+    engine.new_game(seed)
+    elapsed = 0.0
+    done = 0
+    while done < moves:
+        directions = bitboard.directions_from_mask(engine.legal_moves())
+        if not directions:
+            games += 1
+            engine.new_game(seed + games)
+            continue
+        direction = rng.choice(directions)
+        started = time.perf_counter()
+        engine.move(direction)
+        engine.check_lose()
+        elapsed += time.perf_counter() - started
+        done += 1
+    return elapsed / moves * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-move latency of the 2048 engine for each board size")
+    parser.add_argument("--moves", type=int, default=10000, help="moves to time for each size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print(f"{'size':>6} {'us/move':>10} {'ns/cell':>10}")
+    for size in range(MIN_SIZE, MAX_SIZE + 1):
+        latency = measure_move_latency(size, args.moves, args.seed)
+        print(f"{size}x{size:<4} {latency:>10.1f} {latency * 1000 / (size * size):>10.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
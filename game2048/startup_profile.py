@@ -0,0 +1,63 @@
+"""
+Профиль запуска приложения: время импорта модулей и время до появления окна.
+
+Подключается флагом --profile-startup до остальных импортов game2048.py и работает
+и в собранном PyInstaller приложении, где флаг интерпретатора -X importtime недоступен.
+"""
+import builtins
+import sys
+import threading
+import time
+
+
+class ImportProfiler:
+    """
+    Замеряет суммарное время импортов верхнего уровня (вложенные импорты входят
+ во время импортирующего модуля).
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = {}  # Module name -> seconds spent importing it, first import only
+        self.marks = []  # (label, seconds since start)
+        self.local = threading.local()
+        self.original_import = None
+
+    def install(self):
+        """Подменяет builtins.__import__ обёрткой с замером времени."""
+        self.original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self.original_import is not None:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        depth = getattr(self.local, "depth", 0)
+        if depth or name in sys.modules:
+            self.local.depth = depth + 1
+            try:
+                return self.original_import(name, globals, locals, fromlist, level)
+            finally:
+                self.local.depth = depth
+        self.local.depth = 1
+        started = time.perf_counter()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            self.local.depth = 0
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - started
+
+    def mark(self, label):
+        """Отмечает этап запуска (например, момент показа окна)."""
+        self.marks.append((label, time.perf_counter() - self.started))
+
+    def report(self, limit=15):
+        """Текстовый отчёт: самые долгие импорты и этапы запуска."""
+        lines = ["Startup profile", f"{'import':<32} {'ms':>8}"]
+        for name, seconds in sorted(self.timings.items(), key=lambda item: -item[1])[:limit]:
+            lines.append(f"{name:<32} {seconds * 1000:>8.1f}")
+        lines.append(f"{'total imports':<32} {sum(self.timings.values()) * 1000:>8.1f}")
+        for label, seconds in self.marks:
+            lines.append(f"{label:<32} {seconds * 1000:>8.1f}")
+        return "\n".join(lines)
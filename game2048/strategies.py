@@ -0,0 +1,77 @@
+"""
+Стратегии выбора хода для игры без графического интерфейса.
+
+Стратегия - вызываемый объект strategy(board, rng), который по упакованному полю
+возвращает направление хода или None, если допустимых ходов нет.
+"""
+import bitboard
+from expectimax import ExpectimaxSolver
+from ntuple import NTupleNetwork, default_weights_path
+
+
+def legal_moves(board):
+    """Возвращает список направлений, которые меняют поле."""
+    return bitboard.directions_from_mask(bitboard.legal_moves(board))
+
+
+def random_strategy(board, rng):
+    """Случайный допустимый ход."""
+    moves = legal_moves(board)
+    return rng.choice(moves) if moves else None
+
+
+def greedy_strategy(board, rng):
+    """Ход с наибольшими очками; при равенстве - с наибольшим числом пустых клеток."""
+    best_direction = None
+    best_key = None
+    for direction in bitboard.DIRECTIONS:
+        new_board, score = bitboard.move(board, direction)
+        if new_board == board:
+            continue
+        key = (score, len(bitboard.empty_shifts(new_board)))
+        if best_key is None or key > best_key:
+            best_key = key
+            best_direction = direction
+    return best_direction
+
+
+class ExpectimaxStrategy:
+    """Обёртка над ExpectimaxSolver с интерфейсом стратегии."""
+    def __init__(self, depth=2, time_limit=None):
+        self.solver = ExpectimaxSolver(depth=depth, time_limit=time_limit)
+
+    def __call__(self, board, rng):
+        return self.solver.best_move(board)
+
+
+class NTupleStrategy:
+    """Жадный ход по обученной n-tuple сети."""
+    def __init__(self, weights_path=None):
+        self.network = NTupleNetwork.load(weights_path or default_weights_path())
+
+    def __call__(self, board, rng):
+        return self.network.best_move(board)
+
+
+STRATEGIES = ("random", "greedy", "expectimax", "ntuple")
+
+
+def make_strategy(name, depth=2, time_limit=None, weights_path=None):
+    """
+    Создаёт стратегию по имени.
+
+ Аргументы:
+ name (str): "random", "greedy", "expectimax" или "ntuple".
+ depth (int): Глубина поиска для expectimax.
+ time_limit (float | None): Бюджет времени на ход для expectimax в секундах.
+ weights_path (str | None): Файл весов для ntuple (по умолчанию - в каталоге данных пользователя).
+    """
+    if name == "random":
+        return random_strategy
+    if name == "greedy":
+        return greedy_strategy
+    if name == "expectimax":
+        return ExpectimaxStrategy(depth=depth, time_limit=time_limit)
+    if name == "ntuple":
+        return NTupleStrategy(weights_path)
+    raise ValueError(f"Unknown strategy: {name}")
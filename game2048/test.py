@@ -1,14 +1,29 @@
 import unittest
 import numpy as np
 from game2048 import *
+import bitboard
+from engine import GameEngine, slide_paths
+from batch import move_batch, legal_moves_batch
+from expectimax import ExpectimaxSolver
+import random
+from selfplay import play_game
+from strategies import make_strategy
+from score_store import ScoreStore
+from history import MoveHistory
+from replay import Replay, play_replay, verify_replay, append_to_archive, read_archive
+from vec_env import VecEnv2048
+from ntuple import NTupleNetwork, train
+from hint import HintEngine
+from tournament import run_tournament, summarize_tournament, rate_interval
+import threading
 
 def test_game_initialization():
     app = QApplication(sys.argv)
     game = Game2048()
     assert game.size == 4
     assert game.grid.shape == (4, 4)
-    assert len(game.cells) == 4
-    assert len(game.cells[0]) == 4
+    assert game.board_widget.board_size == 4
+    assert game.board_widget.grid.shape == (4, 4)
     app.quit()
 
 def test_initial_tiles():
@@ -148,10 +163,12 @@ def test_new_game_reset():
 
 def test_cell_styles():
     app = QApplication(sys.argv)
-    cell = GameCell(2)
-    assert "background-color: #eee4da" in cell.get_style()
-    cell.set_value(0)
-    assert "background-color: #ccc" in cell.get_style()
+    board = BoardWidget()
+    assert tile_color(2) == "#eee4da"
+    assert tile_color(0) == "#ccc"
+    pixmap = board.tile_pixmap(2, 100)
+    assert pixmap.toImage().pixelColor(50, 5).name() == "#eee4da"
+    assert board.tile_pixmap(2, 100) is pixmap
     app.quit()
 
 def test_difficulty_selection():
@@ -162,10 +179,20 @@ def test_difficulty_selection():
     assert game.win_condition == 256
     app.quit()
 
-def test_high_score_storage():
+def test_high_score_storage(tmp_path, monkeypatch):
+    import score_store
+    store = ScoreStore(str(tmp_path / "scores.db"))
+    monkeypatch.setattr(score_store, "_default_store", store)
     save_high_score(1000)
     assert load_high_score() == 1000
-    save_high_score(0)  # Очищаем тестовые данные
+    assert store.leaderboard() == [] and store.difficulty_summary() == []  # Not recorded as a game
+    store.close()
+    store = ScoreStore(str(tmp_path / "scores.db"))
+    monkeypatch.setattr(score_store, "_default_store", store)
+    assert load_high_score() == 1000
+    save_high_score(0)
+    assert load_high_score() == 0
+    store.close()
 
 def test_random_tile_addition():
     app = QApplication(sys.argv)
@@ -180,7 +207,7 @@ def test_board_update():
     game = Game2048()
     game.grid[0][0] = 2
     game.update_board()
-    assert game.cells[0][0].value == 2
+    assert game.board_widget.grid[0][0] == 2
     app.quit()
 
 def test_return_to_selection():
@@ -214,4 +241,449 @@ def test_lose_handling():
     game.check_lose()
     # Проверяем, что игра перешла в состояние "завершено"
     assert game.game_over == True
-    app.quit()
\ No newline at end of file
+    app.quit()
+
+def test_bitboard_roundtrip():
+    grid = np.array([
+        [2, 4, 8, 16],
+        [0, 0, 32, 0],
+        [2048, 0, 0, 4],
+        [0, 32768, 0, 2]
+    ])
+    assert (bitboard.to_grid(bitboard.to_bitboard(grid)) == grid).all()
+
+def test_bitboard_merge_without_gaps():
+    grid = np.array([
+        [2, 2, 4, 0],
+        [2, 2, 2, 2],
+        [0, 0, 0, 0],
+        [0, 0, 0, 0]
+    ])
+    board, score = bitboard.move(bitboard.to_bitboard(grid), "left")
+    new_grid = bitboard.to_grid(board)
+    assert list(new_grid[0]) == [4, 4, 0, 0]
+    assert list(new_grid[1]) == [4, 4, 0, 0]
+    assert score == 12
+
+def test_engine_headless_move():
+    engine = GameEngine()
+    engine.grid = np.array([
+        [2, 2, 0, 0],
+        [0, 0, 0, 0],
+        [0, 0, 0, 0],
+        [0, 0, 0, 0]
+    ])
+    assert engine.move("left")
+    assert engine.grid[0][0] == 4
+    assert engine.score == 4
+    assert np.count_nonzero(engine.grid) == 2  # merged tile + spawned tile
+
+def test_engine_no_spawn_on_noop_move():
+    engine = GameEngine()
+    engine.grid = np.array([
+        [2, 0, 0, 0],
+        [0, 0, 0, 0],
+        [0, 0, 0, 0],
+        [0, 0, 0, 0]
+    ])
+    assert not engine.move("left")
+    assert np.count_nonzero(engine.grid) == 1
+
+def test_engine_merges_32768_tiles():
+    engine = GameEngine()
+    engine.new_game(seed=1)
+    engine.grid = np.array([
+        [16384, 16384, 0, 0],
+        [16384, 16384, 0, 0],
+        [0, 0, 0, 0],
+        [0, 0, 0, 0]
+    ])
+    assert engine.packable()
+    assert engine.move("left")
+    assert list(engine.grid[:2, 0]) == [32768, 32768] and not engine.packable()
+    assert engine.legal_moves() & bitboard.MOVE_BITS["up"]
+    assert engine.move("up")
+    assert engine.grid[0][0] == 65536 and engine.score == 2 * 32768 + 65536
+    assert engine.undo() and list(engine.grid[:2, 0]) == [32768, 32768]
+    assert engine.move_grid(engine.grid, "down")[0][3][0] == 65536
+
+def test_move_batch_matches_engine():
+    engine = GameEngine()
+    rng = np.random.default_rng(2048)
+    boards = rng.choice([0, 0, 0, 2, 4, 8, 16, 32], size=(500, 4, 4))
+    for direction in ("up", "down", "left", "right"):
+        new_boards, scores, changed = move_batch(boards, direction)
+        for board, new_board, score, was_changed in zip(boards, new_boards, scores, changed):
+            expected, expected_score = engine.move_grid(board, direction)
+            assert (new_board == expected).all()
+            assert score == expected_score
+            assert was_changed == (not np.array_equal(expected, board))
+
+def test_expectimax_returns_legal_move():
+    solver = ExpectimaxSolver(depth=2)
+    board = bitboard.to_bitboard(np.array([
+        [2, 4, 2, 4],
+        [4, 2, 4, 2],
+        [2, 4, 2, 4],
+        [4, 2, 4, 0]
+    ]))
+    direction = solver.best_move(board)
+    assert direction in ("down", "right")
+    assert solver.nodes > 0
+
+def test_expectimax_no_moves():
+    solver = ExpectimaxSolver(depth=2, time_limit=0.05)
+    board = bitboard.to_bitboard(np.array([
+        [2, 4, 2, 4],
+        [4, 2, 4, 2],
+        [2, 4, 2, 4],
+        [4, 2, 4, 2]
+    ]))
+    assert solver.best_move(board) is None
+
+def test_selfplay_is_reproducible():
+    strategy = make_strategy("greedy")
+    first = play_game(strategy, random.Random(7))
+    second = play_game(strategy, random.Random(7))
+    assert first == second
+    assert first["moves"] > 0
+    assert first["max_tile"] >= 4
+
+def test_selfplay_strategy_rng_does_not_shift_tiles():
+    def recording(draws, boards):
+        def strategy(board, rng):
+            for _ in range(draws):
+                rng.random()
+            boards.append(board)
+            return "left" if len(boards) % 2 else "up"
+        return strategy
+    quiet, noisy = [], []
+    play_game(recording(0, quiet), random.Random(7), random.Random(1))
+    play_game(recording(5, noisy), random.Random(7), random.Random(2))
+    assert quiet == noisy
+
+def test_board_update_repaints_only_changed_cells():
+    app = QApplication(sys.argv)
+    game = Game2048()
+    game.board_widget.resize(game.board_widget.sizeHint())
+    game.grid.fill(0)
+    game.update_board()
+    repainted = []
+    game.board_widget.update = repainted.append
+    game.grid[1][2] = 4
+    game.update_board()
+    assert repainted == [game.board_widget.tile_rect(1, 2)]
+    app.quit()
+
+def test_score_store_leaderboard(tmp_path):
+    db_path = str(tmp_path / "scores.db")
+    store = ScoreStore(db_path)
+    store.record_game(500, max_tile=64, moves=80, duration=12.5, difficulty=256)
+    store.record_game(1500, max_tile=128, moves=150, duration=30.0, difficulty=2048)
+    store.record_game(900, max_tile=64, moves=110, duration=20.0, difficulty=256)
+    assert store.best_score() == 1500
+    assert store.best_score(256) == 900
+    assert [row[0] for row in store.leaderboard(difficulty=256)] == [900, 500]
+    assert store.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    store.close()
+
+    reopened = ScoreStore(db_path)
+    assert reopened.best_score() == 1500
+    assert reopened.leaderboard(limit=1)[0][:3] == (1500, 128, 150)
+    reopened.close()
+
+def test_legal_move_mask():
+    grid = np.array([
+        [2, 4, 2, 4],
+        [4, 2, 4, 2],
+        [2, 4, 2, 4],
+        [8, 8, 4, 2]
+    ])
+    expected = bitboard.MOVE_BITS["left"] | bitboard.MOVE_BITS["right"]
+    assert bitboard.legal_moves(bitboard.to_bitboard(grid)) == expected
+    assert legal_moves_batch(grid[np.newaxis])[0] == expected
+    engine = GameEngine()
+    engine.grid = grid
+    assert engine.legal_moves() == expected
+    assert not engine.check_lose()
+    assert not engine.move("up")
+    assert engine.move("left")
+    assert engine.move_mask == bitboard.legal_moves(bitboard.to_bitboard(engine.grid))
+
+def test_engine_larger_board():
+    engine = GameEngine(size=5)
+    engine.grid = np.array([
+        [2, 2, 4, 0, 4],
+        [0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0]
+    ])
+    assert engine.move("left")
+    assert list(engine.grid[0][:2]) == [4, 8]
+    assert engine.score == 12
+    engine.grid = np.array([
+        [2, 4, 2],
+        [4, 2, 4],
+        [2, 4, 2]
+    ])
+    assert engine.check_lose()
+
+def test_board_size_selection():
+    app = QApplication(sys.argv)
+    game = Game2048()
+    selection = DifficultySelectionWindow(game)
+    selection.size_combo.setCurrentIndex(BOARD_SIZES.index(6))
+    selection.select_difficulty(512)
+    assert game.grid.shape == (6, 6)
+    assert game.board_widget.board_size == 6
+    assert np.count_nonzero(game.grid) == 2
+    app.quit()
+
+def test_seeded_games_are_reproducible():
+    first = GameEngine()
+    second = GameEngine()
+    first.new_game(seed=42)
+    second.new_game(seed=42)
+    assert (first.grid == second.grid).all()
+    for direction in ("left", "up", "right", "down") * 5:
+        assert first.move(direction) == second.move(direction)
+    assert (first.grid == second.grid).all()
+    assert first.score == second.score
+
+def test_replay_roundtrip(tmp_path):
+    archive = str(tmp_path / "replays.bin")
+    for size in (4, 5):
+        engine = GameEngine(size=size)
+        engine.new_game(seed=size)
+        for direction in ("left", "up", "right", "down") * 10:
+            engine.move(direction)
+        append_to_archive(archive, Replay.from_engine(engine))
+    replays = list(read_archive(archive))
+    assert [replay.size for replay in replays] == [4, 5]
+    for replay in replays:
+        assert verify_replay(replay)
+    score, grid = play_replay(replays[1])
+    assert (grid == engine.grid).all()
+    assert len(replays[0].to_bytes()) == 23 + (len(replays[0].moves) + 3) // 4
+
+def test_replay_merges_32768_tiles(monkeypatch):
+    start = bitboard.to_bitboard(np.array([
+        [16384, 16384, 0, 0],
+        [16384, 16384, 0, 0],
+        [0, 0, 0, 0],
+        [0, 0, 0, 0]
+    ]))
+    spawn = bitboard.add_random_tile
+    # The replay's first spawn yields the prepared position instead of a tile on an empty board
+    monkeypatch.setattr(bitboard, "add_random_tile", lambda board, rng: start if board == 0 else spawn(board, rng))
+    moves = [bitboard.DIRECTIONS.index(direction) for direction in ("left", "up", "right")]
+    score, grid = play_replay(Replay(4, 7, moves, 0))
+
+    engine = GameEngine()
+    engine.grid = bitboard.to_grid(start)
+    engine.rng = random.Random(7)
+    engine.add_random_tile()
+    for index in moves:
+        assert engine.move(bitboard.DIRECTIONS[index])
+    assert engine.grid.max() == 65536
+    assert score == engine.score and (grid == engine.grid).all()
+
+def test_undo_redo():
+    for size in (4, 5):
+        engine = GameEngine(size=size)
+        engine.new_game(seed=3)
+        positions = [(engine.grid.copy(), engine.score)]
+        for direction in ("left", "up", "right", "down") * 30:
+            if engine.move(direction):
+                positions.append((engine.grid.copy(), engine.score))
+        for grid, score in reversed(positions[:-1]):
+            assert engine.undo()
+            assert (engine.grid == grid).all() and engine.score == score
+        assert not engine.undo()
+        while engine.redo():
+            pass
+        assert (engine.grid == positions[-1][0]).all() and engine.score == positions[-1][1]
+        assert engine.replayable
+        engine.undo()
+        engine.move(next(d for d in bitboard.DIRECTIONS if engine.legal_moves() & bitboard.MOVE_BITS[d]))
+        assert not engine.replayable
+
+def test_move_history_ring_buffer():
+    history = MoveHistory(capacity=3)
+    for index in range(5):
+        history.push(index, index * 10, index)
+    assert history.current() == (4, 40, 4)
+    assert history.undo() == (3, 30, 3)
+    assert history.undo() == (2, 20, 2)
+    assert history.undo() is None
+    unlimited = MoveHistory()
+    for index in range(1000):
+        unlimited.push(index, index, index)
+    for _ in range(999):
+        unlimited.undo()
+    assert unlimited.current() == (0, 0, 0)
+
+def test_vec_env_step_and_auto_reset():
+    env = VecEnv2048(64, seed=0)
+    observations, masks = env.reset()
+    assert observations.shape == (64, 16) and masks.shape == (64, 4)
+    assert ((observations > 0).sum(axis=1) == 2).all()
+    rng = np.random.default_rng(1)
+    finished = 0
+    for _ in range(2000):
+        boards = env.boards.copy()
+        actions = np.array([rng.choice(np.flatnonzero(mask)) for mask in masks])
+        observations, rewards, dones, masks = env.step(actions)
+        for board, action, reward in zip(boards[:4], actions[:4], rewards[:4]):
+            expected = bitboard.move(bitboard.to_bitboard(board), bitboard.DIRECTIONS[action])[1]
+            assert reward == expected
+        assert (env.final_scores[dones] > 0).all()
+        assert masks.any(axis=1).all()
+        finished += dones.sum()
+    assert finished > 0
+
+def test_ntuple_training_checkpoint(tmp_path):
+    path = str(tmp_path / "ntuple.weights")
+    network = NTupleNetwork.create(path, tuples=((0, 1, 2, 3), (4, 5, 6, 7)))
+    train(network, 20, report_every=0)
+    assert np.abs(network.weights).max() > 0
+    board = bitboard.to_bitboard([[2, 4, 8, 0], [0, 2, 16, 0], [0, 0, 4, 2], [0, 0, 0, 2]])
+    assert network.value(board) == network.value(bitboard.transpose(board))
+    loaded = NTupleNetwork.load(path)
+    assert loaded.tuples == network.tuples
+    assert np.array_equal(loaded.weights, network.weights)
+    assert loaded.best_move(board) == network.best_move(board)
+
+def test_hint_engine_cancellation():
+    results = []
+    done = threading.Event()
+    def callback(request_id, board, direction):
+        results.append((request_id, direction))
+        done.set()
+    hints = HintEngine(callback, time_limit=0.05)
+    board = bitboard.to_bitboard([[2, 4, 8, 0], [0, 2, 16, 0], [0, 0, 4, 2], [0, 0, 0, 2]])
+    hints.request(board)
+    last = hints.request(board)  # Supersedes the first request
+    assert done.wait(5)
+    hints.close()
+    assert results == [(last, results[0][1])]
+    assert results[0][1] in bitboard.DIRECTIONS
+    solver = ExpectimaxSolver(depth=20)
+    cancelled = threading.Event()
+    cancelled.set()
+    assert solver.best_move(board, cancel=cancelled) in bitboard.DIRECTIONS
+
+def test_hint_key_does_not_block():
+    app = QApplication(sys.argv)
+    game = Game2048()
+    game.new_game()
+    started = time.monotonic()
+    game.request_hint()
+    assert time.monotonic() - started < 0.05
+    deadline = time.monotonic() + 5
+    while game.hint_request is not None and time.monotonic() < deadline:
+        app.processEvents()
+    assert game.hint_label.text().startswith("Hint: ") and game.hint_request is None
+    game.hint_engine.close()
+    app.quit()
+
+def test_hint_disabled_for_unpackable_board():
+    app = QApplication(sys.argv)
+    game = Game2048()
+    game.new_game()
+    game.grid[0][0] = 32768
+    game.grid[3][3] = 65536
+    game.engine.invalidate_moves()
+    game.request_hint()
+    assert game.hint_label.text() == "Hint: unavailable" and game.hint_request is None
+    game.toggle_suggestions()
+    assert game.suggestions and game.hint_label.text() == "Hint: unavailable"
+    app.quit()
+
+def test_slide_paths():
+    grid = np.array([[2, 2, 2, 0], [0, 4, 0, 4], [0, 0, 0, 0], [8, 0, 0, 0]])
+    assert slide_paths(grid, "left") == [
+        (0, 0, 0, 0, 2), (0, 1, 0, 0, 2), (0, 2, 0, 1, 2),
+        (1, 1, 1, 0, 4), (1, 3, 1, 0, 4),
+        (3, 0, 3, 0, 8)]
+    assert (3, 0, 1, 0, 8) in slide_paths(grid, "up")
+
+def test_queued_moves_animate_last_move_only():
+    app = QApplication(sys.argv)
+    game = Game2048()
+    game.engine.new_game(seed=3)
+    reference = GameEngine(seed=3)
+    reference.new_game(seed=3)
+    for direction in ("left", "up", "right", "down"):
+        game.queue_move(direction)
+        reference.move(direction)
+    assert len(game.input_queue) == 4  # Nothing is applied inside the key handler
+    app.processEvents()
+    assert not game.input_queue
+    assert (game.grid == reference.grid).all() and game.score == reference.score
+    assert game.board_widget.paths is not None and (game.board_widget.grid == game.grid).all()
+    game.board_widget.set_grid(game.grid)
+    assert game.board_widget.paths is None
+    app.quit()
+
+def test_tournament_uses_identical_seeds():
+    results = run_tournament(["random", "greedy"], games=6, workers=2, seed=5)
+    again = run_tournament(["random"], games=6, workers=1, seed=5)
+    assert [r["score"] for r in results["random"]] == [r["score"] for r in again["random"]]
+    rows = summarize_tournament(results)
+    assert [row["strategy"] for row in rows] == ["random", "greedy"]
+    assert rows[0]["diff_vs_baseline"] == 0.0
+    assert rows[1]["diff_ci_low"] <= rows[1]["diff_vs_baseline"] <= rows[1]["diff_ci_high"]
+    assert rows[1]["ms_per_move"] > 0
+    rate, low, high = rate_interval(0, 10)
+    assert rate == 0.0 and low == 0.0 and 0.0 < high < 0.5
+
+def test_engine_counts_merges_by_tile():
+    for size in (4, 5):
+        engine = GameEngine(size=size, seed=1)
+        engine.new_game(seed=1)
+        engine.grid = np.array([[2, 2, 4, 4, 8][:size]] + [[0] * size] * (size - 1))
+        engine.move("left")
+        assert engine.merge_counts == {4: 1, 8: 1}
+
+def test_undo_redo_restores_merge_counts():
+    engine = GameEngine(size=4, seed=1)
+    engine.new_game(seed=1)
+    engine.grid = np.array([[2, 2, 4, 4], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]])
+    assert engine.move("left")
+    after_first = dict(engine.merge_counts)
+    assert after_first == {4: 1, 8: 1}
+    while sum(engine.merge_counts.values()) <= 2:
+        assert engine.move(next(d for d in bitboard.DIRECTIONS if engine.legal_moves() & bitboard.MOVE_BITS[d]))
+    after_merges = dict(engine.merge_counts)
+    moves = engine.moves
+    while engine.undo():
+        pass
+    assert engine.moves == 0 and not engine.merge_counts
+    assert engine.redo() and engine.merge_counts == after_first
+    while engine.redo():
+        pass
+    assert engine.moves == moves and engine.merge_counts == after_merges
+    while engine.moves > 1:
+        engine.undo()
+    # A different move after undo replaces the undone ones
+    legal = [d for d in bitboard.DIRECTIONS if engine.legal_moves() & bitboard.MOVE_BITS[d]]
+    assert engine.move(legal[-1])
+    after_new = dict(engine.merge_counts)
+    assert len(engine.merge_log) == engine.moves == 2
+    assert engine.undo() and engine.merge_counts == after_first
+    assert engine.redo() and engine.merge_counts == after_new
+
+def test_score_store_summary_tables(tmp_path):
+    store = ScoreStore(str(tmp_path / "scores.db"))
+    store.record_game(100, 64, 2, 1.0, 2048, merges={4: 3, 8: 1}, move_events=[(0, 4, 500.0), (2, 8, 500.0)])
+    store.record_game(300, 128, 8, 3.0, 2048, merges={4: 1})
+    store.record_game(50, 32, 5, 1.0, 256)
+    summary = store.difficulty_summary()
+    assert [row["difficulty"] for row in summary] == [256, 2048]
+    assert summary[1]["games"] == 2 and summary[1]["best_score"] == 300 and summary[1]["max_tile"] == 128
+    assert summary[1]["mean_score"] == 200.0 and summary[1]["ms_per_move"] == 400.0
+    assert store.merge_summary(2048) == {4: 4, 8: 1}
+    assert store.connection.execute("SELECT COUNT(*) FROM move_events").fetchone()[0] == 2
+    store.close()
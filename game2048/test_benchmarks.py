@@ -0,0 +1,77 @@
+"""
+Бенчмарки горячих путей движка 2048 (без QApplication).
+
+Базовая линия зависит от машины, поэтому в репозиторий не входит: ее записывают
+локально (JSON в каталоге benchmarks) до изменений и после намеренного изменения
+производительности:
+    make bench-baseline
+
+Сравнение с последней базовой линией; прогон падает, если среднее время любого
+бенчмарка выросло больше чем на 25%:
+    make bench-compare
+"""
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import bitboard
+from batch import move_batch
+from engine import GameEngine
+from expectimax import ExpectimaxSolver
+from selfplay import play_game
+from strategies import random_strategy
+
+MID_GAME = np.array([
+    [2, 4, 8, 16],
+    [0, 2, 32, 64],
+    [0, 0, 4, 128],
+    [2, 0, 0, 256]
+])
+
+
+def test_bitboard_move(benchmark):
+    board = bitboard.to_bitboard(MID_GAME)
+    new_board, _ = benchmark(bitboard.move, board, "up")
+    assert new_board != board
+
+
+def test_engine_move(benchmark):
+    engine = GameEngine()
+
+    def setup():
+        engine.new_game(seed=1)
+        engine.grid = MID_GAME.copy()
+
+    benchmark.pedantic(engine.move, args=("left",), setup=setup, rounds=2000)
+
+
+def test_move_batch(benchmark):
+    boards = np.random.default_rng(0).choice([0, 0, 2, 4, 8, 16, 32], size=(4096, 4, 4))
+    new_boards, _, _ = benchmark(move_batch, boards, "left")
+    assert new_boards.shape == boards.shape
+
+
+def test_spawn(benchmark):
+    rng = random.Random(0)
+    board = bitboard.to_bitboard(MID_GAME)
+    assert benchmark(bitboard.add_random_tile, board, rng) != board
+
+
+def test_lose_check(benchmark):
+    board = bitboard.to_bitboard(MID_GAME)
+    assert benchmark(bitboard.legal_moves, board)
+
+
+def test_random_game(benchmark):
+    # The same seed every round: games of different lengths would hide regressions in their spread
+    result = benchmark(lambda: play_game(random_strategy, random.Random(1)))
+    assert result["moves"] > 0
+
+
+def test_expectimax_move(benchmark):
+    solver = ExpectimaxSolver(depth=3)
+    board = bitboard.to_bitboard(MID_GAME)
+    assert benchmark.pedantic(solver.best_move, args=(board,), rounds=10) is not None
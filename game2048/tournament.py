@@ -0,0 +1,184 @@
+"""
+Турнир стратегий 2048 на одинаковых наборах зерен.
+
+Пример:
+    python tournament.py greedy expectimax --games 200 --workers 8 --csv report.csv --json report.json
+
+Каждая стратегия играет партии с одними и теми же зернами (selfplay.game_seed), а
+случайность стратегии берется из отдельного генератора (selfplay.strategy_seed), поэтому
+разница средних считается по парам партий с одинаковым появлением плиток, а не по
+независимым выборкам. Первая стратегия в списке - базовая для сравнения.
+"""
+import argparse
+import csv
+import json
+import math
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from selfplay import game_seed, play_game, strategy_seed
+from strategies import STRATEGIES, make_strategy
+
+CONFIDENCE = 0.95
+TILE_THRESHOLDS = (2048, 4096)
+CSV_COLUMNS = (
+    "strategy", "games", "mean_score", "mean_ci_low", "mean_ci_high", "median_score",
+    "rate_2048", "rate_2048_ci_low", "rate_2048_ci_high",
+    "rate_4096", "rate_4096_ci_low", "rate_4096_ci_high",
+    "ms_per_move", "diff_vs_baseline", "diff_ci_low", "diff_ci_high",
+)
+
+
+def _play_chunk(strategy_name, depth, time_limit, seed, game_indices):
+    """Играет партии с заданными номерами в дочернем процессе и замеряет время каждой."""
+    strategy = make_strategy(strategy_name, depth=depth, time_limit=time_limit)
+    results = []
+    for game_index in game_indices:
+        rng = random.Random(game_seed(seed, game_index))
+        started = time.perf_counter()
+        result = play_game(strategy, rng, random.Random(strategy_seed(seed, game_index)))
+        result["seconds"] = time.perf_counter() - started
+        results.append(result)
+    return results
+
+
+def run_tournament(strategy_names, games, workers=1, seed=0, depth=2, time_limit=None):
+    """
+    Играет games партий каждой стратегией в общем пуле процессов.
+
+ Возвращается:
+ dict: Имя стратегии -> список результатов в порядке номеров партий.
+    """
+    chunks = [list(range(start, games, workers)) for start in range(workers)]
+    chunks = [chunk for chunk in chunks if chunk]
+    results = {name: [None] * games for name in strategy_names}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [(name, chunk, executor.submit(_play_chunk, name, depth, time_limit, seed, chunk))
+                   for name in strategy_names for chunk in chunks]
+        for name, chunk, future in futures:
+            for game_index, result in zip(chunk, future.result()):
+                results[name][game_index] = result
+    return results
+
+
+def _z_value():
+    return statistics.NormalDist().inv_cdf(0.5 + CONFIDENCE / 2)
+
+
+def mean_interval(values):
+    """Среднее и его доверительный интервал (нормальное приближение)."""
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, mean, mean
+    half_width = _z_value() * statistics.stdev(values) / math.sqrt(len(values))
+    return mean, mean - half_width, mean + half_width
+
+
+def rate_interval(successes, trials):
+    """Доля успехов и её доверительный интервал Уилсона."""
+    if not trials:
+        return 0.0, 0.0, 0.0
+    z = _z_value()
+    rate = successes / trials
+    denominator = 1 + z * z / trials
+    center = (rate + z * z / (2 * trials)) / denominator
+    half_width = z * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials)) / denominator
+    # The bounds are exact at 0 and 1; rounding would otherwise leave a tiny residue.
+    low = 0.0 if successes == 0 else max(0.0, center - half_width)
+    high = 1.0 if successes == trials else min(1.0, center + half_width)
+    return rate, low, high
+
+
+def summarize_tournament(results):
+    """
+    Сводная статистика по каждой стратегии.
+
+ Возвращается:
+ list: Словари с ключами CSV_COLUMNS в порядке стратегий.
+    """
+    baseline = None
+    rows = []
+    for name, games in results.items():
+        scores = [result["score"] for result in games]
+        total_moves = sum(result["moves"] for result in games)
+        total_seconds = sum(result["seconds"] for result in games)
+        mean, low, high = mean_interval(scores)
+        row = {
+            "strategy": name,
+            "games": len(games),
+            "mean_score": mean,
+            "mean_ci_low": low,
+            "mean_ci_high": high,
+            "median_score": statistics.median(scores),
+            "ms_per_move": 1000.0 * total_seconds / total_moves if total_moves else 0.0,
+        }
+        for tile in TILE_THRESHOLDS:
+            reached = sum(result["max_tile"] >= tile for result in games)
+            row[f"rate_{tile}"], row[f"rate_{tile}_ci_low"], row[f"rate_{tile}_ci_high"] = rate_interval(reached, len(games))
+        if baseline is None:
+            baseline = scores
+            row["diff_vs_baseline"] = row["diff_ci_low"] = row["diff_ci_high"] = 0.0
+        else:
+            # Games with the same index share a seed, so the difference is paired.
+            diff, low, high = mean_interval([score - base for score, base in zip(scores, baseline)])
+            row["diff_vs_baseline"], row["diff_ci_low"], row["diff_ci_high"] = diff, low, high
+        rows.append(row)
+    return rows
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_json(path, rows, settings):
+    with open(path, "w") as file:
+        json.dump({"settings": settings, "strategies": rows}, file, indent=2)
+
+
+def format_report(rows):
+    """Текстовая таблица для консоли."""
+    lines = [f"{'strategy':<12} {'mean':>18} {'median':>8} {'2048':>7} {'4096':>7} {'ms/move':>8} {'vs baseline':>20}"]
+    for row in rows:
+        lines.append(
+            f"{row['strategy']:<12} {row['mean_score']:>8.0f} ±{(row['mean_ci_high'] - row['mean_ci_low']) / 2:<8.0f}"
+            f" {row['median_score']:>8.0f} {row['rate_2048']:>7.1%} {row['rate_4096']:>7.1%} {row['ms_per_move']:>8.3f}"
+            f" {row['diff_vs_baseline']:>+10.0f} ±{(row['diff_ci_high'] - row['diff_ci_low']) / 2:<8.0f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare 2048 strategies on identical seeds")
+    parser.add_argument("strategies", nargs="+", choices=STRATEGIES, help="strategies; the first one is the baseline")
+    parser.add_argument("--games", type=int, default=100, help="games per strategy")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="base seed shared by all strategies")
+    parser.add_argument("--depth", type=int, default=2, help="search depth for expectimax")
+    parser.add_argument("--time-limit", type=float, default=None, help="seconds per move for expectimax")
+    parser.add_argument("--csv", help="write the report as CSV")
+    parser.add_argument("--json", help="write the report as JSON")
+    args = parser.parse_args(argv)
+    if args.games < 1 or args.workers < 1:
+        parser.error("--games and --workers must be positive")
+    if len(set(args.strategies)) != len(args.strategies):
+        parser.error("each strategy may be listed once")
+
+    results = run_tournament(args.strategies, args.games, args.workers, args.seed, args.depth, args.time_limit)
+    rows = summarize_tournament(results)
+    print(format_report(rows))
+    if args.csv:
+        write_csv(args.csv, rows)
+    if args.json:
+        settings = {"games": args.games, "seed": args.seed, "depth": args.depth,
+                    "time_limit": args.time_limit, "confidence": CONFIDENCE}
+        write_json(args.json, rows, settings)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
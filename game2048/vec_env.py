@@ -0,0 +1,117 @@
+"""
+Векторизованная среда 2048 для обучения с подкреплением.
+
+VecEnv2048 ведет N партий одновременно: ход, появление плиток, проверка конца игры
+и перезапуск завершившихся партий выполняются над всем пакетом средствами NumPy
+(через move_batch и legal_moves_batch), без цикла Python по партиям.
+
+Пример:
+    env = VecEnv2048(1024, seed=0)
+    observations, masks = env.reset()
+    actions = policy(observations, masks)  # индексы bitboard.DIRECTIONS
+    observations, rewards, dones, masks = env.step(actions)
+"""
+import numpy as np
+
+from batch import move_batch, legal_moves_batch
+from bitboard import DIRECTIONS
+
+
+class VecEnv2048:
+    """
+    N независимых партий 2048 на полях size x size.
+
+ Действие - индекс направления в bitboard.DIRECTIONS (0 - up, 1 - down, 2 - left, 3 - right).
+ Недопустимое действие оставляет поле без изменений, не порождает плитку и дает награду 0.
+    """
+    def __init__(self, n, size=4, seed=None):
+        """
+        Аргументы:
+ n (int): Количество одновременно идущих партий.
+ size (int): Размер стороны поля.
+ seed (int | None): Зерно генератора numpy.random.Generator.
+        """
+        self.n = n
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((n, size, size), dtype=np.int64)
+        self.scores = np.zeros(n, dtype=np.int64)  # Score of the running episode
+        self.final_scores = np.zeros(n, dtype=np.int64)  # Score of episodes that ended on the last step
+        self.masks = np.zeros(n, dtype=np.uint8)
+
+    def reset(self):
+        """
+        Начинает все партии заново.
+
+ Возвращается:
+ tuple: (наблюдения формы (N, size*size), маски допустимых действий формы (N, 4)).
+        """
+        self._reset_games(np.arange(self.n))
+        return self.observations(), self.action_masks()
+
+    def step(self, actions):
+        """
+        Делает по одному ходу в каждой партии; завершившиеся партии сразу перезапускаются.
+
+ Аргументы:
+ actions (numpy.ndarray): Индексы направлений формы (N,).
+
+ Возвращается:
+ tuple: (наблюдения формы (N, size*size), награды формы (N,) - очки за слияния как в
+ score_increase, флаги конца партии формы (N,), маски допустимых действий формы (N, 4)).
+ Для завершившихся партий наблюдения и маски относятся уже к новой партии, а итоговый
+ счёт доступен в final_scores.
+        """
+        actions = np.asarray(actions)
+        if actions.shape != (self.n,):
+            raise ValueError(f"Expected actions of shape ({self.n},), got {actions.shape}")
+        rewards = np.zeros(self.n, dtype=np.int64)
+        changed = np.zeros(self.n, dtype=bool)
+        for action, direction in enumerate(DIRECTIONS):
+            index = np.flatnonzero(actions == action)
+            if len(index):
+                self.boards[index], rewards[index], changed[index] = move_batch(self.boards[index], direction)
+
+        moved = np.flatnonzero(changed)
+        self._spawn(moved)
+        self.scores += rewards
+        self.masks[moved] = legal_moves_batch(self.boards[moved])
+
+        dones = self.masks == 0
+        finished = np.flatnonzero(dones)
+        self.final_scores[:] = 0
+        self.final_scores[finished] = self.scores[finished]
+        self._reset_games(finished)
+        return self.observations(), rewards, dones, self.action_masks()
+
+    def observations(self):
+        """Показатели степени плиток (0 для пустой клетки) формы (N, size*size) типа uint8."""
+        boards = self.boards.reshape(self.n, -1)
+        return np.maximum(np.frexp(boards)[1] - 1, 0).astype(np.uint8)
+
+    def action_masks(self):
+        """Маски допустимых действий формы (N, 4) в порядке bitboard.DIRECTIONS."""
+        return ((self.masks[:, None] >> np.arange(len(DIRECTIONS), dtype=np.uint8)) & 1).astype(bool)
+
+    def _reset_games(self, index):
+        """Очищает поля с индексами index и ставит на каждое по две плитки."""
+        if not len(index):
+            return
+        self.boards[index] = 0
+        self.scores[index] = 0
+        self._spawn(index)
+        self._spawn(index)
+        self.masks[index] = legal_moves_batch(self.boards[index])
+
+    def _spawn(self, index):
+        """Ставит плитку 2 (с вероятностью 0.9) или 4 в случайную пустую клетку каждого поля."""
+        if not len(index):
+            return
+        boards = self.boards[index].reshape(len(index), -1)
+        empty = boards == 0
+        # The empty cell with the largest random key is uniformly distributed among empty cells.
+        cells = np.where(empty, self.rng.random(boards.shape), -1.0).argmax(axis=1)
+        values = np.where(self.rng.random(len(index)) < 0.9, 2, 4)
+        rows = np.flatnonzero(empty.any(axis=1))
+        boards[rows, cells[rows]] = values[rows]
+        self.boards[index] = boards.reshape(len(index), self.size, self.size)
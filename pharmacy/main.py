@@ -27,7 +27,11 @@ def excepthook(exc_type, exc_value, exc_traceback):
 
 sys.excepthook = excepthook
 import os
+import threading
+import time
 import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extras import execute_values
 import requests
 
 if getattr(sys, 'frozen', False):
@@ -41,9 +45,10 @@ from PyQt6.QtWidgets import (
     QComboBox, QHBoxLayout, QMessageBox,
     QSpinBox, QDateEdit, QTableView, QHeaderView, QDialogButtonBox, QInputDialog, QMainWindow, QTextEdit
 )
-from PyQt6.QtCore import QThread, pyqtSignal, Qt, QDate
+from PyQt6.QtCore import QThread, pyqtSignal, Qt, QDate, QAbstractTableModel, QModelIndex
 from PyQt6.QtGui import QStandardItemModel, QStandardItem, QFont
 from contextlib import contextmanager
+from dataclasses import dataclass
 import traceback
 
 # ------------------ Менеджер звуков ------------------ #
@@ -122,6 +127,13 @@ def with_sound(sound_name="click"):
 
 # ------------------ Конфигурация ------------------ #
 ADMIN_DB_PASSWORD = "akiba1212"  # Пароль администратора PostgreSQL
+DB_POOL_MIN_CONNECTIONS = 3  # Столько соединений пул держит открытыми; сверх них возвращенные закрываются
+DB_POOL_MAX_CONNECTIONS = 8  # Включая соединение, закрепленное за потоком интерфейса
+DB_CHECKOUT_TIMEOUT = 10  # Секунд ожидания свободного соединения
+DB_IDLE_PING_SECONDS = 60  # Соединение, простоявшее в пуле дольше, перед выдачей проверяется запросом
+TABLE_PAGE_SIZE = 200  # Строк, подгружаемых в таблицу интерфейса за раз
+# Подписи способов оплаты в интерфейсе -> значения, допустимые CHECK в таблице Sales
+PAYMENT_METHOD_CODES = {"Наличные": "cash", "Карта": "card", "Безналичные": "transfer"}
 
 
 # ------------------ Транзакции ------------------ #
@@ -164,25 +176,118 @@ class PharmacyTransactionManager:
 
 
 # ------------------ Менеджер БД ------------------ #
+@dataclass(frozen=True)
+class PagedQuery:
+    """
+    Запрос таблицы интерфейса, который читается страницами по ключу сортировки (keyset).
+
+    sql - запрос без ORDER BY с местом {keyset} в WHERE после остальных параметров;
+    key - выражения уникального ключа сортировки, key_columns - их номера в строке
+    результата. Следующая страница начинается после последней загруженной строки,
+    поэтому глубокие страницы не дороже первой, а строки, добавленные во время
+    прокрутки, не сдвигают уже загруженные.
+    """
+    sql: str
+    key: tuple
+    key_columns: tuple
+    descending: bool = False
+
+    def order_by(self):
+        direction = " DESC" if self.descending else ""
+        return " ORDER BY " + ", ".join(expression + direction for expression in self.key)
+
+    def ordered(self):
+        """Весь результат, отсортированный по ключу"""
+        return self.sql.format(keyset="TRUE") + self.order_by()
+
+    def page(self, after=None):
+        """Запрос страницы после ключа after (None - первая страница) и параметры ключа"""
+        if after is None:
+            return self.ordered(), ()
+        keyset = "({}) {} ({})".format(", ".join(self.key), "<" if self.descending else ">",
+                                       ", ".join(["%s"] * len(self.key)))
+        return self.sql.format(keyset=keyset) + self.order_by(), tuple(after)
+
+    def key_of(self, row):
+        return tuple(row[column] for column in self.key_columns)
+
+
 class DatabaseManager:
+    """
+    Пул соединений PostgreSQL (синглтон).
+
+    Методы чтения и фоновые потоки берут соединение из пула через checkout().
+    Диалоги, работающие через get_cursor()/get_connection(), используют одно
+    соединение, закрепленное за потоком интерфейса.
+    """
     _instance = None
 
+    # Queries shared by the get_* methods and the lazily loaded tables of the main window.
+    MEDICINES_QUERY = PagedQuery("""
+        SELECT m.ID_Medicine, m.MedicineName, m.ActiveSubstance, m.Dosage, m.Form, m.Price,
+               COALESCE(ms.TotalQuantity, 0), COALESCE(ms.SellableQuantity, 0), ms.NearestExpiry
+        FROM Medicine m
+        LEFT JOIN MedicineStock ms ON ms.ID_Medicine = m.ID_Medicine
+        WHERE {keyset}
+    """, key=("m.ID_Medicine",), key_columns=(0,))
+    SALES_QUERY = PagedQuery("""
+        SELECT s.ID_Sale, s.SaleDate, s.TotalAmount, 0 as Discount, s.TotalAmount as FinalTotal
+        FROM Sales s
+        WHERE {keyset}
+    """, key=("s.SaleDate", "s.ID_Sale"), key_columns=(1, 0), descending=True)
+    INVENTORY_QUERY = PagedQuery("""
+        SELECT i.ID_Inventory, m.MedicineName, i.Quantity, i.ExpiryDate, s.SupplierName
+        FROM Inventory i
+        LEFT JOIN Medicine m ON i.ID_Medicine = m.ID_Medicine
+        LEFT JOIN Supplier s ON m.ID_Supplier = s.ID_Supplier
+        WHERE i.ExpiryDate >= CURRENT_DATE  -- Только с нормальным сроком годности
+          AND {keyset}
+    """, key=("i.ID_Inventory",), key_columns=(0,))
+    # The trailing ID_Inventory only breaks ties between batches with the same date; it is not displayed.
+    EXPIRING_QUERY = PagedQuery("""
+        SELECT m.ID_Medicine, m.MedicineName, i.ExpiryDate, i.Quantity, i.ID_Inventory
+        FROM Inventory i
+        JOIN Medicine m ON i.ID_Medicine = m.ID_Medicine
+        WHERE i.ExpiryDate BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '%s days'
+          AND {keyset}
+    """, key=("i.ExpiryDate", "i.ID_Inventory"), key_columns=(2, 4))
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
+            cls._instance.pool = None
+            cls._instance.slots = None
             cls._instance.connection = None
             cls._instance.cursor = None
+            cls._instance.metrics_lock = threading.Lock()
+            cls._instance.metrics = cls._empty_metrics()
+            cls._instance.returned_at = {}  # Connection -> time.monotonic() when it went back to the pool
         return cls._instance
 
-    def connect(self, dbname='pharmacydb'):
+    @staticmethod
+    def _empty_metrics():
+        return {"checkouts": 0, "in_use": 0, "peak_in_use": 0, "total_wait": 0.0, "max_wait": 0.0,
+                "timeouts": 0, "reconnects": 0}
+
+    def connect(self, dbname='pharmacydb', min_connections=DB_POOL_MIN_CONNECTIONS,
+                max_connections=DB_POOL_MAX_CONNECTIONS):
         try:
-            self.connection = psycopg2.connect(
+            self.pool = pg_pool.ThreadedConnectionPool(
+                min_connections,
+                max_connections,
                 dbname=dbname,
                 user='postgres',
                 password='akiba1212',
                 host='localhost',
                 port=5432
             )
+            # ThreadedConnectionPool raises instead of waiting when it is empty,
+            # so checkouts first wait on a semaphore with one slot per connection.
+            self.slots = threading.BoundedSemaphore(max_connections)
+            self.max_connections = max_connections
+            with self.metrics_lock:
+                self.metrics = self._empty_metrics()
+            self.connection = self._checkout_connection()
             self.cursor = self.connection.cursor()
             self._create_tables(self.cursor)
             self.connection.commit()
@@ -191,6 +296,111 @@ class DatabaseManager:
             print(f"Ошибка подключения: {e}")
             return False
 
+    def _checkout_connection(self, timeout=DB_CHECKOUT_TIMEOUT):
+        """Берет соединение из пула, проверяя, что оно живо"""
+        started = time.perf_counter()
+        if not self.slots.acquire(timeout=timeout):
+            with self.metrics_lock:
+                self.metrics["timeouts"] += 1
+            raise pg_pool.PoolError(f"Нет свободных соединений в пуле за {timeout} с")
+        try:
+            conn = self.pool.getconn()
+            if not self._is_healthy(conn):
+                self.pool.putconn(conn, close=True)
+                conn = self.pool.getconn()
+                with self.metrics_lock:
+                    self.metrics["reconnects"] += 1
+                    self.returned_at.pop(conn, None)  # The replacement is handed out without a check
+        except Exception:
+            self.slots.release()
+            raise
+        waited = time.perf_counter() - started
+        with self.metrics_lock:
+            self.metrics["checkouts"] += 1
+            self.metrics["in_use"] += 1
+            self.metrics["peak_in_use"] = max(self.metrics["peak_in_use"], self.metrics["in_use"])
+            self.metrics["total_wait"] += waited
+            self.metrics["max_wait"] = max(self.metrics["max_wait"], waited)
+        return conn
+
+    def _return_connection(self, conn):
+        """Возвращает соединение в пул (незавершенная транзакция откатывается пулом)"""
+        try:
+            # psycopg2 marks a connection closed once the server link is lost, so it is dropped here
+            self.pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self.slots.release()
+            with self.metrics_lock:
+                self.metrics["in_use"] -= 1
+                if conn.closed:
+                    self.returned_at.pop(conn, None)
+                else:
+                    self.returned_at[conn] = time.monotonic()
+
+    def _is_healthy(self, conn):
+        """
+        Проверка соединения перед выдачей: закрытое или оборванное заменяется новым.
+
+        Обычно проверка локальная, без обращения к серверу; запросом проверяются
+        только соединения, простоявшие в пуле дольше DB_IDLE_PING_SECONDS.
+        """
+        with self.metrics_lock:
+            returned_at = self.returned_at.pop(conn, None)
+        if conn.closed or conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if returned_at is None or time.monotonic() - returned_at < DB_IDLE_PING_SECONDS:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @contextmanager
+    def checkout(self, commit=False):
+        """
+        Контекстный менеджер: курсор на соединении из пула.
+
+        При commit=True транзакция фиксируется при успешном выходе, иначе откатывается;
+        при исключении всегда выполняется откат. Соединение возвращается в пул.
+        Можно использовать из любого потока.
+        """
+        conn = self._checkout_connection()
+        try:
+            with conn.cursor() as cursor:
+                yield cursor
+            if commit:
+                conn.commit()
+            else:
+                conn.rollback()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self._return_connection(conn)
+
+    def fetch_page(self, query, params, limit, after=None):
+        """
+        Одна страница результата PagedQuery: до limit строк после ключа after
+        (None - с начала). Соединение берется из пула только на время этого запроса.
+        """
+        sql, key_params = query.page(after)
+        with self.checkout() as cursor:
+            cursor.execute(sql + " LIMIT %s", tuple(params or ()) + key_params + (limit,))
+            return cursor.fetchall()
+
+    def pool_stats(self):
+        """Метрики использования пула"""
+        with self.metrics_lock:
+            stats = dict(self.metrics)
+        stats["max_connections"] = getattr(self, "max_connections", 0)
+        stats["avg_wait_ms"] = 1000.0 * stats.pop("total_wait") / stats["checkouts"] if stats["checkouts"] else 0.0
+        stats["max_wait_ms"] = 1000.0 * stats.pop("max_wait")
+        return stats
+
     def get_cursor(self):
         return self.cursor
 
@@ -200,8 +410,15 @@ class DatabaseManager:
     def close(self):
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.connection:
-            self.connection.close()
+            self._return_connection(self.connection)
+            self.connection = None
+        if self.pool:
+            self.pool.closeall()
+            self.pool = None
+        with self.metrics_lock:
+            self.returned_at.clear()
 
     def _create_tables(self, cursor):
         """Создание таблиц с CHECK constraints вместо триггеров для простой валидации"""
@@ -307,9 +524,27 @@ class DatabaseManager:
                 IsResolved BOOLEAN DEFAULT FALSE,
                 FOREIGN KEY (ID_Medicine) REFERENCES Medicine(ID_Medicine) ON DELETE CASCADE
             );
+
+            -- Сводные остатки по лекарствам, поддерживаются триггерами на Inventory
+            CREATE TABLE IF NOT EXISTS public.MedicineStock (
+                ID_Medicine INT PRIMARY KEY,
+                TotalQuantity INT NOT NULL DEFAULT 0,
+                SellableQuantity INT NOT NULL DEFAULT 0,  -- Партии с неистекшим сроком
+                NearestExpiry DATE,  -- Ближайший срок среди непустых продаваемых партий
+                FOREIGN KEY (ID_Medicine) REFERENCES Medicine(ID_Medicine) ON DELETE CASCADE
+            );
+            CREATE INDEX IF NOT EXISTS idx_medicine_stock_expiry ON MedicineStock (NearestExpiry);
+
+            -- Индексы под ключи сортировки таблиц интерфейса: каждая страница читается
+            -- по индексу от ключа последней загруженной строки, без сортировки всей таблицы
+            CREATE INDEX IF NOT EXISTS idx_sales_date ON Sales (SaleDate DESC, ID_Sale DESC);
+            DROP INDEX IF EXISTS idx_inventory_expiry;
+            CREATE INDEX IF NOT EXISTS idx_inventory_expiry_id ON Inventory (ExpiryDate, ID_Inventory);
         """
         cursor.execute(tables_sql)
         self._install_triggers(cursor)
+        self._backfill_medicine_stock(cursor)
+        self._refresh_expired_stock(cursor)
 
     def _install_triggers(self, cursor):
         try:
@@ -421,6 +656,99 @@ class DatabaseManager:
                 AFTER INSERT OR UPDATE ON Inventory
                 FOR EACH ROW
                 EXECUTE FUNCTION check_low_stock();
+            """,
+
+            # Триггеры сводных остатков MedicineStock (на уровне оператора: продажа
+            # списывает несколько партий одним UPDATE)
+            """
+            CREATE OR REPLACE FUNCTION recompute_medicine_stock(p_medicine_ids INT[])
+            RETURNS VOID AS $$
+            BEGIN
+                UPDATE MedicineStock ms
+                SET SellableQuantity = s.Sellable, NearestExpiry = s.Nearest
+                FROM (
+                    SELECT st.ID_Medicine,
+                           COALESCE(SUM(i.Quantity) FILTER (WHERE i.ExpiryDate > CURRENT_DATE), 0) AS Sellable,
+                           MIN(i.ExpiryDate) FILTER (WHERE i.Quantity > 0 AND i.ExpiryDate > CURRENT_DATE) AS Nearest
+                    FROM MedicineStock st
+                    LEFT JOIN Inventory i ON i.ID_Medicine = st.ID_Medicine
+                    WHERE st.ID_Medicine = ANY(p_medicine_ids)
+                    GROUP BY st.ID_Medicine
+                ) s
+                WHERE ms.ID_Medicine = s.ID_Medicine;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            CREATE OR REPLACE FUNCTION apply_medicine_stock_changes(p_medicine_ids INT[], p_quantities INT[],
+                                                                    p_expiries DATE[])
+            RETURNS VOID AS $$
+            BEGIN
+                -- Количества меняются на сумму изменений, без пересчета всех партий
+                INSERT INTO MedicineStock AS ms (ID_Medicine, TotalQuantity, SellableQuantity)
+                SELECT c.ID_Medicine, SUM(c.Quantity),
+                       COALESCE(SUM(c.Quantity) FILTER (WHERE c.ExpiryDate > CURRENT_DATE), 0)
+                FROM unnest(p_medicine_ids, p_quantities, p_expiries) AS c (ID_Medicine, Quantity, ExpiryDate)
+                JOIN Medicine m ON m.ID_Medicine = c.ID_Medicine  -- Лекарство может удаляться каскадом
+                GROUP BY c.ID_Medicine
+                ON CONFLICT (ID_Medicine) DO UPDATE
+                SET TotalQuantity = ms.TotalQuantity + EXCLUDED.TotalQuantity,
+                    SellableQuantity = ms.SellableQuantity + EXCLUDED.SellableQuantity;
+
+                -- Ближайший срок может сдвинуть только партия не позже него:
+                -- такие лекарства пересчитываются по своим партиям
+                PERFORM recompute_medicine_stock(ARRAY(
+                    SELECT DISTINCT c.ID_Medicine
+                    FROM unnest(p_medicine_ids, p_expiries) AS c (ID_Medicine, ExpiryDate)
+                    JOIN MedicineStock ms ON ms.ID_Medicine = c.ID_Medicine
+                    WHERE ms.NearestExpiry IS NULL OR c.ExpiryDate <= ms.NearestExpiry
+                ));
+            END;
+            $$ LANGUAGE plpgsql;
+
+            CREATE OR REPLACE FUNCTION update_medicine_stock()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    PERFORM apply_medicine_stock_changes(array_agg(ID_Medicine), array_agg(Quantity),
+                                                         array_agg(ExpiryDate))
+                    FROM new_rows;
+                ELSIF TG_OP = 'DELETE' THEN
+                    PERFORM apply_medicine_stock_changes(array_agg(ID_Medicine), array_agg(-Quantity),
+                                                         array_agg(ExpiryDate))
+                    FROM old_rows;
+                ELSE
+                    PERFORM apply_medicine_stock_changes(array_agg(ID_Medicine), array_agg(Quantity),
+                                                         array_agg(ExpiryDate))
+                    FROM (
+                        SELECT ID_Medicine, Quantity, ExpiryDate FROM new_rows
+                        UNION ALL
+                        SELECT ID_Medicine, -Quantity, ExpiryDate FROM old_rows
+                    ) changes;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS tr_medicine_stock_insert ON Inventory;
+            CREATE TRIGGER tr_medicine_stock_insert
+                AFTER INSERT ON Inventory
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT
+                EXECUTE FUNCTION update_medicine_stock();
+
+            DROP TRIGGER IF EXISTS tr_medicine_stock_update ON Inventory;
+            CREATE TRIGGER tr_medicine_stock_update
+                AFTER UPDATE ON Inventory
+                REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT
+                EXECUTE FUNCTION update_medicine_stock();
+
+            DROP TRIGGER IF EXISTS tr_medicine_stock_delete ON Inventory;
+            CREATE TRIGGER tr_medicine_stock_delete
+                AFTER DELETE ON Inventory
+                REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT
+                EXECUTE FUNCTION update_medicine_stock();
             """
         ]
 
@@ -430,32 +758,70 @@ class DatabaseManager:
             except Exception as e:
                 print(f"Ошибка создания триггера: {e}")
 
-    def get_all_medicines(self):
-        self.cursor.execute("""
-            SELECT m.ID_Medicine, m.MedicineName, m.ActiveSubstance, m.Dosage, m.Form, m.Price,
-                   COALESCE(SUM(i.Quantity),0)
-            FROM Medicine m
-            LEFT JOIN Inventory i ON m.ID_Medicine = i.ID_Medicine
-            GROUP BY m.ID_Medicine
+    def _backfill_medicine_stock(self, cursor):
+        """Заполняет MedicineStock по существующим партиям, если таблица только что создана"""
+        cursor.execute("""
+            INSERT INTO MedicineStock (ID_Medicine, TotalQuantity, SellableQuantity, NearestExpiry)
+            SELECT ID_Medicine,
+                   SUM(Quantity),
+                   COALESCE(SUM(Quantity) FILTER (WHERE ExpiryDate > CURRENT_DATE), 0),
+                   MIN(ExpiryDate) FILTER (WHERE Quantity > 0 AND ExpiryDate > CURRENT_DATE)
+            FROM Inventory
+            WHERE NOT EXISTS (SELECT 1 FROM MedicineStock)
+            GROUP BY ID_Medicine
         """)
-        rows = self.cursor.fetchall()
+
+    @staticmethod
+    def _refresh_expired_stock(cursor):
+        """Пересчитывает лекарства, у которых с тех пор истекла ближайшая партия"""
+        cursor.execute("""
+            SELECT recompute_medicine_stock(ARRAY(
+                SELECT ID_Medicine FROM MedicineStock WHERE NearestExpiry <= CURRENT_DATE
+            ))
+        """)
+
+    def refresh_expired_stock(self):
+        """
+        Сводка MedicineStock зависит от текущей даты: партия перестает продаваться,
+        не меняясь сама. Вызывается периодически; затрагивает только такие лекарства.
+        """
+        with self.checkout(commit=True) as cursor:
+            self._refresh_expired_stock(cursor)
+
+    def get_all_medicines(self):
+        with self.checkout() as cursor:
+            cursor.execute(self.MEDICINES_QUERY.ordered())
+            rows = cursor.fetchall()
         return [
             {"id": r[0], "name": r[1], "ingredient": r[2], "dosage": r[3], "form": r[4], "price": float(r[5]),
-             "quantity": r[6]}
+             "quantity": r[6], "sellable": r[7], "nearest_expiry": r[8]}
             for r in rows
         ]
 
+    def get_medicines_by_ids(self, medicine_ids):
+        """Карточки лекарств по списку ID одним запросом: {ID: данные}"""
+        with self.checkout() as cursor:
+            cursor.execute("""
+                SELECT ID_Medicine, MedicineName, ActiveSubstance, Dosage, Form, Price
+                FROM Medicine WHERE ID_Medicine = ANY(%s)
+            """, (list(medicine_ids),))
+            rows = cursor.fetchall()
+        return {
+            r[0]: {"name": r[1], "ingredient": r[2] or "", "dosage": r[3] or "", "form": r[4] or "",
+                   "price": float(r[5])}
+            for r in rows
+        }
+
     def get_new_sale_id(self):
-        self.cursor.execute("SELECT COALESCE(MAX(ID_Sale), 0) + 1 FROM Sales")
-        return self.cursor.fetchone()[0]
-
-    def get_all_sales(self):
-        self.cursor.execute("""
-            SELECT s.ID_Sale, s.SaleDate, s.TotalAmount, 0 as Discount, s.TotalAmount as FinalTotal
-            FROM Sales s
-            ORDER BY s.SaleDate DESC
-        """)
-        rows = self.cursor.fetchall()
+        with self.checkout() as cursor:
+            cursor.execute("SELECT COALESCE(MAX(ID_Sale), 0) + 1 FROM Sales")
+            return cursor.fetchone()[0]
+
+    def get_all_sales(self, limit=None):
+        """Продажи от новых к старым; limit=None - все (LIMIT NULL не ограничивает)"""
+        with self.checkout() as cursor:
+            cursor.execute(self.SALES_QUERY.ordered() + " LIMIT %s", (limit,))
+            rows = cursor.fetchall()
         return [
             {
                 "id": r[0],
@@ -468,15 +834,9 @@ class DatabaseManager:
         ]
 
     def get_inventory(self):
-        self.cursor.execute("""
-            SELECT i.ID_Inventory, m.MedicineName, i.Quantity, i.ExpiryDate, s.SupplierName
-            FROM Inventory i
-            LEFT JOIN Medicine m ON i.ID_Medicine = m.ID_Medicine
-            LEFT JOIN Supplier s ON m.ID_Supplier = s.ID_Supplier
-            WHERE i.ExpiryDate >= CURRENT_DATE  -- Только с нормальным сроком годности
-            ORDER BY i.ID_Inventory
-        """)
-        rows = self.cursor.fetchall()
+        with self.checkout() as cursor:
+            cursor.execute(self.INVENTORY_QUERY.ordered())
+            rows = cursor.fetchall()
         return [
             {
                 "id": r[0],
@@ -489,26 +849,22 @@ class DatabaseManager:
         ]
 
     def get_expiring_medicines(self, days=30):
-        self.cursor.execute("""
-            SELECT m.ID_Medicine, m.MedicineName, i.ExpiryDate, i.Quantity
-            FROM Inventory i
-            JOIN Medicine m ON i.ID_Medicine = m.ID_Medicine
-            WHERE i.ExpiryDate BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '%s days'
-            ORDER BY i.ExpiryDate
-        """, (days,))
-        rows = self.cursor.fetchall()
+        with self.checkout() as cursor:
+            cursor.execute(self.EXPIRING_QUERY.ordered(), (days,))
+            rows = cursor.fetchall()
         return [
             {"id": r[0], "name": r[1], "expiry_date": r[2], "quantity": r[3]}
             for r in rows
         ]
 
     def get_all_suppliers(self):
-        self.cursor.execute("""
-            SELECT ID_Supplier, SupplierName
-            FROM Supplier
-            ORDER BY SupplierName
-        """)
-        rows = self.cursor.fetchall()
+        with self.checkout() as cursor:
+            cursor.execute("""
+                SELECT ID_Supplier, SupplierName
+                FROM Supplier
+                ORDER BY SupplierName
+            """)
+            rows = cursor.fetchall()
         return [{"id": r[0], "name": r[1]} for r in rows]
 
     def search_inventory(self, medicine=None, supplier=None, expiry_date=None):
@@ -531,8 +887,9 @@ class DatabaseManager:
             params.append(expiry_date)
 
         query += " ORDER BY i.ExpiryDate"
-        self.cursor.execute(query, tuple(params))
-        rows = self.cursor.fetchall()
+        with self.checkout() as cursor:
+            cursor.execute(query, tuple(params))
+            rows = cursor.fetchall()
         return [
             {"id": r[0], "name": r[1], "quantity": r[2], "expiry_date": r[3], "supplier": r[4] or ""}
             for r in rows
@@ -540,14 +897,15 @@ class DatabaseManager:
 
     def get_low_stock_notifications(self):
         """Получить уведомления о низких остатках"""
-        self.cursor.execute("""
-            SELECT n.ID_Notification, m.MedicineName, n.CurrentQuantity, n.NotificationDate
-            FROM low_stock_notifications n
-            JOIN Medicine m ON n.ID_Medicine = m.ID_Medicine
-            WHERE n.IsResolved = FALSE
-            ORDER BY n.NotificationDate DESC
-        """)
-        rows = self.cursor.fetchall()
+        with self.checkout() as cursor:
+            cursor.execute("""
+                SELECT n.ID_Notification, m.MedicineName, n.CurrentQuantity, n.NotificationDate
+                FROM low_stock_notifications n
+                JOIN Medicine m ON n.ID_Medicine = m.ID_Medicine
+                WHERE n.IsResolved = FALSE
+                ORDER BY n.NotificationDate DESC
+            """)
+            rows = cursor.fetchall()
         return [
             {
                 "id": r[0],
@@ -560,17 +918,246 @@ class DatabaseManager:
 
     def get_medicine_history(self, medicine_id):
         """Получить историю изменений лекарства"""
-        self.cursor.execute("""
-            SELECT MedicineName, ActiveSubstance, Dosage, Form, Price, modified_at
-            FROM Medicine
-            WHERE ID_Medicine = %s
-            UNION ALL
-            SELECT MedicineName, ActiveSubstance, Dosage, Form, Price, deleted_at as modified_at
-            FROM Medicine_archive
-            WHERE ID_Medicine = %s
-            ORDER BY modified_at DESC
-        """, (medicine_id, medicine_id))
-        return self.cursor.fetchall()
+        with self.checkout() as cursor:
+            cursor.execute("""
+                SELECT MedicineName, ActiveSubstance, Dosage, Form, Price, modified_at
+                FROM Medicine
+                WHERE ID_Medicine = %s
+                UNION ALL
+                SELECT MedicineName, ActiveSubstance, Dosage, Form, Price, deleted_at as modified_at
+                FROM Medicine_archive
+                WHERE ID_Medicine = %s
+                ORDER BY modified_at DESC
+            """, (medicine_id, medicine_id))
+            return cursor.fetchall()
+
+
+
+@dataclass
+class CartItem:
+    """Позиция корзины; общая для корзины, диалога чека и записи продажи"""
+    medicine_id: int
+    name: str
+    quantity: int
+    price: float
+    active_substance: str = ""
+    dosage: str = ""
+    form: str = ""
+
+    @property
+    def total(self):
+        return self.quantity * self.price
+
+
+class SaleService:
+    """
+    Запись продажи: заголовок, позиции и списание остатков.
+
+    Продажа пишется двумя запросами и COMMIT: заголовок Sales вместе со всеми
+    позициями (execute_values), затем один UPDATE, который списывает остатки
+    по партиям с ближайшим сроком годности.
+    """
+
+    # The header and all lines go in one statement. Stock is decremented by a separate,
+    # later statement: tr_check_quantity_before_sale must see the stock before the sale.
+    RECORD_SALE_SQL = """
+        WITH sale AS (
+            INSERT INTO Sales (CustomerName, CustomerPhone, TotalAmount, PaymentMethod)
+            VALUES {header}
+            RETURNING ID_Sale, SaleDate
+        ),
+        lines (ID_Medicine, Quantity, UnitPrice) AS (VALUES %s),
+        inserted AS (
+            INSERT INTO SaleItems (ID_Sale, ID_Medicine, Quantity, UnitPrice, TotalPrice)
+            SELECT sale.ID_Sale, lines.ID_Medicine, lines.Quantity, lines.UnitPrice,
+                   lines.Quantity * lines.UnitPrice
+            FROM sale, lines
+        )
+        SELECT ID_Sale, SaleDate FROM sale
+    """
+
+    # Demand per medicine is spread over unexpired batches in expiry order with a running
+    # total, so a single UPDATE touches every batch that is sold from. Medicines whose
+    # stock did not cover the demand are returned.
+    DECREMENT_STOCK_SQL = """
+        WITH demand (ID_Medicine, Quantity) AS (VALUES %s),
+        batches AS (
+            SELECT i.ID_Inventory, i.Quantity,
+                   d.Quantity - (SUM(i.Quantity) OVER w - i.Quantity) AS Remaining
+            FROM Inventory i
+            JOIN demand d ON d.ID_Medicine = i.ID_Medicine
+            WHERE i.Quantity > 0 AND i.ExpiryDate > CURRENT_DATE
+            WINDOW w AS (PARTITION BY i.ID_Medicine ORDER BY i.ExpiryDate, i.ID_Inventory)
+        ),
+        taken AS (
+            UPDATE Inventory i
+            SET Quantity = i.Quantity - LEAST(b.Quantity, b.Remaining)
+            FROM batches b
+            WHERE i.ID_Inventory = b.ID_Inventory AND b.Remaining > 0
+            RETURNING i.ID_Medicine, LEAST(b.Quantity, b.Remaining) AS Taken
+        )
+        SELECT d.ID_Medicine, d.Quantity, COALESCE(SUM(t.Taken), 0)
+        FROM demand d
+        LEFT JOIN taken t ON t.ID_Medicine = d.ID_Medicine
+        GROUP BY d.ID_Medicine, d.Quantity
+        HAVING COALESCE(SUM(t.Taken), 0) < d.Quantity
+    """
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    @staticmethod
+    def _lines(cart):
+        """Позиции корзины как (ID_Medicine, Quantity, UnitPrice)"""
+        return [(item.medicine_id, item.quantity, item.price) for item in cart]
+
+    def price_cart(self, cart):
+        """
+        Корзина с актуальными ценами и описаниями лекарств из базы (один запрос).
+
+        Позиции, лекарства которых уже удалены из справочника, отбрасываются.
+        """
+        medicines = self.db_manager.get_medicines_by_ids({item.medicine_id for item in cart})
+        priced = []
+        for item in cart:
+            medicine = medicines.get(item.medicine_id)
+            if medicine:
+                priced.append(CartItem(
+                    medicine_id=item.medicine_id,
+                    name=medicine["name"],
+                    quantity=item.quantity,
+                    price=medicine["price"],
+                    active_substance=medicine["ingredient"],
+                    dosage=medicine["dosage"],
+                    form=medicine["form"]
+                ))
+        return priced
+
+    def record_sale(self, cart, customer_name="Покупатель", customer_phone="", payment_method="Наличные"):
+        """
+        Сохраняет продажу и списывает товар со склада в одной транзакции.
+
+        cart - список CartItem.
+        Возвращает (sale_id, sale_date). Если товара не хватает, транзакция
+        откатывается и выбрасывается ValueError.
+        """
+        lines = self._lines(cart)
+        if not lines:
+            raise ValueError("Корзина пуста")
+        total_amount = sum(quantity * price for _, quantity, price in lines)
+        demand = {}
+        for medicine_id, quantity, _ in lines:
+            demand[medicine_id] = demand.get(medicine_id, 0) + quantity
+
+        with self.db_manager.checkout(commit=True) as cursor:
+            # execute_values only fills the VALUES list, so the header is inlined as literals.
+            header = cursor.mogrify("(%s, %s, %s, %s)", (
+                customer_name, customer_phone, total_amount,
+                PAYMENT_METHOD_CODES.get(payment_method, payment_method)
+            )).decode().replace("%", "%%")
+            try:
+                # page_size covers the whole cart: several pages would mean several statements.
+                (sale_id, sale_date), = execute_values(
+                    cursor, self.RECORD_SALE_SQL.format(header=header), lines,
+                    template="(%s::int, %s::int, %s::numeric)", page_size=len(lines), fetch=True
+                )
+            except psycopg2.errors.RaiseException as e:
+                # Raised by tr_check_quantity_before_sale
+                raise ValueError(e.diag.message_primary) from e
+            try:
+                shortages = execute_values(
+                    cursor, self.DECREMENT_STOCK_SQL, list(demand.items()),
+                    template="(%s::int, %s::int)", page_size=len(demand), fetch=True
+                )
+            except psycopg2.errors.CheckViolation as e:
+                # A concurrent sale took the same batch after this statement's snapshot
+                raise ValueError("Недостаточно товара на складе: остаток изменился, повторите продажу") from e
+            if shortages:
+                medicine_id, requested, available = shortages[0]
+                raise ValueError(f"Недостаточно товара на складе (ID {medicine_id}). "
+                                 f"Доступно: {available}, запрошено: {requested}")
+
+        return sale_id, sale_date
+
+
+def format_money(value):
+    return f"{float(value):.2f}"
+
+
+def date_formatter(date_format):
+    """Форматирование даты ячейки (строки и пустые значения выводятся как есть)"""
+    def format_date(value):
+        if hasattr(value, "strftime"):
+            return value.strftime(date_format)
+        return "" if value is None else str(value)
+    return format_date
+
+
+class QueryTableModel(QAbstractTableModel):
+    """
+    Модель таблицы, загружающая результат запроса страницами.
+
+    Строки подгружаются по мере прокрутки (canFetchMore/fetchMore) страницами
+    PagedQuery от ключа последней строки, текст ячейки форматируется только когда
+    представление его запрашивает. Между страницами модель не держит соединение из пула.
+    """
+
+    def __init__(self, db_manager, query, params, headers, formatters=None, page_size=TABLE_PAGE_SIZE,
+                 parent=None):
+        """
+        query - PagedQuery, первые столбцы которого соответствуют headers (остальные не показываются).
+        formatters - {номер столбца: функция значение -> текст}; остальные столбцы через str().
+        """
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.query = query
+        self.params = params
+        self.headers = headers
+        self.formatters = formatters or {}
+        self.page_size = page_size
+        self.rows = []
+        self.exhausted = False
+        self.fetchMore()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        value = self.rows[index.row()][index.column()]
+        formatter = self.formatters.get(index.column())
+        if formatter:
+            return formatter(value)
+        return "" if value is None else str(value)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        try:
+            # One extra row tells whether another page exists without a separate query
+            after = self.query.key_of(self.rows[-1]) if self.rows else None
+            rows = self.db_manager.fetch_page(self.query, self.params, self.page_size + 1, after)
+        except psycopg2.Error as e:
+            print(f"Ошибка загрузки строк таблицы: {e}")
+            rows = []
+        self.exhausted = len(rows) <= self.page_size
+        rows = rows[:self.page_size]
+        if rows:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+            self.rows.extend(rows)
+            self.endInsertRows()
 
 
 class DatabaseInitializerThread(QThread):
@@ -601,6 +1188,24 @@ class DatabaseInitializerThread(QThread):
             self.finished.emit(False)
 
 
+class ExpiredStockRefreshThread(QThread):
+    """Пересчет MedicineStock для партий, у которых истек срок, вне потока интерфейса"""
+    finished = pyqtSignal()
+    error = pyqtSignal(str)
+
+    def __init__(self, db_manager):
+        super().__init__()
+        self.db_manager = db_manager
+
+    def run(self):
+        try:
+            self.db_manager.refresh_expired_stock()
+            self.finished.emit()
+        except Exception as e:
+            logging.exception("Ошибка пересчета остатков с истекшим сроком")
+            self.error.emit(str(e))
+
+
 class RegistrationDialog(QDialog):
     def __init__(self, db_manager):
         super().__init__()
@@ -1156,11 +1761,13 @@ class AddSaleDialog(QDialog):
             self.comboBox_medicine.clear()
 
             for med in self.current_medicines:
-                if med["quantity"] > 0:  # Показываем только те, что есть в наличии
-                    self.comboBox_medicine.addItem(
-                        f"{med['name']} ({med['quantity']} шт.)",
-                        med["id"]
-                    )
+                if med["sellable"] > 0:  # Показываем только те, что можно продать
+                    # Expired batches count in quantity but cannot be sold, hence the lower spin-box maximum
+                    if med["sellable"] == med["quantity"]:
+                        label = f"{med['name']} ({med['sellable']} шт.)"
+                    else:
+                        label = f"{med['name']} ({med['sellable']} из {med['quantity']} шт. годно к продаже)"
+                    self.comboBox_medicine.addItem(label, med["id"])
         except Exception as e:
             print(f"Ошибка загрузки лекарств: {e}")
 
@@ -1180,7 +1787,7 @@ class AddSaleDialog(QDialog):
             if selected_med:
                 self.lineEdit_price.setText(f"{selected_med['price']:.2f}")
                 # Устанавливаем максимальное количество доступное на складе
-                self.spinBox_quantity.setMaximum(selected_med["quantity"])
+                self.spinBox_quantity.setMaximum(selected_med["sellable"])
                 self.update_total()
 
     def update_total(self):
@@ -1218,6 +1825,7 @@ class AddSaleDialog(QDialog):
                 # Обновляем количество
                 current_qty = int(self.tableWidget_items.item(row, 1).text())
                 new_qty = current_qty + quantity
+                self.items[row].quantity = new_qty
                 self.tableWidget_items.item(row, 1).setText(str(new_qty))
                 new_total = new_qty * price
                 self.tableWidget_items.item(row, 3).setText(f"{new_total:.2f}")
@@ -1238,13 +1846,7 @@ class AddSaleDialog(QDialog):
         self.tableWidget_items.setCellWidget(row_position, 4, delete_btn)
 
         # Сохраняем данные
-        self.items.append({
-            "medicine_id": med_id,
-            "name": medicine_name,
-            "quantity": quantity,
-            "price": price,
-            "total": total
-        })
+        self.items.append(CartItem(medicine_id=med_id, name=medicine_name, quantity=quantity, price=price))
 
         self.update_final_total()
 
@@ -1258,7 +1860,7 @@ class AddSaleDialog(QDialog):
 
     def update_final_total(self):
         """Обновляем общую сумму заказа"""
-        total_amount = sum(item["total"] for item in self.items)
+        total_amount = sum(item.total for item in self.items)
         self.label_total_value.setText(f"{total_amount:.2f} руб.")
 
     def save_sale(self):
@@ -1273,42 +1875,16 @@ class AddSaleDialog(QDialog):
             return
 
         try:
-            cursor = self.db_manager.get_cursor()
-            total_amount = sum(item["total"] for item in self.items)
-
-            # Сохраняем продажу
-            cursor.execute("""
-                INSERT INTO Sales (CustomerName, CustomerPhone, TotalAmount, PaymentMethod)
-                VALUES (%s, %s, %s, %s) RETURNING ID_Sale
-            """, (
+            sale_id, _ = SaleService(self.db_manager).record_sale(
+                self.items,
                 customer_name,
                 self.lineEdit_customer_phone.text(),
-                total_amount,
                 self.comboBox_payment_method.currentText()
-            ))
-
-            sale_id = cursor.fetchone()[0]
-
-            # Сохраняем товары продажи
-            for item in self.items:
-                cursor.execute("""
-                    INSERT INTO SaleItems (ID_Sale, ID_Medicine, Quantity, UnitPrice, TotalPrice)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (sale_id, item["medicine_id"], item["quantity"], item["price"], item["total"]))
-
-                # Обновляем количество на складе
-                cursor.execute("""
-                    UPDATE Inventory 
-                    SET Quantity = Quantity - %s 
-                    WHERE ID_Medicine = %s
-                """, (item["quantity"], item["medicine_id"]))
-
-            self.db_manager.get_connection().commit()
+            )
             QMessageBox.information(self, "Успех", f"Продажа #{sale_id} успешно сохранена")
             self.accept()
 
         except Exception as e:
-            self.db_manager.get_connection().rollback()
             QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить продажу: {e}")
 
 
@@ -1406,6 +1982,11 @@ class PharmacyMainWindow(QMainWindow):
 
     def setup_notifications(self):
         """Настройка системы уведомлений"""
+        # Сводка остатков пересчитана при подключении; дальше - при смене даты
+        self.stock_refreshed_on = datetime.now().date()
+        self.stock_refresh_thread = None
+        self.stock_refresh_warned = False  # Ошибку пересчета показываем один раз, повторы - только в лог
+
         # Создаем таймер для проверки уведомлений каждые 30 секунд
         self.notification_timer = QTimer()
         self.notification_timer.timeout.connect(self.check_notifications)
@@ -1416,6 +1997,8 @@ class PharmacyMainWindow(QMainWindow):
 
     def check_notifications(self):
         """Проверка уведомлений о низких остатках"""
+        if datetime.now().date() != self.stock_refreshed_on:
+            self.start_stock_refresh()
         try:
             notifications = self.db_manager.get_low_stock_notifications()
             if notifications:
@@ -1423,46 +2006,34 @@ class PharmacyMainWindow(QMainWindow):
         except Exception as e:
             print(f"Ошибка проверки уведомлений: {e}")
 
+    def start_stock_refresh(self):
+        """Раз в сутки пересчитывает остатки с истекшим сроком в фоновом потоке"""
+        if self.stock_refresh_thread is not None and self.stock_refresh_thread.isRunning():
+            return
+        refresh_date = datetime.now().date()
+        self.stock_refresh_thread = ExpiredStockRefreshThread(self.db_manager)
+        self.stock_refresh_thread.finished.connect(lambda: self.on_stock_refreshed(refresh_date))
+        self.stock_refresh_thread.error.connect(self.on_stock_refresh_error)
+        self.stock_refresh_thread.start()
+
+    def on_stock_refreshed(self, refresh_date):
+        self.stock_refreshed_on = refresh_date
+        self.stock_refresh_warned = False
+        self.load_medicines()  # Годный к продаже остаток мог уменьшиться
+
+    def on_stock_refresh_error(self, message):
+        # The date stays old, so the next timer tick retries
+        if self.stock_refresh_warned:
+            return
+        self.stock_refresh_warned = True
+        QMessageBox.warning(self, "Ошибка", f"Не удалось пересчитать остатки с истекшим сроком: {message}")
+
     def show_notification_banner(self, message):
         """Показать баннер с уведомлением"""
         # Можно реализовать всплывающее уведомление
         print(f"УВЕДОМЛЕНИЕ: {message}")
 
     # В метод load_medicines добавляем подсветку низких остатков
-    def load_medicines(self):
-        """Загрузка лекарств с подсветкой низких остатков"""
-        try:
-            medicines = self.db_manager.get_all_medicines()
-            model = QStandardItemModel()
-            headers = ["ID", "Название", "Действующее вещество", "Дозировка", "Форма", "Цена", "Количество"]
-            model.setHorizontalHeaderLabels(headers)
-
-            for med in medicines:
-                row = [
-                    QStandardItem(str(med["id"])),
-                    QStandardItem(med["name"]),
-                    QStandardItem(med.get("ingredient", "")),
-                    QStandardItem(med.get("dosage", "")),
-                    QStandardItem(med.get("form", "")),
-                    QStandardItem(f'{med["price"]:.2f}'),
-                    QStandardItem(str(med["quantity"]))
-                ]
-
-                # Подсветка низких остатков
-                if med["quantity"] < 10:
-                    for item in row:
-                        item.setBackground(Qt.GlobalColor.yellow)
-                elif med["quantity"] == 0:
-                    for item in row:
-                        item.setBackground(Qt.GlobalColor.red)
-
-                model.appendRow(row)
-
-            self.tableView_medicines.setModel(model)
-            self.tableView_medicines.resizeColumnsToContents()
-        except Exception as e:
-            print(f"Ошибка загрузки лекарств: {e}")
-
     def show_medicine_info(self, index):
         """Показывает информацию о лекарстве при двойном клике"""
         if not index.isValid():
@@ -1503,40 +2074,25 @@ class PharmacyMainWindow(QMainWindow):
             self.load_medicines()  # Обновляем количество товаров
             self.load_inventory()  # Обновляем инвентарь
 
-    def open_sale_detail(self):
-        """Открывает диалог с деталями покупки (окно купить)"""
-        if not self.cart:
-            QMessageBox.warning(self, "Корзина пуста", "Добавьте товары в корзину перед покупкой")
-            return
+    def replace_model(self, view, model):
+        """Ставит таблице новую модель; прежняя QueryTableModel (дочерняя для view) удаляется"""
+        old_model = view.model()
+        view.setModel(model)
+        if isinstance(old_model, QueryTableModel):
+            old_model.deleteLater()
+        view.resizeColumnsToContents()
 
-        dlg = SaleDetailsDialog(selected_items=self.cart, discount_percent=0, parent=self)
-        if dlg.exec() == QDialog.DialogCode.Accepted:
-            # Если покупка завершена, очищаем корзину
-            self.cart.clear()
-            QMessageBox.information(self, "Успех", "Покупка завершена успешно!")
+    def set_query_model(self, view, query, params, headers, formatters=None):
+        """Показывает результат запроса в таблице с постраничной подгрузкой строк"""
+        self.replace_model(view, QueryTableModel(self.db_manager, query, params, headers, formatters, parent=view))
 
     def load_medicines(self):
         """Загрузка лекарств"""
         try:
-            medicines = self.db_manager.get_all_medicines()
-            model = QStandardItemModel()
-            headers = ["ID", "Название", "Действующее вещество", "Дозировка", "Форма", "Цена", "Количество"]
-            model.setHorizontalHeaderLabels(headers)
-
-            for med in medicines:
-                row = [
-                    QStandardItem(str(med["id"])),
-                    QStandardItem(med["name"]),
-                    QStandardItem(med.get("ingredient", "")),
-                    QStandardItem(med.get("dosage", "")),
-                    QStandardItem(med.get("form", "")),
-                    QStandardItem(f'{med["price"]:.2f}'),
-                    QStandardItem(str(med["quantity"]))
-                ]
-                model.appendRow(row)
-
-            self.tableView_medicines.setModel(model)
-            self.tableView_medicines.resizeColumnsToContents()
+            headers = ["ID", "Название", "Действующее вещество", "Дозировка", "Форма", "Цена", "Количество",
+                       "Годно к продаже", "Ближайший срок"]
+            self.set_query_model(self.tableView_medicines, DatabaseManager.MEDICINES_QUERY, None, headers,
+                                 {5: format_money, 8: date_formatter("%d.%m.%Y")})
             self.tableView_medicines.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
         except Exception as e:
             print(f"Ошибка загрузки лекарств: {e}")
@@ -1544,100 +2100,31 @@ class PharmacyMainWindow(QMainWindow):
     def load_sales(self):
         """Загрузка продаж"""
         try:
-            sales = self.db_manager.get_all_sales()
-            model = QStandardItemModel()
             headers = ["ID продажи", "Дата", "Сумма", "Скидка", "Итог"]
-            model.setHorizontalHeaderLabels(headers)
-
-            for sale in sales:
-                # Форматируем дату продажи
-                sale_date = sale["date"]
-                if isinstance(sale_date, str):
-                    try:
-                        sale_date = datetime.strptime(sale_date, "%Y-%m-%d %H:%M:%S").strftime("%d.%m.%Y %H:%M")
-                    except:
-                        pass
-                elif hasattr(sale_date, 'strftime'):
-                    sale_date = sale_date.strftime("%d.%m.%Y %H:%M")
-
-                row = [
-                    QStandardItem(str(sale["id"])),
-                    QStandardItem(str(sale_date)),  # Используем отформатированную дату
-                    QStandardItem(f'{sale["total"]:.2f}'),
-                    QStandardItem(f'{sale["discount"]:.2f}'),
-                    QStandardItem(f'{sale["final_total"]:.2f}')
-                ]
-                model.appendRow(row)
-
-            self.tableView_sales.setModel(model)
-            self.tableView_sales.resizeColumnsToContents()
+            self.set_query_model(self.tableView_sales, DatabaseManager.SALES_QUERY, None, headers, {
+                1: date_formatter("%d.%m.%Y %H:%M"),
+                2: format_money,
+                3: format_money,
+                4: format_money
+            })
         except Exception as e:
             print(f"Ошибка загрузки продаж: {e}")
 
     def load_inventory(self):
         """Загрузка инвентаря"""
         try:
-            inventory = self.db_manager.get_inventory()
-            model = QStandardItemModel()
             headers = ["ID", "Название", "Количество", "Срок годности", "Поставщик"]
-            model.setHorizontalHeaderLabels(headers)
-
-            for item in inventory:
-                # Преобразуем дату в русский формат
-                expiry_date = item["expiry_date"]
-                if isinstance(expiry_date, str):
-                    try:
-                        # Если дата в строковом формате, преобразуем в datetime
-                        expiry_date = datetime.strptime(expiry_date, "%Y-%m-%d").strftime("%d.%m.%Y")
-                    except:
-                        pass
-                elif hasattr(expiry_date, 'strftime'):
-                    # Если это объект даты, форматируем
-                    expiry_date = expiry_date.strftime("%d.%m.%Y")
-
-                row = [
-                    QStandardItem(str(item["id"])),
-                    QStandardItem(item["name"]),
-                    QStandardItem(str(item["quantity"])),
-                    QStandardItem(str(expiry_date)),  # Используем отформатированную дату
-                    QStandardItem(item.get("supplier", ""))
-                ]
-                model.appendRow(row)
-
-            self.tableView_inventory.setModel(model)
-            self.tableView_inventory.resizeColumnsToContents()
+            self.set_query_model(self.tableView_inventory, DatabaseManager.INVENTORY_QUERY, None, headers,
+                                 {3: date_formatter("%d.%m.%Y")})
         except Exception as e:
             print(f"Ошибка загрузки инвентаря: {e}")
 
     def load_expiring(self):
         """Загрузка лекарств с истекающим сроком"""
         try:
-            expiring = self.db_manager.get_expiring_medicines()
-            model = QStandardItemModel()
             headers = ["ID", "Название", "Срок годности", "Остаток"]
-            model.setHorizontalHeaderLabels(headers)
-
-            for med in expiring:
-                # Форматируем дату
-                expiry_date = med["expiry_date"]
-                if isinstance(expiry_date, str):
-                    try:
-                        expiry_date = datetime.strptime(expiry_date, "%Y-%m-%d").strftime("%d.%m.%Y")
-                    except:
-                        pass
-                elif hasattr(expiry_date, 'strftime'):
-                    expiry_date = expiry_date.strftime("%d.%m.%Y")
-
-                row = [
-                    QStandardItem(str(med["id"])),
-                    QStandardItem(med["name"]),
-                    QStandardItem(str(expiry_date)),  # Используем отформатированную дату
-                    QStandardItem(str(med["quantity"]))
-                ]
-                model.appendRow(row)
-
-            self.tableView_expiring.setModel(model)
-            self.tableView_expiring.resizeColumnsToContents()
+            self.set_query_model(self.tableView_expiring, DatabaseManager.EXPIRING_QUERY, (30,), headers,
+                                 {2: date_formatter("%d.%m.%Y")})
         except Exception as e:
             print(f"Ошибка загрузки истекающих лекарств: {e}")
 
@@ -1664,7 +2151,12 @@ class PharmacyMainWindow(QMainWindow):
         med_id = int(model.index(index.row(), 0).data())
         name = model.index(index.row(), 1).data()
         price = float(model.index(index.row(), 5).data())
-        quantity_in_stock = int(model.index(index.row(), 6).data())
+        # Only unexpired batches can be sold; what is already in the cart is taken from them too
+        in_cart = sum(item.quantity for item in self.cart if item.medicine_id == med_id)
+        quantity_in_stock = int(model.index(index.row(), 7).data()) - in_cart
+        if quantity_in_stock <= 0:
+            QMessageBox.warning(self, "Ошибка", f"Нет доступного для продажи товара '{name}'")
+            return
 
         qty, ok = QInputDialog.getInt(self, "Количество", f"Введите количество для '{name}':", 1, 1, quantity_in_stock)
         if not ok:
@@ -1675,48 +2167,14 @@ class PharmacyMainWindow(QMainWindow):
             return
 
         for item in self.cart:
-            if item["id"] == med_id:
-                item["quantity"] += qty
+            if item.medicine_id == med_id:
+                item.quantity += qty
                 break
         else:
-            self.cart.append({"id": med_id, "name": name, "quantity": qty, "price": price})
+            self.cart.append(CartItem(medicine_id=med_id, name=name, quantity=qty, price=price))
 
         QMessageBox.information(self, "Добавлено", f"{qty} шт. '{name}' добавлено в корзину")
 
-    def add_sale(self, customer_name, customer_phone, payment_method, items):
-        """Сохраняет продажу и позиции продажи, возвращает (sale_id, sale_date)"""
-        try:
-            with self.get_connection() as conn:
-                with conn.cursor() as cur:
-                    total_amount = sum(item["price"] * item["quantity"] for item in items)
-
-                    # Добавляем запись в Sales
-                    cur.execute("""
-                        INSERT INTO Sales (CustomerName, CustomerPhone, TotalAmount, PaymentMethod)
-                        VALUES (%s, %s, %s, %s)
-                        RETURNING ID_Sale, SaleDate;
-                    """, (customer_name, customer_phone, total_amount, payment_method))
-
-                    sale_id, sale_date = cur.fetchone()
-
-                    # Добавляем позиции продажи
-                    for item in items:
-                        cur.execute("""
-                            INSERT INTO SaleItems (ID_Sale, ID_Medicine, Quantity, UnitPrice, TotalPrice)
-                            VALUES (%s, %s, %s, %s, %s);
-                        """, (
-                            sale_id,
-                            item["id"],
-                            item["quantity"],
-                            item["price"],
-                            item["quantity"] * item["price"]
-                        ))
-
-            return sale_id, sale_date
-
-        except Exception as e:
-            raise e
-
     def open_manage_medicines(self):
         dlg = ManageMedicinesDialog(self.db_manager)
         dlg.exec()
@@ -1743,8 +2201,7 @@ class PharmacyMainWindow(QMainWindow):
             ]
             model.appendRow(row)
 
-        self.tableView_inventory.setModel(model)
-        self.tableView_inventory.resizeColumnsToContents()
+        self.replace_model(self.tableView_inventory, model)
 
     def show_selected_medicine_info(self):
         """Показывает информацию о выбранном лекарстве по кнопке"""
@@ -1792,28 +2249,8 @@ class PharmacyMainWindow(QMainWindow):
                 QMessageBox.warning(self, "Корзина пуста", "Добавьте товары в корзину перед оформлением заказа")
                 return
 
-            # Получаем дополнительную информацию о товарах из базы данных
-            enriched_cart = []
-            for item in self.cart:
-                # Получаем полную информацию о лекарстве из базы
-                cursor = self.db_manager.get_cursor()
-                cursor.execute("""
-                    SELECT MedicineName, ActiveSubstance, Dosage, Form, Price 
-                    FROM Medicine WHERE ID_Medicine = %s
-                """, (item["id"],))
-                med_data = cursor.fetchone()
-
-                if med_data:
-                    enriched_item = {
-                        "id": item["id"],
-                        "name": med_data[0],
-                        "active_substance": med_data[1] or "",
-                        "dosage": med_data[2] or "",
-                        "form": med_data[3] or "",
-                        "quantity": item["quantity"],
-                        "price": float(med_data[4])
-                    }
-                    enriched_cart.append(enriched_item)
+            # Актуальные цены и описания всех позиций - одним запросом
+            enriched_cart = SaleService(self.db_manager).price_cart(self.cart)
 
             # Создаем данные для продажи
             sale_data = {
@@ -1830,71 +2267,20 @@ class PharmacyMainWindow(QMainWindow):
                 parent=self
             )
 
+            # Диалог сам сохраняет продажу при печати чека и после этого закрывается
             if dlg.exec() == QDialog.DialogCode.Accepted:
-                # Сохраняем продажу в базу данных
-                self.save_sale_to_database(enriched_cart, sale_data)
+                self.finish_sale()
 
         except Exception as e:
             print(f"Ошибка при оформлении заказа: {e}")
             QMessageBox.critical(self, "Ошибка", f"Не удалось оформить заказ: {e}")
 
-    def save_sale_to_database(self, items, sale_data):
-        """Сохраняет продажу в базу данных"""
-        try:
-            cursor = self.db_manager.get_cursor()
-
-            # Вычисляем общую сумму
-            total_amount = sum(item["quantity"] * item["price"] for item in items)
-
-            # Сохраняем продажу
-            cursor.execute("""
-                INSERT INTO Sales (CustomerName, CustomerPhone, TotalAmount, PaymentMethod)
-                VALUES (%s, %s, %s, %s) RETURNING ID_Sale
-            """, (
-                sale_data.get("customer", "Покупатель"),
-                sale_data.get("phone", ""),
-                total_amount,
-                sale_data.get("payment", "Наличные")
-            ))
-
-            sale_id = cursor.fetchone()[0]
-
-            # Сохраняем товары продажи
-            for item in items:
-                cursor.execute("""
-                    INSERT INTO SaleItems (ID_Sale, ID_Medicine, Quantity, UnitPrice, TotalPrice)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (
-                    sale_id,
-                    item["id"],
-                    item["quantity"],
-                    item["price"],
-                    item["quantity"] * item["price"]
-                ))
-
-                # Обновляем количество на складе
-                cursor.execute("""
-                    UPDATE Inventory 
-                    SET Quantity = Quantity - %s 
-                    WHERE ID_Medicine = %s AND Quantity >= %s
-                """, (item["quantity"], item["id"], item["quantity"]))
-
-            self.db_manager.get_connection().commit()
-
-            # Очищаем корзину
-            self.cart.clear()
-
-            # Обновляем данные в интерфейсе
-            self.load_medicines()
-            self.load_sales()
-            self.load_inventory()
-
-            QMessageBox.information(self, "Успех", f"Продажа #{sale_id} успешно сохранена!")
-
-        except Exception as e:
-            self.db_manager.get_connection().rollback()
-            print(f"Ошибка сохранения продажи: {e}")
-            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить продажу: {e}")
+    def finish_sale(self):
+        """Очищает корзину и обновляет данные после сохраненной продажи"""
+        self.cart.clear()
+        self.load_medicines()
+        self.load_sales()
+        self.load_inventory()
 
 class SaleDetailsDialog(QDialog):
     def __init__(self, sale_data=None, selected_items=None, discount_percent=0, parent=None):
@@ -1965,20 +2351,18 @@ class SaleDetailsDialog(QDialog):
         ])
 
         for row, item in enumerate(self.selected_items):
-            self.tableWidget_items.setItem(row, 0, QTableWidgetItem(item.get("name", "")))
-            self.tableWidget_items.setItem(row, 1, QTableWidgetItem(item.get("active_substance", "")))
-            self.tableWidget_items.setItem(row, 2, QTableWidgetItem(item.get("dosage", "")))
-            self.tableWidget_items.setItem(row, 3, QTableWidgetItem(str(item.get("quantity", 0))))
-            self.tableWidget_items.setItem(row, 4, QTableWidgetItem(f'{item.get("price", 0):.2f}'))
-
-            total = item.get("quantity", 0) * item.get("price", 0)
-            self.tableWidget_items.setItem(row, 5, QTableWidgetItem(f'{total:.2f}'))
+            self.tableWidget_items.setItem(row, 0, QTableWidgetItem(item.name))
+            self.tableWidget_items.setItem(row, 1, QTableWidgetItem(item.active_substance))
+            self.tableWidget_items.setItem(row, 2, QTableWidgetItem(item.dosage))
+            self.tableWidget_items.setItem(row, 3, QTableWidgetItem(str(item.quantity)))
+            self.tableWidget_items.setItem(row, 4, QTableWidgetItem(f'{item.price:.2f}'))
+            self.tableWidget_items.setItem(row, 5, QTableWidgetItem(f'{item.total:.2f}'))
 
         self.tableWidget_items.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
 
     def update_totals(self):
         """Пересчёт общей суммы"""
-        total = sum(item.get("quantity", 0) * item.get("price", 0.0) for item in self.selected_items)
+        total = sum(item.total for item in self.selected_items)
         if self.discount_percent > 0:
             total -= total * (self.discount_percent / 100)
         self.label_total_amount_value.setText(f"{total:.2f} руб.")
@@ -1994,45 +2378,22 @@ class SaleDetailsDialog(QDialog):
             return
 
         try:
-            cursor = self.parent().db_manager.get_cursor()
-
-            total_amount = sum(item["quantity"] * item["price"] for item in self.selected_items)
-
-            # Сохраняем продажу
-            cursor.execute("""
-                INSERT INTO Sales (CustomerName, CustomerPhone, TotalAmount, PaymentMethod)
-                VALUES (%s, %s, %s, %s)
-                RETURNING ID_Sale, SaleDate
-            """, (customer_name, customer_phone, total_amount, payment_method))
-
-            sale_id, sale_date = cursor.fetchone()
-
-            # Сохраняем позиции
-            for item in self.selected_items:
-                cursor.execute("""
-                    INSERT INTO SaleItems (ID_Sale, ID_Medicine, Quantity, UnitPrice, TotalPrice)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (
-                    sale_id,
-                    item["id"],
-                    item["quantity"],
-                    item["price"],
-                    item["quantity"] * item["price"]
-                ))
-
-            self.parent().db_manager.get_connection().commit()
+            sale_id, sale_date = SaleService(self.parent().db_manager).record_sale(
+                self.selected_items, customer_name, customer_phone, payment_method
+            )
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить чек: {e}")
+            return
 
-            # Обновляем интерфейс
-            self.label_sale_id_value.setText(str(sale_id))
-            self.label_sale_date_value.setText(str(sale_date))
+        # Обновляем интерфейс
+        self.sale_data.update({"id": sale_id, "date": sale_date})
+        self.label_sale_id_value.setText(str(sale_id))
+        self.label_sale_date_value.setText(sale_date.strftime("%d.%m.%Y %H:%M:%S"))
 
-            QMessageBox.information(self, "Успех", f"Чек #{sale_id} успешно сохранён и напечатан!")
+        QMessageBox.information(self, "Успех", f"Чек #{sale_id} успешно сохранён и напечатан!")
 
-            self.label_sale_date_value.setText(sale_date.strftime("%d.%m.%Y %H:%M:%S"))
-        # Закрываем диалог
-        except Exception as e:
-            self.parent().db_manager.get_connection().rollback()
-            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить чек: {e}")
+        # Закрываем диалог: продажа сохранена, повторно печатать тот же чек нельзя
+        self.accept()
 
 
 import subprocess
@@ -0,0 +1,140 @@
+import uuid
+import pytest
+
+# main.py needs PyQt6 (with QtMultimedia) and psycopg2; the sale tests also need a
+# PostgreSQL server reachable with the credentials from DatabaseManager.connect.
+try:
+    import main
+except ImportError as e:  # Also a missing system library behind QtMultimedia, not only a missing module
+    pytest.skip(f"main.py cannot be imported: {e}", allow_module_level=True)
+
+TEST_DBNAME = "pharmacydb_test"
+
+
+def connect_test_db():
+    db = main.DatabaseManager()
+    if db.pool is None and not db.connect(TEST_DBNAME):
+        pytest.skip(f"PostgreSQL database {TEST_DBNAME} is not available")
+    return db
+
+
+def add_medicine(db, *batches):
+    """Создает лекарство с партиями (количество, дней до истечения срока), возвращает его ID"""
+    with db.checkout(commit=True) as cursor:
+        cursor.execute("INSERT INTO Medicine (MedicineName, Price) VALUES (%s, 10) RETURNING ID_Medicine",
+                       (f"Test {uuid.uuid4().hex[:8]}",))
+        medicine_id = cursor.fetchone()[0]
+        for number, (quantity, days) in enumerate(batches):
+            cursor.execute("""
+                INSERT INTO Inventory (ID_Medicine, BatchNumber, Quantity, ExpiryDate)
+                VALUES (%s, %s, %s, CURRENT_DATE + %s)
+            """, (medicine_id, f"B{number}", quantity, days))
+    return medicine_id
+
+
+def delete_medicine(db, medicine_id):
+    with db.checkout(commit=True) as cursor:
+        cursor.execute("DELETE FROM Sales WHERE ID_Sale IN (SELECT ID_Sale FROM SaleItems WHERE ID_Medicine = %s)",
+                       (medicine_id,))
+        cursor.execute("DELETE FROM Medicine WHERE ID_Medicine = %s", (medicine_id,))
+
+
+def batch_quantities(db, medicine_id):
+    with db.checkout() as cursor:
+        cursor.execute("SELECT Quantity FROM Inventory WHERE ID_Medicine = %s ORDER BY ExpiryDate", (medicine_id,))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def stock_summary(db, medicine_id):
+    with db.checkout() as cursor:
+        cursor.execute("SELECT TotalQuantity, SellableQuantity FROM MedicineStock WHERE ID_Medicine = %s",
+                       (medicine_id,))
+        return cursor.fetchone()
+
+
+def test_sale_of_most_of_a_batch():
+    db = connect_test_db()
+    medicine_id = add_medicine(db, (10, 30))
+    try:
+        service = main.SaleService(db)
+        sale_id, _ = service.record_sale([main.CartItem(medicine_id, "Test", 6, 10.0)])
+        assert batch_quantities(db, medicine_id) == [4]
+        with db.checkout() as cursor:
+            cursor.execute("SELECT Quantity, TotalPrice FROM SaleItems WHERE ID_Sale = %s", (sale_id,))
+            assert cursor.fetchall() == [(6, 60)]
+
+        # The last units of a batch can be sold too
+        service.record_sale([main.CartItem(medicine_id, "Test", 4, 10.0)])
+        assert batch_quantities(db, medicine_id) == [0]
+        assert stock_summary(db, medicine_id) == (0, 0)
+    finally:
+        delete_medicine(db, medicine_id)
+
+
+def test_sale_spreads_over_batches_by_expiry():
+    db = connect_test_db()
+    medicine_id = add_medicine(db, (3, 60), (5, 10))
+    try:
+        main.SaleService(db).record_sale([
+            main.CartItem(medicine_id, "Test", 4, 10.0),
+            main.CartItem(medicine_id, "Test", 2, 10.0),
+        ])
+        assert batch_quantities(db, medicine_id) == [0, 2]
+        assert stock_summary(db, medicine_id) == (2, 2)
+    finally:
+        delete_medicine(db, medicine_id)
+
+
+def test_sale_with_insufficient_stock_is_rolled_back():
+    db = connect_test_db()
+    medicine_id = add_medicine(db, (5, 30))
+    try:
+        with db.checkout() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM Sales")
+            sales_before = cursor.fetchone()[0]
+        with pytest.raises(ValueError):
+            main.SaleService(db).record_sale([
+                main.CartItem(medicine_id, "Test", 3, 10.0),
+                main.CartItem(medicine_id, "Test", 3, 10.0),
+            ])
+        assert batch_quantities(db, medicine_id) == [5]
+        with db.checkout() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM Sales")
+            assert cursor.fetchone()[0] == sales_before
+    finally:
+        delete_medicine(db, medicine_id)
+
+
+def test_sales_pages_do_not_shift_when_a_sale_is_added():
+    db = connect_test_db()
+    medicine_id = add_medicine(db, (20, 30))
+    try:
+        service = main.SaleService(db)
+        sale_ids = [service.record_sale([main.CartItem(medicine_id, "Test", 1, 10.0)])[0] for _ in range(5)]
+        query = main.DatabaseManager.SALES_QUERY
+        first = db.fetch_page(query, None, 2)
+        assert [row[0] for row in first] == sale_ids[:2:-1]
+        # A sale recorded while the user scrolls must not push rows of the first page into the next one
+        service.record_sale([main.CartItem(medicine_id, "Test", 1, 10.0)])
+        second = db.fetch_page(query, None, 2, query.key_of(first[-1]))
+        assert [row[0] for row in second] == sale_ids[2:0:-1]
+    finally:
+        delete_medicine(db, medicine_id)
+
+
+def test_closed_connections_leave_no_idle_timestamps():
+    db = connect_test_db()
+    # A connection whose server link is lost while in use is dropped by the pool
+    with pytest.raises(main.psycopg2.OperationalError):
+        with db.checkout() as cursor:
+            lost = cursor.connection
+            with db.checkout() as other:
+                other.execute("SELECT pg_terminate_backend(%s)", (lost.get_backend_pid(),))
+            cursor.execute("SELECT 1")
+    assert lost.closed and lost not in db.returned_at
+    with db.checkout():
+        pass
+    assert db.returned_at
+    db.close()
+    assert db.returned_at == {}
+    connect_test_db()